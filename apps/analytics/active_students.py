@@ -0,0 +1,185 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.courses.models import Course
+from .bitmaps import encode_positions, iter_positions
+from .models import DailyActiveStudents, StudentActivityLog
+
+# Window lengths in days, ending today
+ACTIVE_WINDOWS = {
+    'dau': 1,
+    'wau': 7,
+    'mau': 30,
+}
+
+
+def encode_ids(student_ids):
+    """Bitset (as an int) with the bit of every student id set"""
+    if not student_ids:
+        return 0
+    offset = min(student_ids) & ~7
+    width = max(student_ids) - offset + 1
+    return unpack(offset, encode_positions((student_id - offset for student_id in student_ids), width))
+
+
+def decode_ids(bitset):
+    """Student ids in a bitset, lowest first"""
+    offset, bits = pack(bitset)
+    for position in iter_positions(bits):
+        yield offset + position
+
+
+def pack(bitset):
+    """(offset, bits) for storage; the offset is the lowest set bit rounded down to a byte"""
+    if not bitset:
+        return 0, b''
+    offset = ((bitset & -bitset).bit_length() - 1) & ~7
+    bitset >>= offset
+    return offset, bitset.to_bytes((bitset.bit_length() + 7) // 8, 'little')
+
+
+def unpack(offset, bits):
+    return int.from_bytes(bits, 'little') << offset
+
+
+def window_days(days, until=None):
+    """First and last day of the `days` calendar days ending `until` (default: today)"""
+    until = until or timezone.localdate()
+    return until - timedelta(days=days - 1), until
+
+
+def _merge(active):
+    """OR {(course_id, day): student ids} into the stored bitsets.
+
+    Returns {(course_id, day): bitset of the newly set students} for the
+    rows that changed.
+    """
+    course_ids = {course_id for course_id, _ in active}
+    days = {day for _, day in active}
+
+    with transaction.atomic():
+        # Create missing rows first, so that concurrent writers lock the same rows
+        DailyActiveStudents.objects.bulk_create(
+            [DailyActiveStudents(course_id=course_id, day=day) for course_id, day in active],
+            ignore_conflicts=True
+        )
+        rows = DailyActiveStudents.objects.select_for_update().filter(course_id__in=course_ids, day__in=days)
+
+        added = {}
+        changed = []
+        for row in rows:
+            student_ids = active.get((row.course_id, row.day))
+            if student_ids is None:
+                continue
+            stored = unpack(row.offset, bytes(row.bits))
+            new = encode_ids(student_ids) & ~stored
+            if new:
+                row.offset, row.bits = pack(stored | new)
+                changed.append(row)
+                added[(row.course_id, row.day)] = new
+        DailyActiveStudents.objects.bulk_update(changed, ['offset', 'bits'])
+
+    return added
+
+
+def record_active_students(logs):
+    """Set the bits of the students in some newly written activity rows.
+
+    Students are usually already marked for the day, so the stored bitsets
+    are read first and only rows that gain a bit are locked and rewritten.
+    Returns {(course_id, day): bitset of the newly active students}.
+    """
+    active = defaultdict(set)
+    for log in logs:
+        if log.course_id is not None:
+            active[(log.course_id, timezone.localdate(log.timestamp))].add(log.student_id)
+    if not active:
+        return {}
+
+    stored = DailyActiveStudents.objects.filter(
+        course_id__in={course_id for course_id, _ in active},
+        day__in={day for _, day in active}
+    ).values_list('course_id', 'day', 'offset', 'bits')
+    for course_id, day, offset, bits in stored:
+        student_ids = active.get((course_id, day))
+        if student_ids is not None and encode_ids(student_ids) & ~unpack(offset, bytes(bits)) == 0:
+            del active[(course_id, day)]
+
+    return _merge(active) if active else {}
+
+
+def active_bitsets(course_id, first_day, last_day):
+    """{day: bitset} of the days with any activity in first_day..last_day"""
+    rows = DailyActiveStudents.objects.filter(
+        course_id=course_id,
+        day__gte=first_day,
+        day__lte=last_day
+    ).values_list('day', 'offset', 'bits')
+    # PostgreSQL returns memoryview for binary fields
+    return {day: unpack(offset, bytes(bits)) for day, offset, bits in rows}
+
+
+def active_students(course_id, days, until=None):
+    """Bitset of the students active in the course in the last `days` calendar days"""
+    bitset = 0
+    for day_bitset in active_bitsets(course_id, *window_days(days, until)).values():
+        bitset |= day_bitset
+    return bitset
+
+
+def count_active_students(course_id, days, until=None):
+    return active_students(course_id, days, until).bit_count()
+
+
+def active_student_counts(course_id, until=None):
+    """Daily, weekly and monthly active students of a course from one query"""
+    first_day, last_day = window_days(max(ACTIVE_WINDOWS.values()), until)
+    bitsets = active_bitsets(course_id, first_day, last_day)
+
+    counts = {}
+    for name, days in ACTIVE_WINDOWS.items():
+        since, _ = window_days(days, last_day)
+        bitset = 0
+        for day, day_bitset in bitsets.items():
+            if day >= since:
+                bitset |= day_bitset
+        counts[name] = bitset.bit_count()
+    return counts
+
+
+def inactive_student_ids(course_id, days, until=None):
+    """Enrolled students with no activity in the course in the last `days` calendar days"""
+    enrolled = encode_ids(list(
+        Course.students.through.objects.filter(course_id=course_id).values_list('user_id', flat=True)
+    ))
+    return list(decode_ids(enrolled & ~active_students(course_id, days, until)))
+
+
+def backfill_active_students(course_ids=None, since=None):
+    """Build the daily bitsets from the stored activity logs.
+
+    Bits are OR-ed into existing rows, so running it again, or over days
+    whose raw logs were partly purged, never clears a student. Returns the
+    number of daily rows that changed.
+    """
+    logs = StudentActivityLog.objects.filter(course__isnull=False)
+    if course_ids is not None:
+        logs = logs.filter(course_id__in=course_ids)
+    if since is not None:
+        logs = logs.filter(timestamp__gte=since)
+
+    changed = 0
+    for course_id in logs.values_list('course', flat=True).distinct().order_by():
+        active = defaultdict(set)
+        course_logs = logs.filter(course_id=course_id).annotate(
+            day=TruncDate('timestamp')
+        ).values_list('day', 'student').distinct().order_by()
+        for day, student_id in course_logs.iterator(chunk_size=5000):
+            active[(course_id, day)].add(student_id)
+        if active:
+            changed += len(_merge(active))
+    return changed
@@ -0,0 +1,117 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.dispatch import Signal
+
+from .models import StudentActivityLog
+
+logger = logging.getLogger(__name__)
+
+# Sent with the written rows after every bulk write, which sends no post_save
+activity_flushed = Signal()
+
+
+class ActivityBuffer:
+    """Bounded in-process queue of activity log rows, written with bulk_create.
+
+    A background thread flushes whenever `flush_size` rows are waiting or
+    `flush_interval` seconds have passed since the oldest waiting row. When
+    the queue is full, producers wait up to `put_timeout` seconds for room
+    and then drop the event, so a slow database can never stall requests
+    for long.
+    """
+
+    def __init__(self, max_size=10000, flush_size=500, flush_interval=2.0, put_timeout=0.05, background=True):
+        self.queue = queue.Queue(maxsize=max_size)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.background = background
+        self.dropped = 0
+        self._flush_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def record(self, log):
+        """Queue an unsaved StudentActivityLog; returns False if it had to be dropped"""
+        if self.background:
+            self._ensure_thread()
+        try:
+            self.queue.put(log, timeout=self.put_timeout)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("Activity buffer full; dropped %s event(s) so far", self.dropped)
+            return False
+        return True
+
+    def flush(self):
+        """Write everything currently queued; returns the number of rows written"""
+        with self._flush_lock:
+            written = 0
+            while batch := self._drain(self.flush_size):
+                self._write(batch)
+                written += len(batch)
+            return written
+
+    def stop(self):
+        """Stop the background thread and flush what is left"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval * 2)
+        self.flush()
+        connection.close()
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            StudentActivityLog.objects.bulk_create(batch)
+        except Exception:
+            logger.exception("Could not write %s activity log row(s)", len(batch))
+            return
+        activity_flushed.send(sender=StudentActivityLog, logs=batch)
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='activity-buffer', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                first = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            # Wait for a full batch, but no longer than flush_interval
+            deadline = time.monotonic() + self.flush_interval
+            while self.queue.qsize() + 1 < self.flush_size and time.monotonic() < deadline and not self._stopping.is_set():
+                time.sleep(min(0.05, self.flush_interval))
+
+            with self._flush_lock:
+                self._write([first] + self._drain(self.flush_size - 1))
+        connection.close()
+
+
+activity_buffer = ActivityBuffer(
+    max_size=getattr(settings, 'ANALYTICS_ACTIVITY_BUFFER_SIZE', 10000),
+    flush_size=getattr(settings, 'ANALYTICS_ACTIVITY_FLUSH_SIZE', 500),
+    flush_interval=getattr(settings, 'ANALYTICS_ACTIVITY_FLUSH_INTERVAL', 2.0),
+)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import StudentPerformanceSnapshot, CourseEngagementMetrics, StudentActivityLog
+from .models import StudentPerformanceSnapshot, CourseEngagementMetrics, StudentActivityLog, StudentCourseMetrics, DailyActivityRollup, StudentActivityRollup, CourseReportArtifact, EngagementFormula, AnalyticsPipelineRun, AnalyticsPipelineStage
 
 
 @admin.register(StudentPerformanceSnapshot)
@@ -23,4 +23,56 @@ class StudentActivityLogAdmin(admin.ModelAdmin):
     list_display = ['student', 'course', 'activity_type', 'timestamp']
     list_filter = ['activity_type', 'timestamp', 'course']
     search_fields = ['student__username', 'course__title']
-    date_hierarchy = 'timestamp'
\ No newline at end of file
+    date_hierarchy = 'timestamp'
+
+
+@admin.register(StudentCourseMetrics)
+class StudentCourseMetricsAdmin(admin.ModelAdmin):
+    list_display = ['student', 'course', 'quiz_average', 'assignment_average', 'completion_rate', 'engagement_score', 'updated_at']
+    list_filter = ['course']
+    search_fields = ['student__username', 'course__title']
+
+
+
+@admin.register(DailyActivityRollup)
+class DailyActivityRollupAdmin(admin.ModelAdmin):
+    list_display = ['course', 'day', 'activity_type', 'event_count', 'student_count']
+    list_filter = ['activity_type', 'day', 'course']
+    date_hierarchy = 'day'
+
+
+@admin.register(StudentActivityRollup)
+class StudentActivityRollupAdmin(admin.ModelAdmin):
+    list_display = ['student', 'course', 'day', 'activity_type', 'event_count']
+    list_filter = ['activity_type', 'day', 'course']
+    search_fields = ['student__username']
+    date_hierarchy = 'day'
+
+
+@admin.register(CourseReportArtifact)
+class CourseReportArtifactAdmin(admin.ModelAdmin):
+    list_display = ['course', 'kind', 'content_hash', 'generated_at']
+    list_filter = ['kind']
+    search_fields = ['course__title']
+
+
+@admin.register(EngagementFormula)
+class EngagementFormulaAdmin(admin.ModelAdmin):
+    list_display = ['course', 'quiz_weight', 'assignment_weight', 'completion_weight', 'forum_weight', 'chat_weight', 'updated_at']
+    search_fields = ['course__title']
+
+
+class AnalyticsPipelineStageInline(admin.TabularInline):
+    model = AnalyticsPipelineStage
+    fields = ['stage', 'shard', 'started_at', 'duration', 'items']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(AnalyticsPipelineRun)
+class AnalyticsPipelineRunAdmin(admin.ModelAdmin):
+    list_display = ['started_at', 'status', 'activity_since', 'activity_until', 'finished_at']
+    list_filter = ['status']
+    date_hierarchy = 'started_at'
+    inlines = [AnalyticsPipelineStageInline]
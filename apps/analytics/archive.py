@@ -0,0 +1,293 @@
+import bisect
+import json
+import mmap
+import os
+import shutil
+import sys
+from array import array
+from collections import Counter
+from datetime import datetime
+from itertools import compress
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import StudentActivityLog
+
+ARCHIVE_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+# Column name -> array typecode; rows are sorted by course and then timestamp
+COLUMNS = {
+    'course': 'I',
+    'timestamp': 'q',
+    'student': 'I',
+    'activity': 'B',
+}
+# Columns the query helper can group by; 'day' is the UTC day number of the timestamp
+GROUP_COLUMNS = ('course', 'student', 'activity_type', 'day')
+WRITE_CHUNK_SIZE = 100000
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def archive_root():
+    return Path(getattr(settings, 'ANALYTICS_ARCHIVE_DIR', Path(settings.BASE_DIR) / 'activity_archive'))
+
+
+def month_key(moment):
+    return f'{moment.year:04d}-{moment.month:02d}'
+
+
+def month_bounds(key):
+    """Aware start of the month `YYYY-MM` and of the month after it"""
+    year, month = map(int, key.split('-'))
+    start = timezone.make_aware(datetime(year, month, 1))
+    end = timezone.make_aware(datetime(year + month // 12, month % 12 + 1, 1))
+    return start, end
+
+
+def complete_months():
+    """Keys of the months before the current one that have raw activity, oldest first"""
+    # The current month is still being written to
+    current_start, _ = month_bounds(month_key(timezone.localdate()))
+    return [
+        month_key(timezone.localtime(month))
+        for month in StudentActivityLog.objects.filter(
+            timestamp__lt=current_start
+        ).annotate(month=TruncMonth('timestamp')).values_list('month', flat=True).distinct().order_by('month')
+    ]
+
+
+def archived_spans(root=None):
+    """(start, end) of every archived month, cut at the time it was archived"""
+    spans = []
+    for key, info in sorted(read_manifest(root)['months'].items()):
+        start, end = month_bounds(key)
+        spans.append((start, min(end, datetime.fromisoformat(info['archived_at']))))
+    return spans
+
+
+def read_manifest(root=None):
+    path = Path(root or archive_root()) / MANIFEST_NAME
+    if not path.exists():
+        return {'version': ARCHIVE_VERSION, 'byteorder': sys.byteorder, 'columns': COLUMNS, 'months': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_manifest(root, manifest):
+    # Replace atomically so readers never see a half-written manifest
+    path = root / MANIFEST_NAME
+    tmp = root / f'{MANIFEST_NAME}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def archive_activity_month(key, root=None):
+    """Write the activity of one month (`YYYY-MM`) to columnar files.
+
+    Rows are streamed from the database in course and timestamp order and
+    appended to one raw file per column, so memory use does not grow with
+    the size of the month. The month directory is swapped in whole and then
+    listed in the manifest. An archived month is never replaced by an empty
+    or smaller export: that raises ValueError and keeps the existing files.
+    Returns the number of rows archived.
+    """
+    root = Path(root or archive_root())
+    root.mkdir(parents=True, exist_ok=True)
+    activity_codes = {name: code for code, (name, _) in enumerate(StudentActivityLog.ACTIVITY_TYPES)}
+    start, end = month_bounds(key)
+
+    building = root / f'{key}.tmp'
+    shutil.rmtree(building, ignore_errors=True)
+    building.mkdir()
+
+    rows = StudentActivityLog.objects.filter(
+        timestamp__gte=start,
+        timestamp__lt=end
+    ).values_list('course_id', 'timestamp', 'student_id', 'activity_type').order_by(
+        # Course-less rows are written as course 0 and must stay at the front of the sorted column
+        F('course_id').asc(nulls_first=True), 'timestamp', 'id'
+    )
+
+    count = 0
+    first = last = None
+    files = {name: open(building / name, 'wb') for name in COLUMNS}
+    try:
+        chunk = {name: array(typecode) for name, typecode in COLUMNS.items()}
+        for course_id, moment, student_id, activity_type in rows.iterator(chunk_size=5000):
+            seconds = int(moment.timestamp())
+            chunk['course'].append(course_id or 0)
+            chunk['timestamp'].append(seconds)
+            chunk['student'].append(student_id)
+            chunk['activity'].append(activity_codes[activity_type])
+            first = seconds if first is None else min(first, seconds)
+            last = seconds if last is None else max(last, seconds)
+            count += 1
+            if len(chunk['course']) >= WRITE_CHUNK_SIZE:
+                for name, values in chunk.items():
+                    values.tofile(files[name])
+                chunk = {name: array(typecode) for name, typecode in COLUMNS.items()}
+        for name, values in chunk.items():
+            values.tofile(files[name])
+    finally:
+        for f in files.values():
+            f.close()
+
+    manifest = read_manifest(root)
+    archived_rows = manifest['months'].get(key, {}).get('rows', 0)
+    if not count or count < archived_rows:
+        # Raw rows of an archived month may since have been purged
+        shutil.rmtree(building)
+        if archived_rows:
+            raise ValueError(f"{key}: export has {count} events but the archive holds {archived_rows}; kept the archive")
+        return 0
+
+    target = root / key
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(building, target)
+    manifest['months'][key] = {
+        'rows': count,
+        'first_timestamp': first,
+        'last_timestamp': last,
+        'activity_types': list(activity_codes),
+        'archived_at': timezone.now().isoformat(),
+    }
+    _write_manifest(root, manifest)
+    return count
+
+
+class _MappedMonth:
+    """Read-only memory maps of one archived month's column files"""
+
+    def __init__(self, path, columns):
+        self._files = []
+        self._maps = []
+        self._views = []
+        self.columns = {}
+        for name, typecode in columns.items():
+            f = open(path / name, 'rb')
+            self._files.append(f)
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps.append(mapped)
+            raw = memoryview(mapped)
+            self._views.append(raw)
+            self.columns[name] = raw.cast(typecode)
+
+    def __enter__(self):
+        return self.columns
+
+    def __exit__(self, *exc_info):
+        # Exported buffers must be released before their maps can close
+        for view in self.columns.values():
+            view.release()
+        for view in self._views:
+            view.release()
+        for mapped in self._maps:
+            mapped.close()
+        for f in self._files:
+            f.close()
+
+
+class ActivityArchive:
+    """Filtered counts and group-bys over the archived months.
+
+    Column files are memory-mapped, so only the pages a query touches are
+    read from disk. Course and time filters are binary searches over the
+    sorted course and timestamp columns. Counts and groupings then run over
+    the matching slices with C-level iteration (bytes.count, Counter).
+    """
+
+    def __init__(self, root=None):
+        self.root = Path(root or archive_root())
+        self.manifest = read_manifest(self.root)
+        if self.manifest['months'] and self.manifest['byteorder'] != sys.byteorder:
+            raise ValueError(f"Archive at {self.root} was written on a {self.manifest['byteorder']}-endian machine")
+
+    def months(self, start=None, end=None):
+        """Archived month keys overlapping start..end (aware datetimes), oldest first"""
+        keys = []
+        for key in sorted(self.manifest['months']):
+            month_start, month_end = month_bounds(key)
+            if (start is None or month_end > start) and (end is None or month_start < end):
+                keys.append(key)
+        return keys
+
+    def _slices(self, course_id=None, start=None, end=None):
+        """Yield (month info, columns, lo, hi) for the rows matching the course and time filters"""
+        start_seconds = int(start.timestamp()) if start is not None else None
+        end_seconds = int(end.timestamp()) if end is not None else None
+
+        for key in self.months(start, end):
+            with _MappedMonth(self.root / key, self.manifest['columns']) as columns:
+                lo, hi = 0, len(columns['course'])
+                if course_id is not None:
+                    lo = bisect.bisect_left(columns['course'], course_id, lo, hi)
+                    hi = bisect.bisect_right(columns['course'], course_id, lo, hi)
+                    spans = [(lo, hi)]
+                else:
+                    # Timestamps are only sorted within each course's block
+                    spans = []
+                    while lo < hi:
+                        block_end = bisect.bisect_right(columns['course'], columns['course'][lo], lo, hi)
+                        spans.append((lo, block_end))
+                        lo = block_end
+
+                for span_lo, span_hi in spans:
+                    if start_seconds is not None:
+                        span_lo = bisect.bisect_left(columns['timestamp'], start_seconds, span_lo, span_hi)
+                    if end_seconds is not None:
+                        span_hi = bisect.bisect_left(columns['timestamp'], end_seconds, span_lo, span_hi)
+                    if span_lo < span_hi:
+                        yield self.manifest['months'][key], columns, span_lo, span_hi
+
+    def count(self, course_id=None, activity_type=None, start=None, end=None):
+        """Number of archived events matching every given filter"""
+        return sum(
+            _count_span(month, columns, lo, hi, activity_type)
+            for month, columns, lo, hi in self._slices(course_id, start, end)
+        )
+
+    def group_by(self, column, course_id=None, activity_type=None, start=None, end=None):
+        """Counter of archived events per value of `column` (one of GROUP_COLUMNS)"""
+        if column not in GROUP_COLUMNS:
+            raise ValueError(f"Cannot group by {column!r}; choose one of {', '.join(GROUP_COLUMNS)}")
+
+        counts = Counter()
+        for month, columns, lo, hi in self._slices(course_id, start, end):
+            counts.update(_group_span(month, columns, lo, hi, column, activity_type))
+        return counts
+
+
+# Slices of the mapped columns must not outlive their month, so spans are
+# evaluated in functions that drop every slice before returning
+
+def _count_span(month, columns, lo, hi, activity_type):
+    if activity_type is None:
+        return hi - lo
+    if activity_type not in month['activity_types']:
+        return 0
+    return columns['activity'][lo:hi].tobytes().count(month['activity_types'].index(activity_type))
+
+
+def _group_span(month, columns, lo, hi, column, activity_type):
+    if column == 'activity_type':
+        values = columns['activity'][lo:hi]
+    elif column == 'day':
+        values = map(SECONDS_PER_DAY.__rfloordiv__, columns['timestamp'][lo:hi])
+    else:
+        values = columns[column][lo:hi]
+
+    if activity_type is not None:
+        if activity_type not in month['activity_types']:
+            return Counter()
+        code = month['activity_types'].index(activity_type)
+        values = compress(values, map(code.__eq__, columns['activity'][lo:hi]))
+
+    counts = Counter(values)
+    if column == 'activity_type':
+        return Counter({month['activity_types'][code]: n for code, n in counts.items()})
+    return counts
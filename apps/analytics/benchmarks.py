@@ -0,0 +1,84 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.courses.models import Course, Lesson, LessonProgress
+from apps.quiz.models import QuestionBank, Quiz, QuizSubmission
+from apps.forum.models import DiscussionThread, DiscussionPost
+from .active_students import backfill_active_students
+from .models import StudentActivityLog
+
+User = get_user_model()
+
+
+def build_synthetic_course(num_students, num_lessons=20, seed=0, prefix='bench'):
+    """Populate a course with a synthetic cohort for benchmarking.
+
+    Everything is written with bulk_create so that building a 10k-student
+    course takes seconds rather than minutes. Callers are expected to run
+    this inside a transaction they roll back afterwards.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+
+    course = Course.objects.create(title=f'{prefix} course ({num_students} students)', description='Synthetic benchmark course')
+    lessons = Lesson.objects.bulk_create([
+        Lesson(course=course, title=f'Lesson {i}', content='', order=i)
+        for i in range(num_lessons)
+    ])
+    bank = QuestionBank.objects.create(course=course, title=f'{prefix} bank')
+    quiz = Quiz.objects.create(course=course, question_bank=bank, title=f'{prefix} quiz', number_of_questions=10)
+
+    # Build the cohort in chunks so that memory use stays bounded for large courses
+    for start in range(0, num_students, 1000):
+        students = User.objects.bulk_create([
+            User(username=f'{prefix}_{course.id}_{i}', email=f'{prefix}_{course.id}_{i}@example.com', password='!')
+            for i in range(start, min(start + 1000, num_students))
+        ])
+        Course.students.through.objects.bulk_create([
+            Course.students.through(course_id=course.id, user_id=student.id)
+            for student in students
+        ])
+
+        progress = []
+        submissions = []
+        logs = []
+        for student in students:
+            for lesson in lessons[:rng.randint(0, num_lessons)]:
+                progress.append(LessonProgress(student=student, lesson=lesson, is_completed=True, completed_at=now))
+            if rng.random() < 0.7:
+                submissions.append(QuizSubmission(
+                    student=student, quiz=quiz, mcq_score=rng.randint(0, 10), total_questions=10, end_time=now
+                ))
+            for _ in range(rng.randint(0, 3)):
+                # Every other row happened a month ago
+                happened_at = now - timedelta(days=30) if len(logs) % 2 == 0 else now
+                logs.append(StudentActivityLog(student=student, course=course, activity_type='lesson_view', timestamp=happened_at))
+        LessonProgress.objects.bulk_create(progress, batch_size=1000)
+        QuizSubmission.objects.bulk_create(submissions, batch_size=1000)
+        StudentActivityLog.objects.bulk_create(logs, batch_size=1000)
+
+        for student in students[:max(1, len(students) // 20)]:
+            thread = DiscussionThread.objects.create(course=course, author=student, title='Question', content='...')
+            DiscussionPost.objects.create(thread=thread, author=student, content='...')
+
+    # bulk_create sends no signals; build the daily active bitsets from the logs
+    backfill_active_students([course.id])
+    return course
+
+
+@contextmanager
+def measure():
+    """Yield a dict that is filled with the query count and wall time of the block"""
+    result = {}
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        yield result
+        result['seconds'] = time.perf_counter() - started
+    result['queries'] = len(queries)
@@ -0,0 +1,146 @@
+import hashlib
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from apps.courses.models import Course, Lesson, LessonProgress
+from .models import CompletionBitmap
+
+# Keys change with the course's outline version; the timeout only evicts unread layouts
+LAYOUT_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Read-only view of a stored bitmap; cheaper to load than model instances
+Bitmap = namedtuple('Bitmap', ['student_id', 'bits', 'completed_count'])
+
+# EXPANSION[b] is the 8 cells (one byte each, 0 or 1) of bitmap byte b
+EXPANSION = [bytes((value >> bit) & 1 for bit in range(8)) for value in range(256)]
+
+
+def layout_cache_key(course_id, outline_version):
+    return f'analytics:lesson-layout:{course_id}:{outline_version}'
+
+
+def lesson_layout(course_id):
+    """Lesson ids of a course in course order; a lesson's index is its bit position.
+
+    Cached under the course's current outline version, which every lesson
+    save and delete bumps, so a change made by any process is seen on the
+    next read without relying on that process's cache invalidation.
+    """
+    version = Course.objects.filter(pk=course_id).values_list('outline_version', flat=True).first()
+    key = layout_cache_key(course_id, version)
+    lesson_ids = cache.get(key)
+    if lesson_ids is None:
+        lesson_ids = list(Lesson.objects.filter(course_id=course_id).order_by('order', 'created_at').values_list('id', flat=True))
+        cache.set(key, lesson_ids, LAYOUT_CACHE_TIMEOUT)
+    return lesson_ids
+
+
+def layout_version(lesson_ids):
+    return hashlib.sha1(','.join(map(str, lesson_ids)).encode()).hexdigest()[:16]
+
+
+def encode_positions(positions, width):
+    bits = bytearray((width + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return bytes(bits)
+
+
+def iter_positions(bits):
+    """Positions of the set bits, lowest first"""
+    for index, value in enumerate(bits):
+        while value:
+            low = value & -value
+            yield index * 8 + low.bit_length() - 1
+            value ^= low
+
+
+def expand(bits, width):
+    """One byte per lesson (0 or 1) for the first `width` positions"""
+    return b''.join(EXPANSION[value] for value in bits)[:width].ljust(width, b'\0')
+
+
+def build_completion_bitmaps(course_id, student_ids, lesson_ids):
+    """Compute unsaved bitmaps for some students with one progress query"""
+    position = {lesson_id: index for index, lesson_id in enumerate(lesson_ids)}
+    completed = {student_id: [] for student_id in student_ids}
+    progress = LessonProgress.objects.filter(
+        lesson__in=lesson_ids,
+        student__in=student_ids,
+        is_completed=True
+    ).values_list('student_id', 'lesson_id')
+    for student_id, lesson_id in progress.iterator(chunk_size=2000):
+        completed[student_id].append(position[lesson_id])
+
+    version = layout_version(lesson_ids)
+    now = timezone.now()
+    return {
+        student_id: CompletionBitmap(
+            student_id=student_id,
+            course_id=course_id,
+            bits=encode_positions(positions, len(lesson_ids)),
+            completed_count=len(positions),
+            layout_version=version,
+            updated_at=now
+        )
+        for student_id, positions in completed.items()
+    }
+
+
+def _store(bitmaps):
+    CompletionBitmap.objects.bulk_create(
+        bitmaps,
+        update_conflicts=True,
+        unique_fields=['student', 'course'],
+        update_fields=['bits', 'completed_count', 'layout_version', 'updated_at']
+    )
+
+
+def get_completion_bitmaps(course_id, student_ids, lesson_ids=None):
+    """Bitmaps of some students keyed by student id.
+
+    Missing rows and rows built for another lesson order are rebuilt in
+    bulk and stored, so reads stay correct after lessons are added,
+    removed or reordered. `lesson_ids` defaults to the cached layout.
+    """
+    if lesson_ids is None:
+        lesson_ids = lesson_layout(course_id)
+    version = layout_version(lesson_ids)
+
+    stored = CompletionBitmap.objects.filter(
+        course_id=course_id,
+        student__in=student_ids,
+        layout_version=version
+    ).values_list('student_id', 'bits', 'completed_count')
+    # PostgreSQL returns memoryview for binary fields
+    bitmaps = {student_id: Bitmap(student_id, bytes(bits), count) for student_id, bits, count in stored}
+
+    outdated = [student_id for student_id in student_ids if student_id not in bitmaps]
+    if outdated:
+        rebuilt = build_completion_bitmaps(course_id, outdated, lesson_ids)
+        _store(list(rebuilt.values()))
+        for student_id, bitmap in rebuilt.items():
+            bitmaps[student_id] = Bitmap(student_id, bitmap.bits, bitmap.completed_count)
+
+    return bitmaps
+
+
+def get_completion_bitmap(student_id, course_id, lesson_ids=None):
+    return get_completion_bitmaps(course_id, [student_id], lesson_ids)[student_id]
+
+
+def refresh_completion_bitmap(student_id, course_id):
+    """Rebuild one student's bitmap after their progress changed"""
+    bitmap = build_completion_bitmaps(course_id, [student_id], lesson_layout(course_id))[student_id]
+    _store([bitmap])
+    return bitmap
+
+
+def completed_lesson_ids(bitmap, lesson_ids):
+    return [lesson_ids[position] for position in iter_positions(bitmap.bits) if position < len(lesson_ids)]
+
+
+def progress_percentage(bitmap, lesson_ids):
+    return bitmap.completed_count / len(lesson_ids) * 100 if lesson_ids else 0.0
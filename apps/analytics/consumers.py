@@ -0,0 +1,35 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from apps.courses.models import Course
+from .live import dashboard_group_name
+
+
+class DashboardCountersConsumer(AsyncJsonWebsocketConsumer):
+    """Streams counter deltas to an instructor's open analytics dashboard.
+
+    Messages look like {"type": "delta", "counters": {"completions": 1}};
+    the page adds them to the figures it rendered, so nothing is re-queried.
+    """
+
+    async def connect(self):
+        self.course_id = self.scope['url_route']['kwargs']['course_id']
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated or not await self.is_instructor(user):
+            await self.close(code=4403)
+            return
+
+        self.group_name = dashboard_group_name(self.course_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def counters_delta(self, event):
+        await self.send_json({'type': 'delta', 'counters': event['counters']})
+
+    @database_sync_to_async
+    def is_instructor(self, user):
+        return Course.objects.filter(id=self.course_id, instructors=user).exists()
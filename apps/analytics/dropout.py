@@ -0,0 +1,95 @@
+from datetime import date
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from apps.courses.models import LessonProgress
+from .active_students import active_bitsets, decode_ids, encode_ids, inactive_student_ids
+from .bitmaps import lesson_layout
+from .models import StudentActivityLog
+from .rollups import start_of_day
+
+# A student is at risk below this completion percentage...
+DROPOUT_COMPLETION_THRESHOLD = 20
+# ...when they have also been inactive in the course for this many calendar days
+DROPOUT_INACTIVITY_DAYS = 14
+# The inactivity window slides with time, so cached results also expire
+DROPOUT_CACHE_TIMEOUT = 60 * 60
+
+
+def dropout_cache_key(course_id):
+    return f'analytics:dropout-risk:{course_id}'
+
+
+def invalidate_dropout_risk(*course_ids):
+    cache.delete_many([dropout_cache_key(course_id) for course_id in course_ids if course_id is not None])
+
+
+def score_dropout_risk(course):
+    """Find the at-risk students of a cohort.
+
+    The inactive students are the enrolled bitset minus the daily active
+    bitsets of the inactivity window. Only they are checked against the
+    completion threshold with one grouped count over the course's lessons.
+    Returns one dict per at-risk student with their completion rate and last
+    activity timestamp (None if they were never active in the course); for
+    students whose raw activity was purged it is the start of their last
+    active day.
+    """
+    lesson_ids = lesson_layout(course.id)
+    inactive = inactive_student_ids(course.id, DROPOUT_INACTIVITY_DAYS)
+    if not inactive:
+        return []
+
+    completed = dict(
+        LessonProgress.objects.filter(
+            student__in=inactive,
+            lesson__in=lesson_ids,
+            is_completed=True
+        ).values('student').annotate(count=Count('id')).values_list('student', 'count').order_by()
+    )
+    # completed / total * 100 < threshold; with no lessons every rate is 0
+    threshold = len(lesson_ids) * DROPOUT_COMPLETION_THRESHOLD / 100
+    at_risk = [
+        student_id for student_id in inactive
+        if not lesson_ids or completed.get(student_id, 0) < threshold
+    ]
+    if not at_risk:
+        return []
+
+    last_activity = dict(
+        StudentActivityLog.objects.filter(
+            course=course,
+            student__in=at_risk
+        ).values('student').annotate(last=Max('timestamp')).values_list('student', 'last').order_by()
+    )
+    # Raw rows of long-inactive students may have been purged; their active
+    # days are kept in the daily bitsets, so the start of the last one is used
+    wanted = encode_ids([student_id for student_id in at_risk if student_id not in last_activity])
+    if wanted:
+        for day, bitset in sorted(active_bitsets(course.id, date.min, timezone.localdate()).items(), reverse=True):
+            for student_id in decode_ids(bitset & wanted):
+                last_activity[student_id] = start_of_day(day)
+            wanted &= ~bitset
+            if not wanted:
+                break
+
+    return [
+        {
+            'student_id': student_id,
+            'completion_rate': round(completed.get(student_id, 0) / len(lesson_ids) * 100, 2) if lesson_ids else 0.0,
+            'last_activity': last_activity.get(student_id),
+        }
+        for student_id in at_risk
+    ]
+
+
+def get_at_risk_students(course):
+    """Cached dropout-risk results for a course"""
+    key = dropout_cache_key(course.id)
+    at_risk = cache.get(key)
+    if at_risk is None:
+        at_risk = score_dropout_risk(course)
+        cache.set(key, at_risk, DROPOUT_CACHE_TIMEOUT)
+    return at_risk
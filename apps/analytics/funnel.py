@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.db.models import Count
+
+from apps.courses.models import Course, LessonProgress
+
+# Invalidated on every relevant write; the timeout only bounds a missed invalidation
+FUNNEL_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def funnel_cache_key(course_id):
+    return f'analytics:lesson-funnel:{course_id}'
+
+
+def invalidate_lesson_funnel(*course_ids):
+    cache.delete_many([funnel_cache_key(course_id) for course_id in course_ids if course_id is not None])
+
+
+def build_lesson_funnel(course):
+    """Completions per lesson in course order, with drop-off between consecutive steps.
+
+    The first step's drop-off is measured against the number of enrolled
+    students. Three queries regardless of cohort size: lessons, enrolment
+    count and one grouped count of completions by enrolled students.
+    """
+    lessons = list(course.lessons.values_list('id', 'title', 'order'))
+    enrolled = course.students.count()
+    # Filtering on lesson ids and the enrolment table (rather than joining
+    # lessons and users) lets the count run on the progress index alone
+    completions = dict(
+        LessonProgress.objects.filter(
+            lesson__in=[lesson_id for lesson_id, _, _ in lessons],
+            is_completed=True,
+            student__in=Course.students.through.objects.filter(course=course).values('user_id')
+        ).values('lesson').annotate(count=Count('id')).values_list('lesson', 'count').order_by()
+    )
+
+    steps = []
+    previous = enrolled
+    for lesson_id, title, order in lessons:
+        completed = completions.get(lesson_id, 0)
+        steps.append({
+            'lesson_id': lesson_id,
+            'title': title,
+            'order': order,
+            'completed': completed,
+            'completion_rate': round(completed / enrolled * 100, 2) if enrolled else 0.0,
+            'drop_off': round((previous - completed) / previous * 100, 2) if previous else 0.0,
+        })
+        previous = completed
+
+    return {'enrolled': enrolled, 'steps': steps}
+
+
+def get_lesson_funnel(course):
+    """Memoized lesson funnel for a course.
+
+    The cached funnel carries the outline version it was built for, so
+    lessons added, removed or reordered by another process are never
+    served from a stale copy.
+    """
+    key = funnel_cache_key(course.id)
+    cached = cache.get(key)
+    if cached is not None and cached['outline_version'] == course.outline_version:
+        return cached['funnel']
+    funnel = build_lesson_funnel(course)
+    cache.set(key, {'outline_version': course.outline_version, 'funnel': funnel}, FUNNEL_CACHE_TIMEOUT)
+    return funnel
@@ -0,0 +1,86 @@
+from array import array
+
+from .bitmaps import expand, get_completion_bitmaps
+
+# Cell values of the students x lessons matrix
+NOT_COMPLETED = 0
+COMPLETED = 1
+
+
+class StudentHeatmap:
+    """Dense students x lessons completion matrix for one course.
+
+    Cells are stored row-major in a flat byte array, so a page of 500 students
+    over 40 lessons is 20KB regardless of how many progress rows exist. Rows
+    are expanded from the students' completion bitmaps.
+    """
+
+    def __init__(self, students, lessons, values, offset=0, total_students=None):
+        self.students = students
+        self.lessons = lessons
+        self.values = values
+        self.offset = offset
+        self.total_students = len(students) if total_students is None else total_students
+
+    @classmethod
+    def for_course(cls, course, students=None, offset=0, total_students=None):
+        """Build the matrix with one query for lessons and one for bitmaps.
+
+        `students` may be any slice of the course's students (e.g. a paginator
+        page); it defaults to the whole cohort. Bitmaps missing or built for
+        an older lesson order cost one more query to rebuild and store.
+        """
+        students = list(course.students.all() if students is None else students)
+        lessons = list(course.lessons.order_by('order', 'created_at').values_list('id', 'title'))
+        width = len(lessons)
+        values = array('B')
+
+        if students and lessons:
+            bitmaps = get_completion_bitmaps(
+                course.id,
+                [student.id for student in students],
+                [lesson_id for lesson_id, _ in lessons]
+            )
+            for student in students:
+                values.frombytes(expand(bitmaps[student.id].bits, width))
+        else:
+            values.frombytes(bytes(len(students) * width))
+
+        return cls(students, lessons, values, offset=offset, total_students=total_students)
+
+    def row(self, index):
+        """Return the cells of one student row"""
+        width = len(self.lessons)
+        return self.values[index * width:(index + 1) * width]
+
+    def to_json(self):
+        """Compact form: row/column index lists plus a value matrix"""
+        return {
+            'offset': self.offset,
+            'total_students': self.total_students,
+            'students': [student.id for student in self.students],
+            'student_names': [student.get_full_name() or student.username for student in self.students],
+            'lessons': [lesson_id for lesson_id, _ in self.lessons],
+            'lesson_titles': [title for _, title in self.lessons],
+            'values': [self.row(index).tolist() for index in range(len(self.students))],
+        }
+
+    def as_rows(self):
+        """Per-student rows in the shape the instructor template renders"""
+        rows = []
+        for index, student in enumerate(self.students):
+            cells = self.row(index)
+            rows.append({
+                'student_id': student.id,
+                'student_name': student.get_full_name() or student.username,
+                'lessons': [
+                    {
+                        'lesson_id': lesson_id,
+                        'lesson_title': title,
+                        'completed': cells[column] == COMPLETED,
+                        'quiz_score': None,
+                    }
+                    for column, (lesson_id, title) in enumerate(self.lessons)
+                ],
+            })
+        return rows
@@ -0,0 +1,36 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Counters the instructor dashboard updates in place
+LIVE_COUNTERS = ('active_today', 'completions', 'submissions')
+
+
+def dashboard_group_name(course_id):
+    return f'analytics-dashboard-{course_id}'
+
+
+def _send(course_id, deltas):
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    try:
+        async_to_sync(layer.group_send)(dashboard_group_name(course_id), {'type': 'counters.delta', 'counters': deltas})
+    except Exception:
+        # Live counters are best effort; never fail the write that caused them
+        logger.exception("Could not push dashboard counters for course %s", course_id)
+
+
+def publish_counter_deltas(course_id, **deltas):
+    """Push non-zero counter changes to the course's open dashboards once the write commits"""
+    deltas = {name: value for name, value in deltas.items() if value}
+    if course_id is None or not deltas:
+        return
+    unknown = set(deltas) - set(LIVE_COUNTERS)
+    if unknown:
+        raise ValueError(f"Unknown live counter(s): {', '.join(sorted(unknown))}")
+    transaction.on_commit(lambda: _send(course_id, deltas))
@@ -0,0 +1,51 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.analytics.archive import archive_activity_month, archive_root, complete_months, read_manifest
+
+
+class Command(BaseCommand):
+    help = 'Write student activity to monthly columnar archive files for long-range queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--month',
+            action='append',
+            dest='months',
+            help='Archive this month (YYYY-MM, can be repeated); default: every complete month not archived yet',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rewrite months that are already archived',
+        )
+        parser.add_argument(
+            '--root',
+            help='Archive directory (default: ANALYTICS_ARCHIVE_DIR)',
+        )
+
+    def handle(self, *args, **options):
+        root = options['root'] or archive_root()
+        archived = read_manifest(root)['months']
+
+        if options['months']:
+            for key in options['months']:
+                if not re.fullmatch(r'\d{4}-(0[1-9]|1[0-2])', key):
+                    raise CommandError(f"Invalid month {key!r}; use YYYY-MM")
+            months = options['months']
+        else:
+            months = complete_months()
+
+        total = 0
+        for key in months:
+            if key in archived and not options['force']:
+                self.stdout.write(f"{key}: already archived, skipped")
+                continue
+            try:
+                rows = archive_activity_month(key, root)
+            except ValueError as error:
+                raise CommandError(str(error))
+            total += rows
+            self.stdout.write(f"{key}: archived {rows} events")
+
+        self.stdout.write(self.style.SUCCESS(f"\nCompleted! Archived {total} events to {root}"))
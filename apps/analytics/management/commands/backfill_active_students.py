@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from apps.analytics.active_students import backfill_active_students
+from apps.analytics.rollups import start_of_day
+
+
+class Command(BaseCommand):
+    help = 'Build the daily active-student bitsets from the stored activity logs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course',
+            type=int,
+            action='append',
+            dest='course_ids',
+            help='Only backfill this course (can be repeated)',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Only read activity from this many days back (default: all stored activity)',
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days'] is not None:
+            since = start_of_day(timezone.localdate() - timedelta(days=options['days']))
+
+        changed = backfill_active_students(options['course_ids'], since)
+        self.stdout.write(self.style.SUCCESS(f"\nCompleted! Updated {changed} daily active-student rows"))
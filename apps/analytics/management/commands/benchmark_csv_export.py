@@ -0,0 +1,63 @@
+import gc
+import resource
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from apps.analytics.benchmarks import build_synthetic_course
+from apps.analytics.views import export_student_performance_csv
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the streaming student performance CSV export (data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            nargs='+',
+            default=[50000],
+            help='Cohort sizes (CSV rows) to benchmark',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'rows':>8} {'first byte':>11} {'total':>9} {'MB sent':>8} {'py peak MB':>11} {'RSS peak MB':>12}"
+        )
+
+        for num_rows in options['rows']:
+            with transaction.atomic():
+                course = build_synthetic_course(num_rows, prefix='csv')
+                instructor = User.objects.create_user(username=f'csv_instructor_{course.id}', password='!')
+                course.instructors.add(instructor)
+                request = RequestFactory().get('/')
+                request.user = instructor
+
+                gc.collect()
+                tracemalloc.start()
+                started = time.perf_counter()
+                first_byte = None
+                sent = 0
+
+                response = export_student_performance_csv(request, course.id)
+                for chunk in response.streaming_content:
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - started
+                    sent += len(chunk)
+
+                elapsed = time.perf_counter() - started
+                _, python_peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                # ru_maxrss is the process high-water mark, in kilobytes on Linux
+                rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+                self.stdout.write(
+                    f"{num_rows:>8} {first_byte * 1000:>9.1f}ms {elapsed:>8.2f}s {sent / 2 ** 20:>8.2f} "
+                    f"{python_peak / 2 ** 20:>11.2f} {rss_peak:>12.1f}"
+                )
+                transaction.set_rollback(True)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from apps.analytics.benchmarks import build_synthetic_course, measure
+from apps.analytics.utils import calculate_course_engagement
+
+
+class Command(BaseCommand):
+    help = 'Benchmark calculate_course_engagement on synthetic cohorts (data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--students',
+            type=int,
+            nargs='+',
+            default=[100, 1000, 10000],
+            help='Cohort sizes to benchmark',
+        )
+        parser.add_argument(
+            '--lessons',
+            type=int,
+            default=20,
+            help='Number of lessons in each synthetic course',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'students':>10} {'queries':>8} {'seconds':>10}")
+
+        for num_students in options['students']:
+            with transaction.atomic():
+                course = build_synthetic_course(num_students, num_lessons=options['lessons'])
+
+                with measure() as result:
+                    calculate_course_engagement(course)
+
+                self.stdout.write(f"{num_students:>10} {result['queries']:>8} {result['seconds']:>10.3f}")
+                transaction.set_rollback(True)
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.analytics.archive import archive_activity_month, complete_months, read_manifest
+from apps.analytics.rollups import MIN_RETENTION_DAYS, rollup_activity_logs, purge_activity_logs
+
+
+class Command(BaseCommand):
+    help = 'Roll up student activity into daily totals, archive complete months and delete old raw events'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            default=90,
+            help=f'Delete raw events older than this many days (minimum {MIN_RETENTION_DAYS})',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Raw events deleted per batch',
+        )
+        parser.add_argument(
+            '--rollup-only',
+            action='store_true',
+            help='Write rollups without deleting any raw events',
+        )
+
+    def handle(self, *args, **options):
+        if options['older_than'] < MIN_RETENTION_DAYS:
+            raise CommandError(f"--older-than must be at least {MIN_RETENTION_DAYS} days")
+
+        rollups = rollup_activity_logs()
+        self.stdout.write(f"Wrote {rollups} daily rollup rows")
+
+        if not options['rollup_only']:
+            # Only archived months are purged; archive the ones still missing first
+            archived = read_manifest()['months']
+            for key in complete_months():
+                if key not in archived:
+                    self.stdout.write(f"{key}: archived {archive_activity_month(key)} events")
+            deleted = purge_activity_logs(options['older_than'], batch_size=max(options['batch_size'], 1))
+            self.stdout.write(f"Deleted {deleted} raw events older than {options['older_than']} days")
+
+        self.stdout.write(self.style.SUCCESS("\nCompleted!"))
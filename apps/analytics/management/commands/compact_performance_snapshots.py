@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.analytics.models import StudentPerformanceSnapshot
+from apps.analytics.snapshots import thin_performance_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Thin old performance snapshots to weekly and then monthly resolution'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--weekly-after',
+            type=int,
+            default=30,
+            help='Keep one snapshot per student and week once snapshots are this many days old',
+        )
+        parser.add_argument(
+            '--monthly-after',
+            type=int,
+            default=180,
+            help='Keep one snapshot per student and month once snapshots are this many days old',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Snapshots deleted per batch',
+        )
+
+    def handle(self, *args, **options):
+        if options['monthly_after'] < options['weekly_after']:
+            raise CommandError("--monthly-after must not be less than --weekly-after")
+
+        before = StudentPerformanceSnapshot.objects.count()
+        deleted = thin_performance_snapshots(
+            weekly_after_days=options['weekly_after'],
+            monthly_after_days=options['monthly_after'],
+            batch_size=max(options['batch_size'], 1)
+        )
+        reduction = deleted / before * 100 if before else 0
+
+        self.stdout.write(f"Deleted {deleted} of {before} snapshots ({reduction:.1f}% fewer rows)")
+        self.stdout.write(self.style.SUCCESS("\nCompleted!"))
@@ -1,7 +1,68 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
 from django.core.management.base import BaseCommand
-from django.utils import timezone
+from django.db import connections
 from apps.courses.models import Course
-from apps.analytics.utils import create_performance_snapshot, calculate_course_engagement
+from apps.analytics.utils import create_performance_snapshots, calculate_course_engagement
+
+
+def _init_worker():
+    """Give each pool process its own Django setup and database connections"""
+    django.setup()
+    connections.close_all()
+
+
+def _snapshot_batch(course_id, student_ids, changed_only=False):
+    """Compute and bulk insert the snapshots of one batch of students"""
+    course = Course.objects.get(id=course_id)
+    return len(create_performance_snapshots(course, student_ids, changed_only=changed_only))
+
+
+class Checkpoint:
+    """Record finished student batches so an interrupted run can resume.
+
+    The ids of the students each course has finished are stored, so the
+    resumed run skips exactly those students; students enrolled since are
+    processed even if their ids fall between finished ones.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        self.courses = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.done = {int(k): set(v) for k, v in data.get('done', {}).items()}
+            self.courses = set(data.get('courses', []))
+
+    def is_done(self, course_id, student_id):
+        return student_id in self.done.get(course_id, ())
+
+    def batch_done(self, course_id, student_ids):
+        self.done.setdefault(course_id, set()).update(student_ids)
+        self.save()
+
+    def course_done(self, course_id):
+        self.courses.add(course_id)
+        self.done.pop(course_id, None)
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'done': {k: sorted(v) for k, v in self.done.items()}, 'courses': sorted(self.courses)}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
 
 
 class Command(BaseCommand):
@@ -13,36 +74,106 @@ class Command(BaseCommand):
             type=int,
             help='Generate snapshots for a specific course only',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of worker processes; batches are sharded across them',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Students per batch (one bulk INSERT per batch)',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Checkpoint file; an interrupted run resumes from it and it is removed on success',
+        )
+        parser.add_argument(
+            '--changed-only',
+            action='store_true',
+            help="Skip students whose metrics equal their latest snapshot",
+        )
 
     def handle(self, *args, **options):
         course_id = options.get('course_id')
-        
+        batch_size = max(options['batch_size'], 1)
+        workers = max(options['workers'], 1)
+        changed_only = options['changed_only']
+        checkpoint = Checkpoint(options.get('checkpoint'))
+
         if course_id:
             courses = Course.objects.filter(id=course_id)
         else:
             courses = Course.objects.all()
-        
+        courses = [course for course in courses if course.id not in checkpoint.courses]
+
+        # Shard every course into id-ordered batches of students still to process
+        batches = {}
+        for course in courses:
+            student_ids = [
+                student_id
+                for student_id in course.students.order_by('id').values_list('id', flat=True)
+                if not checkpoint.is_done(course.id, student_id)
+            ]
+            batches[course.id] = [student_ids[i:i + batch_size] for i in range(0, len(student_ids), batch_size)]
+
         total_snapshots = 0
+        total_skipped = 0
         total_metrics = 0
-        
-        for course in courses:
-            self.stdout.write(f"Processing course: {course.title}")
-            
-            # Generate student snapshots
-            for student in course.students.all():
-                create_performance_snapshot(student, course)
-                total_snapshots += 1
-            
-            # Calculate course engagement metrics
-            calculate_course_engagement(course)
-            total_metrics += 1
-            
-            self.stdout.write(
-                self.style.SUCCESS(f"  Created {course.students.count()} snapshots")
-            )
-        
+
+        if workers > 1:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        else:
+            executor = None
+
+        try:
+            for course in courses:
+                self.stdout.write(f"Processing course: {course.title}")
+                started = time.perf_counter()
+                created = 0
+
+                if executor:
+                    futures = {
+                        executor.submit(_snapshot_batch, course.id, batch, changed_only): batch
+                        for batch in batches[course.id]
+                    }
+                    for future in as_completed(futures):
+                        created += future.result()
+                        checkpoint.batch_done(course.id, futures[future])
+                else:
+                    for batch in batches[course.id]:
+                        created += len(create_performance_snapshots(course, batch, changed_only=changed_only))
+                        checkpoint.batch_done(course.id, batch)
+
+                # Calculate course engagement metrics
+                calculate_course_engagement(course)
+                checkpoint.course_done(course.id)
+                skipped = sum(len(batch) for batch in batches[course.id]) - created
+                total_snapshots += created
+                total_skipped += skipped
+                total_metrics += 1
+
+                elapsed = time.perf_counter() - started
+                rate = created / elapsed if elapsed > 0 else 0
+                message = f"  Created {created} snapshots in {elapsed:.2f}s ({rate:.1f} snapshots/sec)"
+                if changed_only:
+                    message += f", skipped {skipped} unchanged"
+                self.stdout.write(self.style.SUCCESS(message))
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+
+        checkpoint.clear()
+        if changed_only:
+            considered = total_snapshots + total_skipped
+            saved = total_skipped / considered * 100 if considered else 0
+            self.stdout.write(f"Change-only storage skipped {total_skipped} of {considered} snapshots ({saved:.1f}% fewer rows)")
         self.stdout.write(
             self.style.SUCCESS(
                 f"\nCompleted! Generated {total_snapshots} student snapshots and {total_metrics} course metrics"
             )
-        )
\ No newline at end of file
+        )
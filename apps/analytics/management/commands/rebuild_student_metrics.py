@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from apps.courses.models import Course
+from apps.analytics.utils import rebuild_student_metrics
+
+
+class Command(BaseCommand):
+    help = 'Reconcile the per-student course metrics table with the raw tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course-id',
+            type=int,
+            help='Rebuild metrics for a specific course only',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Students recomputed per batch',
+        )
+
+    def handle(self, *args, **options):
+        course_id = options.get('course_id')
+
+        if course_id:
+            courses = Course.objects.filter(id=course_id)
+        else:
+            courses = Course.objects.all()
+
+        totals = [0, 0, 0]
+        for course in courses:
+            created, updated, removed = rebuild_student_metrics(course, batch_size=max(options['batch_size'], 1))
+            totals = [totals[0] + created, totals[1] + updated, totals[2] + removed]
+            self.stdout.write(f"{course.title}: {created} created, {updated} updated, {removed} removed")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\nCompleted! {totals[0]} created, {totals[1]} updated, {totals[2]} removed"
+            )
+        )
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('courses', '0008_plagiarismreport'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentCourseMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quiz_average', models.FloatField(default=0.0, help_text='Average quiz score percentage')),
+                ('assignment_average', models.FloatField(default=0.0, help_text='Average assignment grade')),
+                ('completed_lessons', models.PositiveIntegerField(default=0)),
+                ('total_lessons', models.PositiveIntegerField(default=0)),
+                ('forum_posts', models.PositiveIntegerField(default=0)),
+                ('forum_threads', models.PositiveIntegerField(default=0)),
+                ('completion_rate', models.FloatField(default=0.0, help_text='Percentage of lessons completed')),
+                ('engagement_score', models.FloatField(default=0.0, help_text='Overall engagement metric')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_metrics', to='courses.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_metrics', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['course', 'student'],
+                'unique_together': {('student', 'course')},
+            },
+        ),
+    ]
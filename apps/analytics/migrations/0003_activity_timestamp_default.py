@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_studentcoursemetrics'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='studentactivitylog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
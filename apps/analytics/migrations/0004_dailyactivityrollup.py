@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_activity_timestamp_default'),
+        ('courses', '0008_plagiarismreport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('activity_type', models.CharField(choices=[('lesson_view', 'Lesson Viewed'), ('lesson_complete', 'Lesson Completed'), ('quiz_attempt', 'Quiz Attempted'), ('assignment_submit', 'Assignment Submitted'), ('forum_post', 'Forum Post Created'), ('chat_message', 'Chat Message Sent'), ('video_join', 'Video Session Joined')], max_length=20)),
+                ('event_count', models.PositiveIntegerField(default=0)),
+                ('student_count', models.PositiveIntegerField(default=0, help_text='Distinct students active that day')),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='activity_rollups', to='courses.course')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['course', '-day'], name='analytics_d_course__1578ca_idx')],
+                'unique_together': {('course', 'day', 'activity_type')},
+            },
+        ),
+    ]
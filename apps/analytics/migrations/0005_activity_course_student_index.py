@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_dailyactivityrollup'),
+        ('courses', '0008_plagiarismreport'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studentactivitylog',
+            index=models.Index(fields=['course', 'student', '-timestamp'], name='analytics_s_course__f493c1_idx'),
+        ),
+    ]
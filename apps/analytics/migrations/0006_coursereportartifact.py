@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0005_activity_course_student_index'),
+        ('courses', '0009_lessonprogress_completion_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseReportArtifact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('engagement', 'Engagement'), ('retention', 'Retention')], max_length=20)),
+                ('content', models.TextField(help_text='Serialized JSON payload')),
+                ('content_hash', models.CharField(help_text='SHA-256 of the content', max_length=64)),
+                ('generated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_artifacts', to='courses.course')),
+            ],
+            options={
+                'unique_together': {('course', 'kind')},
+            },
+        ),
+    ]
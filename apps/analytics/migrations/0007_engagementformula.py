@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:39
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0006_coursereportartifact'),
+        ('courses', '0009_lessonprogress_completion_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentcoursemetrics',
+            name='chat_messages',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='EngagementFormula',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quiz_weight', models.FloatField(default=0.3)),
+                ('assignment_weight', models.FloatField(default=0.3)),
+                ('completion_weight', models.FloatField(default=0.2)),
+                ('forum_weight', models.FloatField(default=0.2)),
+                ('chat_weight', models.FloatField(default=0.0)),
+                ('thread_points', models.PositiveIntegerField(default=2, help_text='Forum activity points per thread; posts count 1')),
+                ('forum_cap', models.PositiveIntegerField(default=10, help_text='Forum activity points that count as 100%', validators=[django.core.validators.MinValueValidator(1)])),
+                ('chat_cap', models.PositiveIntegerField(default=20, help_text='Chat messages that count as 100%', validators=[django.core.validators.MinValueValidator(1)])),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='engagement_formula', to='courses.course')),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0007_engagementformula'),
+        ('courses', '0009_lessonprogress_completion_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompletionBitmap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bits', models.BinaryField(default=b'')),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('layout_version', models.CharField(max_length=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='completion_bitmaps', to='courses.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='completion_bitmaps', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('student', 'course')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0008_completionbitmap'),
+        ('courses', '0009_lessonprogress_completion_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActiveStudents',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('offset', models.PositiveIntegerField(default=0)),
+                ('bits', models.BinaryField(default=b'')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_active_students', to='courses.course')),
+            ],
+            options={
+                'unique_together': {('course', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0009_dailyactivestudents'),
+        ('courses', '0009_lessonprogress_completion_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsPipelineRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='running', max_length=10)),
+                ('activity_since', models.DateTimeField(blank=True, null=True)),
+                ('activity_until', models.DateTimeField()),
+                ('course_ids', models.JSONField(blank=True, default=list)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AnalyticsPipelineStage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(max_length=20)),
+                ('shard', models.CharField(blank=True, max_length=100)),
+                ('started_at', models.DateTimeField()),
+                ('duration', models.FloatField(help_text='Seconds')),
+                ('items', models.PositiveIntegerField(default=0, help_text='Rows written or courses processed')),
+            ],
+            options={
+                'ordering': ['started_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='studentcoursemetrics',
+            index=models.Index(fields=['updated_at', 'course'], name='analytics_s_updated_d4d1d4_idx'),
+        ),
+        migrations.AddField(
+            model_name='analyticspipelinestage',
+            name='run',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stages', to='analytics.analyticspipelinerun'),
+        ),
+    ]
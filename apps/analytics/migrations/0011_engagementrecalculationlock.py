@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0010_analyticspipeline'),
+        ('courses', '0011_lesson_course_order_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EngagementRecalculationLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='engagement_recalculation_lock', to='courses.course')),
+            ],
+        ),
+    ]
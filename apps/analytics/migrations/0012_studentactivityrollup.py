@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:17
+
+import django.db.models.deletion
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def rollup_chat_of_rolled_up_days(apps, schema_editor):
+    """Give days already in DailyActivityRollup their per-student chat rows"""
+    DailyActivityRollup = apps.get_model('analytics', 'DailyActivityRollup')
+    StudentActivityLog = apps.get_model('analytics', 'StudentActivityLog')
+    StudentActivityRollup = apps.get_model('analytics', 'StudentActivityRollup')
+    last_days = DailyActivityRollup.objects.filter(course__isnull=False).values('course').annotate(day=Max('day'))
+    for row in last_days:
+        until = timezone.make_aware(datetime.combine(row['day'] + timedelta(days=1), time.min))
+        StudentActivityRollup.objects.bulk_create([
+            StudentActivityRollup(course_id=row['course'], **values)
+            for values in StudentActivityLog.objects.filter(
+                course_id=row['course'], activity_type='chat_message', timestamp__lt=until
+            ).annotate(day=TruncDate('timestamp')).values('student_id', 'day', 'activity_type').annotate(
+                event_count=Count('id')
+            ).order_by()
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0011_engagementrecalculationlock'),
+        ('courses', '0011_lesson_course_order_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('activity_type', models.CharField(choices=[('lesson_view', 'Lesson Viewed'), ('lesson_complete', 'Lesson Completed'), ('quiz_attempt', 'Quiz Attempted'), ('assignment_submit', 'Assignment Submitted'), ('forum_post', 'Forum Post Created'), ('chat_message', 'Chat Message Sent'), ('video_join', 'Video Session Joined')], max_length=20)),
+                ('event_count', models.PositiveIntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_activity_rollups', to='courses.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['course', 'activity_type', 'student'], name='analytics_s_course__9e02f7_idx')],
+                'unique_together': {('student', 'course', 'day', 'activity_type')},
+            },
+        ),
+        migrations.RunPython(rollup_chat_of_rolled_up_days, migrations.RunPython.noop),
+    ]
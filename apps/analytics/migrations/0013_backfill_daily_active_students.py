@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-17 09:30
+
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models.functions import TruncDate
+
+from apps.analytics.active_students import encode_ids, pack, unpack
+
+
+def backfill_daily_active_students(apps, schema_editor):
+    """Build the daily active-student bitsets from the stored activity logs.
+
+    Without them every enrolled student reads as inactive until
+    backfill_active_students is run. Bits are OR-ed into existing rows.
+    """
+    DailyActiveStudents = apps.get_model('analytics', 'DailyActiveStudents')
+    StudentActivityLog = apps.get_model('analytics', 'StudentActivityLog')
+    logs = StudentActivityLog.objects.filter(course__isnull=False)
+
+    for course_id in logs.values_list('course', flat=True).distinct().order_by():
+        active = defaultdict(set)
+        course_logs = logs.filter(course_id=course_id).annotate(
+            day=TruncDate('timestamp')
+        ).values_list('day', 'student').distinct().order_by()
+        for day, student_id in course_logs.iterator(chunk_size=5000):
+            active[day].add(student_id)
+
+        stored = {row.day: row for row in DailyActiveStudents.objects.filter(course_id=course_id)}
+        created, changed = [], []
+        for day, student_ids in active.items():
+            row = stored.get(day)
+            if row is None:
+                offset, bits = pack(encode_ids(student_ids))
+                created.append(DailyActiveStudents(course_id=course_id, day=day, offset=offset, bits=bits))
+            else:
+                row.offset, row.bits = pack(unpack(row.offset, bytes(row.bits)) | encode_ids(student_ids))
+                changed.append(row)
+        DailyActiveStudents.objects.bulk_create(created, batch_size=1000)
+        DailyActiveStudents.objects.bulk_update(changed, ['offset', 'bits'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0012_studentactivityrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_active_students, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0013_backfill_daily_active_students'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='coursereportartifact',
+            name='kind',
+            field=models.CharField(choices=[('engagement', 'Engagement'), ('retention', 'Retention'), ('dashboard', 'Instructor dashboard')], max_length=20),
+        ),
+    ]
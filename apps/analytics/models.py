@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
 from apps.courses.models import Course
 from django.utils import timezone
 
@@ -68,7 +70,8 @@ class StudentActivityLog(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='activity_logs', null=True, blank=True)
     activity_type = models.CharField(max_length=20, choices=ACTIVITY_TYPES)
     activity_data = models.JSONField(default=dict, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: buffered rows are written after the event happened
+    timestamp = models.DateTimeField(default=timezone.now)
     
     class Meta:
         ordering = ['-timestamp']
@@ -76,7 +79,240 @@ class StudentActivityLog(models.Model):
             models.Index(fields=['student', '-timestamp']),
             models.Index(fields=['course', '-timestamp']),
             models.Index(fields=['activity_type', '-timestamp']),
+            models.Index(fields=['course', 'student', '-timestamp']),
         ]
     
     def __str__(self):
-        return f"{self.student.username} - {self.get_activity_type_display()} ({self.timestamp})"
\ No newline at end of file
+        return f"{self.student.username} - {self.get_activity_type_display()} ({self.timestamp})"
+
+class StudentCourseMetrics(models.Model):
+    """Denormalized performance metrics per student and course, kept current by signals"""
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='course_metrics')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='student_metrics')
+
+    # Inputs
+    quiz_average = models.FloatField(default=0.0, help_text="Average quiz score percentage")
+    assignment_average = models.FloatField(default=0.0, help_text="Average assignment grade")
+    completed_lessons = models.PositiveIntegerField(default=0)
+    total_lessons = models.PositiveIntegerField(default=0)
+    forum_posts = models.PositiveIntegerField(default=0)
+    forum_threads = models.PositiveIntegerField(default=0)
+    chat_messages = models.PositiveIntegerField(default=0)
+
+    # Derived metrics
+    completion_rate = models.FloatField(default=0.0, help_text="Percentage of lessons completed")
+    engagement_score = models.FloatField(default=0.0, help_text="Overall engagement metric")
+
+    # Metadata
+    updated_at = models.DateTimeField(auto_now=True)
+
+    INPUT_FIELDS = [
+        'quiz_average', 'assignment_average', 'completed_lessons', 'total_lessons',
+        'forum_posts', 'forum_threads', 'chat_messages',
+    ]
+    METRIC_FIELDS = ['quiz_average', 'assignment_average', 'completion_rate', 'engagement_score']
+
+    class Meta:
+        unique_together = ('student', 'course')
+        ordering = ['course', 'student']
+        indexes = [
+            # The nightly pipeline looks up courses with recently changed metrics
+            models.Index(fields=['updated_at', 'course']),
+        ]
+
+    def __str__(self):
+        return f"{self.student.username} - {self.course.title} metrics"
+
+    def as_metrics(self):
+        """Return the metrics in the shape of calculate_student_performance"""
+        return {field: round(getattr(self, field), 2) for field in self.METRIC_FIELDS}
+
+
+class DailyActivityRollup(models.Model):
+    """Daily per-course, per-activity-type totals of StudentActivityLog"""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='activity_rollups', null=True, blank=True)
+    day = models.DateField()
+    activity_type = models.CharField(max_length=20, choices=StudentActivityLog.ACTIVITY_TYPES)
+    event_count = models.PositiveIntegerField(default=0)
+    student_count = models.PositiveIntegerField(default=0, help_text="Distinct students active that day")
+
+    class Meta:
+        ordering = ['-day']
+        unique_together = ('course', 'day', 'activity_type')
+        indexes = [
+            models.Index(fields=['course', '-day']),
+        ]
+
+    def __str__(self):
+        return f"{self.course} - {self.activity_type} ({self.day})"
+
+
+class StudentActivityRollup(models.Model):
+    """Daily per-student totals of the activity types that feed StudentCourseMetrics"""
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='activity_rollups')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='student_activity_rollups')
+    day = models.DateField()
+    activity_type = models.CharField(max_length=20, choices=StudentActivityLog.ACTIVITY_TYPES)
+    event_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day']
+        unique_together = ('student', 'course', 'day', 'activity_type')
+        indexes = [
+            models.Index(fields=['course', 'activity_type', 'student']),
+        ]
+
+    def __str__(self):
+        return f"{self.student} - {self.course} - {self.activity_type} ({self.day})"
+
+
+class CourseReportArtifact(models.Model):
+    """Precomputed JSON report for a course, versioned by a hash of its content"""
+    REPORT_KINDS = [
+        ('engagement', 'Engagement'),
+        ('retention', 'Retention'),
+        ('dashboard', 'Instructor dashboard'),
+    ]
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='report_artifacts')
+    kind = models.CharField(max_length=20, choices=REPORT_KINDS)
+    content = models.TextField(help_text="Serialized JSON payload")
+    content_hash = models.CharField(max_length=64, help_text="SHA-256 of the content")
+    generated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('course', 'kind')
+
+    def __str__(self):
+        return f"{self.course} - {self.kind} ({self.content_hash[:12]})"
+
+
+class EngagementFormula(models.Model):
+    """Per-course weights and caps of the engagement score; courses without one use the defaults"""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, related_name='engagement_formula')
+
+    # Weights of the 0-100 components; they must add up to 1
+    quiz_weight = models.FloatField(default=0.3)
+    assignment_weight = models.FloatField(default=0.3)
+    completion_weight = models.FloatField(default=0.2)
+    forum_weight = models.FloatField(default=0.2)
+    chat_weight = models.FloatField(default=0.0)
+
+    # Activity caps
+    thread_points = models.PositiveIntegerField(default=2, help_text="Forum activity points per thread; posts count 1")
+    forum_cap = models.PositiveIntegerField(
+        default=10, validators=[MinValueValidator(1)], help_text="Forum activity points that count as 100%"
+    )
+    chat_cap = models.PositiveIntegerField(
+        default=20, validators=[MinValueValidator(1)], help_text="Chat messages that count as 100%"
+    )
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    WEIGHT_FIELDS = ['quiz_weight', 'assignment_weight', 'completion_weight', 'forum_weight', 'chat_weight']
+
+    def __str__(self):
+        return f"{self.course.title} engagement formula"
+
+    def clean(self):
+        if any(getattr(self, field) < 0 for field in self.WEIGHT_FIELDS):
+            raise ValidationError("Weights cannot be negative")
+        if abs(sum(getattr(self, field) for field in self.WEIGHT_FIELDS) - 1) > 1e-6:
+            raise ValidationError("Weights must add up to 1")
+
+
+class CompletionBitmap(models.Model):
+    """Completed lessons of a student in a course, one bit per lesson position.
+
+    Bit n (byte n // 8, value 1 << n % 8) is set when the n-th lesson in
+    course order is completed. `layout_version` identifies the lesson order
+    the bits were built for; rows with an outdated version are rebuilt on read.
+    """
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='completion_bitmaps')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='completion_bitmaps')
+    bits = models.BinaryField(default=b'')
+    completed_count = models.PositiveIntegerField(default=0)
+    layout_version = models.CharField(max_length=16)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('student', 'course')
+
+    def __str__(self):
+        return f"{self.student.username} - {self.course.title} completion bitmap"
+
+
+class DailyActiveStudents(models.Model):
+    """Students active in a course on one day, as a bitset of student ids.
+
+    Bit n (byte n // 8, value 1 << n % 8) stands for student id
+    `offset + n`. The offset skips the empty low ids, so a course whose
+    students all joined recently does not store a run of zero bytes.
+    """
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='daily_active_students')
+    day = models.DateField()
+    offset = models.PositiveIntegerField(default=0)
+    bits = models.BinaryField(default=b'')
+
+    class Meta:
+        unique_together = ('course', 'day')
+
+    def __str__(self):
+        return f"{self.course.title} active students on {self.day}"
+
+
+class EngagementRecalculationLock(models.Model):
+    """Held while a course's engagement metrics are being recalculated.
+
+    Taken with a conditional UPDATE, so web processes and Celery workers
+    all see the same lock. `locked_until` bounds how long a crashed
+    recalculation can block the next one.
+    """
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, related_name='engagement_recalculation_lock')
+    locked_until = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.course.title} recalculation lock"
+
+
+class AnalyticsPipelineRun(models.Model):
+    """One run of the nightly analytics pipeline.
+
+    Activity between `activity_since` and `activity_until` was considered;
+    the next run starts from the `activity_until` of the last successful one.
+    """
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    activity_since = models.DateTimeField(null=True, blank=True)
+    activity_until = models.DateTimeField()
+    course_ids = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"Analytics pipeline run {self.started_at} ({self.status})"
+
+
+class AnalyticsPipelineStage(models.Model):
+    """Timing of one stage, or one shard of a stage, of a pipeline run"""
+    run = models.ForeignKey(AnalyticsPipelineRun, on_delete=models.CASCADE, related_name='stages')
+    stage = models.CharField(max_length=20)
+    shard = models.CharField(max_length=100, blank=True)
+    started_at = models.DateTimeField()
+    duration = models.FloatField(help_text="Seconds")
+    items = models.PositiveIntegerField(default=0, help_text="Rows written or courses processed")
+
+    class Meta:
+        ordering = ['started_at']
+
+    def __str__(self):
+        return f"{self.stage} {self.shard} ({self.duration:.2f}s)"
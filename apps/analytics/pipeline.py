@@ -0,0 +1,145 @@
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.utils import timezone
+
+from apps.courses.models import Course
+from .bitmaps import lesson_layout
+from .dropout import get_at_risk_students, invalidate_dropout_risk
+from .funnel import get_lesson_funnel, invalidate_lesson_funnel
+from .models import AnalyticsPipelineRun, AnalyticsPipelineStage, StudentActivityLog, StudentCourseMetrics
+from .utils import calculate_course_engagement, create_performance_snapshots
+
+# Students per snapshot shard; each shard is one task and one bulk INSERT
+PIPELINE_SHARD_SIZE = 500
+# How far back the very first run looks for changes
+FIRST_RUN_LOOKBACK = timedelta(days=1)
+
+
+@contextmanager
+def record_stage(run_id, stage, shard=''):
+    """Time a block and log it as a stage of the run; set `items` on the yielded dict"""
+    entry = {'items': 0}
+    started_at = timezone.now()
+    started = time.perf_counter()
+    yield entry
+    AnalyticsPipelineStage.objects.create(
+        run_id=run_id,
+        stage=stage,
+        shard=shard,
+        started_at=started_at,
+        duration=time.perf_counter() - started,
+        items=entry['items']
+    )
+
+
+def changed_course_ids(since, until):
+    """Courses with new activity or changed student metrics in since..until"""
+    changed = set(
+        StudentActivityLog.objects.filter(
+            course__isnull=False,
+            timestamp__gte=since,
+            timestamp__lt=until
+        ).values_list('course', flat=True).distinct().order_by()
+    )
+    # Metrics rows are refreshed by every progress, quiz, assignment and forum write
+    changed.update(
+        StudentCourseMetrics.objects.filter(
+            updated_at__gte=since,
+            updated_at__lt=until
+        ).values_list('course', flat=True).distinct().order_by()
+    )
+    return sorted(changed)
+
+
+def start_pipeline_run():
+    """Open a run and detect the courses it has to recompute"""
+    until = timezone.now()
+    last = AnalyticsPipelineRun.objects.filter(status='succeeded').order_by('-activity_until').first()
+    if last is not None:
+        since = last.activity_until
+    else:
+        # Nothing succeeded yet: cover everything the failed runs were meant to
+        first = AnalyticsPipelineRun.objects.order_by('activity_since').values_list('activity_since', flat=True).first()
+        since = first or until - FIRST_RUN_LOOKBACK
+
+    run = AnalyticsPipelineRun.objects.create(activity_since=since, activity_until=until)
+    with record_stage(run.id, 'detect') as entry:
+        run.course_ids = changed_course_ids(since, until)
+        entry['items'] = len(run.course_ids)
+    run.save(update_fields=['course_ids'])
+    return run
+
+
+def snapshot_shards(course_ids, shard_size=PIPELINE_SHARD_SIZE):
+    """(course_id, student_ids) pairs covering every enrolled student of the courses"""
+    shards = []
+    enrolments = Course.students.through.objects.filter(
+        course_id__in=course_ids
+    ).order_by('course_id', 'user_id').values_list('course_id', 'user_id')
+
+    current, student_ids = None, []
+    for course_id, student_id in enrolments.iterator(chunk_size=5000):
+        if course_id != current or len(student_ids) >= shard_size:
+            if student_ids:
+                shards.append((current, student_ids))
+            current, student_ids = course_id, []
+        student_ids.append(student_id)
+    if student_ids:
+        shards.append((current, student_ids))
+    return shards
+
+
+def run_snapshot_shard(run_id, course_id, student_ids):
+    """Snapshot the students of one shard whose metrics changed since their last snapshot"""
+    course = Course.objects.filter(id=course_id).first()
+    with record_stage(run_id, 'snapshots', f'course {course_id}, students {student_ids[0]}-{student_ids[-1]}') as entry:
+        if course is not None:
+            entry['items'] = len(create_performance_snapshots(course, student_ids, changed_only=True))
+    return entry['items']
+
+
+def run_engagement_stage(run_id, course_id):
+    """Recalculate and publish one course's engagement metrics"""
+    course = Course.objects.filter(id=course_id).first()
+    with record_stage(run_id, 'engagement', f'course {course_id}') as entry:
+        if course is not None:
+            calculate_course_engagement(course)
+            entry['items'] = 1
+    return entry['items']
+
+
+def run_cache_stage(run_id, course_ids):
+    """Rebuild the cached per-course analytics so the first morning request is warm"""
+    with record_stage(run_id, 'caches') as entry:
+        for course in Course.objects.filter(id__in=course_ids):
+            invalidate_dropout_risk(course.id)
+            invalidate_lesson_funnel(course.id)
+            lesson_layout(course.id)
+            get_at_risk_students(course)
+            get_lesson_funnel(course)
+            entry['items'] += 1
+    return entry['items']
+
+
+def finish_pipeline_run(run_id, status='succeeded', error=''):
+    AnalyticsPipelineRun.objects.filter(id=run_id).update(
+        status=status,
+        error=error,
+        finished_at=timezone.now()
+    )
+
+
+def run_pipeline_locally(run):
+    """Run every stage of a pipeline run in this process, in order"""
+    try:
+        for course_id, student_ids in snapshot_shards(run.course_ids):
+            run_snapshot_shard(run.id, course_id, student_ids)
+        for course_id in run.course_ids:
+            run_engagement_stage(run.id, course_id)
+        run_cache_stage(run.id, run.course_ids)
+    except Exception as exc:
+        finish_pipeline_run(run.id, 'failed', repr(exc))
+        raise
+    finish_pipeline_run(run.id)
@@ -0,0 +1,138 @@
+import hashlib
+import json
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from .active_students import active_student_counts
+from .dropout import get_at_risk_students
+from .models import CourseReportArtifact
+from .retention import build_retention_matrix
+from .rollups import get_activity_timeline
+
+# Artifacts are rewritten on every publish; the timeout only evicts courses nobody reads
+REPORT_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
+
+def report_cache_key(course_id, kind):
+    return f'analytics:report:{course_id}:{kind}'
+
+
+def engagement_payload(metrics):
+    """The engagement report as served by the API, minus the live refresh state"""
+    return {
+        'total_students': metrics.total_students,
+        'active_students': metrics.active_students,
+        'average_completion_rate': metrics.average_completion_rate,
+        'average_quiz_score': metrics.average_quiz_score,
+        'forum_activity_count': metrics.forum_activity_count,
+        'dropout_risk_count': metrics.dropout_risk_count,
+        'calculated_at': metrics.calculated_at.isoformat(),
+    }
+
+
+def dashboard_payload(course):
+    """Course-level figures of the instructor dashboard"""
+    return {
+        'active_counts': active_student_counts(course.id),
+        'activity_timeline': [
+            {'day': point['day'].isoformat(), 'count': point['count']}
+            for point in get_activity_timeline(course, days=30)
+        ],
+        'at_risk': [
+            {
+                'student_id': entry['student_id'],
+                'last_activity': entry['last_activity'] and entry['last_activity'].isoformat(),
+            }
+            for entry in get_at_risk_students(course)
+        ],
+    }
+
+
+def publish_report(course_id, kind, payload, generated_at=None):
+    """Store a report artifact and put it in the cache; returns the stored report.
+
+    The content is serialized canonically, so equal payloads get equal
+    hashes and clients holding the current ETag keep getting 304s.
+    `generated_at` is when the data was calculated (default: now).
+    """
+    content = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    report = {
+        'content': content,
+        'content_hash': hashlib.sha256(content.encode()).hexdigest(),
+        'generated_at': generated_at or timezone.now(),
+    }
+    CourseReportArtifact.objects.bulk_create(
+        [CourseReportArtifact(course_id=course_id, kind=kind, **report)],
+        update_conflicts=True,
+        unique_fields=['course', 'kind'],
+        update_fields=['content', 'content_hash', 'generated_at']
+    )
+    cache.set(report_cache_key(course_id, kind), report, REPORT_CACHE_TIMEOUT)
+    return report
+
+
+def publish_course_reports(course, metrics):
+    """Publish every report artifact of a course after its metrics were recalculated"""
+    publish_report(course.id, 'engagement', engagement_payload(metrics), metrics.calculated_at)
+    publish_report(course.id, 'retention', build_retention_matrix(course), metrics.calculated_at)
+    publish_report(course.id, 'dashboard', dashboard_payload(course), metrics.calculated_at)
+
+
+def cache_is_process_local():
+    """Whether other processes can publish reports this process's cache never sees"""
+    return isinstance(caches['default'], LocMemCache)
+
+
+def get_report(course_id, kind):
+    """The published report from the cache, falling back to the database; None if never published.
+
+    With a process-local cache, another worker may have republished the
+    report, so the cached copy is only served while its hash matches the
+    stored artifact.
+    """
+    key = report_cache_key(course_id, kind)
+    report = cache.get(key)
+    if report is not None and cache_is_process_local():
+        stored_hash = CourseReportArtifact.objects.filter(
+            course_id=course_id,
+            kind=kind
+        ).values_list('content_hash', flat=True).first()
+        if stored_hash != report['content_hash']:
+            report = None
+    if report is None:
+        report = CourseReportArtifact.objects.filter(
+            course_id=course_id,
+            kind=kind
+        ).values('content', 'content_hash', 'generated_at').first()
+        if report is not None:
+            cache.set(key, report, REPORT_CACHE_TIMEOUT)
+    return report
+
+
+def report_response(request, report, extra=None):
+    """Serve a report with a strong ETag, or 304 if the client already has it.
+
+    `extra` adds live fields to the payload; they are folded into the ETag
+    so that the tag still identifies the exact bytes served.
+    """
+    if extra:
+        version = hashlib.sha256(f"{report['content_hash']}:{json.dumps(extra, sort_keys=True)}".encode()).hexdigest()
+    else:
+        version = report['content_hash']
+    etag = quote_etag(version)
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        content = report['content']
+        if extra:
+            content = json.dumps({**json.loads(content), **extra}, sort_keys=True, separators=(',', ':'))
+        response = HttpResponse(content, content_type='application/json')
+
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
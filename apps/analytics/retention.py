@@ -0,0 +1,78 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+
+from .active_students import active_bitsets, encode_ids
+from .models import StudentActivityLog
+
+
+def week_number(day):
+    """Weeks since 0001-01-01, which was a Monday, like TruncWeek's weeks"""
+    return (day.toordinal() - 1) // 7
+
+
+def week_start(number):
+    return date.fromordinal(number * 7 + 1)
+
+
+def weekly_active_bitsets(course, current_week):
+    """{week number: bitset of the students active that week} up to the current week.
+
+    The daily active-student bitsets are never purged, so weeks whose raw
+    logs were compacted away still count. Distinct (student, week) pairs
+    of the raw logs are OR-ed in as well, in case some were never marked.
+    """
+    weeks = defaultdict(int)
+    for day, bitset in active_bitsets(course.id, date.min, week_start(current_week + 1) - timedelta(days=1)).items():
+        weeks[week_number(day)] |= bitset
+
+    pairs = StudentActivityLog.objects.filter(
+        course=course
+    ).annotate(
+        week=TruncWeek('timestamp')
+    ).values_list('student', 'week').distinct().order_by()
+
+    raw = defaultdict(list)
+    for student_id, week in pairs.iterator(chunk_size=5000):
+        week = week_number(timezone.localtime(week).date())
+        if week <= current_week:
+            raw[week].append(student_id)
+    for week, student_ids in raw.items():
+        weeks[week] |= encode_ids(student_ids)
+
+    return weeks
+
+
+def build_retention_matrix(course):
+    """Weekly cohort retention for a course.
+
+    Students belong to the cohort of the week they were first active in the
+    course. For each cohort, `retained[n]` counts its students active `n`
+    weeks later, up to the current week.
+
+    Every week is one bitset of student ids, so a cohort is the bits not
+    seen in any earlier week, and retention is a bit count of the cohort
+    AND-ed with a later week, without building per-student objects.
+    """
+    current_week = week_number(timezone.localdate())
+    weeks = weekly_active_bitsets(course, current_week)
+
+    cohorts = []
+    seen = 0
+    for cohort in sorted(weeks):
+        members = weeks[cohort] & ~seen
+        seen |= members
+        size = members.bit_count()
+        if not size:
+            continue
+        counts = [(members & weeks.get(week, 0)).bit_count() for week in range(cohort, current_week + 1)]
+        cohorts.append({
+            'week': week_start(cohort).isoformat(),
+            'size': size,
+            'retained': counts,
+            'retention': [round(count / size * 100, 1) for count in counts],
+        })
+
+    return {'cohorts': cohorts}
@@ -0,0 +1,154 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .archive import archived_spans
+from .models import StudentActivityLog, DailyActivityRollup, StudentActivityRollup
+
+# Engagement metrics look back 14 days at raw activity; never delete inside that window
+MIN_RETENTION_DAYS = 15
+
+# Activity types counted per student in StudentCourseMetrics; also rolled up per student
+STUDENT_ROLLUP_TYPES = ('chat_message',)
+
+
+def start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rolled_up_until(course_id):
+    """Last day whose activity for the course is fully stored in the rollup table"""
+    return DailyActivityRollup.objects.filter(course_id=course_id).aggregate(day=Max('day'))['day']
+
+
+def rollup_activity_logs(before=None):
+    """Aggregate raw activity of complete days that are not rolled up yet.
+
+    Each course is rolled up from the day after its last rollup row up to,
+    but excluding, `before` (default: today). Activity types listed in
+    STUDENT_ROLLUP_TYPES are also rolled up per student in the same pass.
+    Returns the number of course rollup rows written.
+    """
+    before = before or timezone.localdate()
+    written = 0
+
+    course_ids = StudentActivityLog.objects.filter(
+        timestamp__lt=start_of_day(before)
+    ).values_list('course', flat=True).distinct().order_by()
+
+    for course_id in course_ids:
+        logs = StudentActivityLog.objects.filter(course_id=course_id, timestamp__lt=start_of_day(before))
+        last_day = rolled_up_until(course_id)
+        if last_day is not None:
+            logs = logs.filter(timestamp__gte=start_of_day(last_day + timedelta(days=1)))
+
+        rows = [
+            DailyActivityRollup(course_id=course_id, **values)
+            for values in logs.annotate(
+                day=TruncDate('timestamp')
+            ).values('day', 'activity_type').annotate(
+                event_count=Count('id'),
+                student_count=Count('student', distinct=True)
+            ).order_by()
+        ]
+        DailyActivityRollup.objects.bulk_create(rows, batch_size=1000)
+        written += len(rows)
+
+        if course_id is not None:
+            StudentActivityRollup.objects.bulk_create([
+                StudentActivityRollup(course_id=course_id, **values)
+                for values in logs.filter(activity_type__in=STUDENT_ROLLUP_TYPES).annotate(
+                    day=TruncDate('timestamp')
+                ).values('student_id', 'day', 'activity_type').annotate(
+                    event_count=Count('id')
+                ).order_by()
+            ], batch_size=1000)
+
+    return written
+
+
+def purge_activity_logs(older_than_days, batch_size=5000, archive_root=None):
+    """Delete raw activity older than `older_than_days` days in batches.
+
+    Only rows of days already in the rollup table and of months already in
+    the activity archive are deleted, so nothing is lost from the daily
+    totals or the archive; rows of other months are left in place. Returns
+    the number of rows deleted.
+    """
+    if older_than_days < MIN_RETENTION_DAYS:
+        raise ValueError(f"Raw activity must be kept for at least {MIN_RETENTION_DAYS} days")
+
+    cutoff = start_of_day(timezone.localdate() - timedelta(days=older_than_days))
+    deleted = 0
+
+    archived = Q()
+    for start, end in archived_spans(archive_root):
+        archived |= Q(timestamp__gte=start, timestamp__lt=end)
+    if not archived:
+        return deleted
+
+    course_ids = StudentActivityLog.objects.filter(
+        timestamp__lt=cutoff
+    ).values_list('course', flat=True).distinct().order_by()
+
+    for course_id in course_ids:
+        last_day = rolled_up_until(course_id)
+        if last_day is None:
+            continue
+        course_cutoff = min(cutoff, start_of_day(last_day + timedelta(days=1)))
+        stale = StudentActivityLog.objects.filter(archived, course_id=course_id, timestamp__lt=course_cutoff)
+
+        while ids := list(stale.values_list('id', flat=True).order_by()[:batch_size]):
+            StudentActivityLog.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+
+    return deleted
+
+
+def student_activity_counts(course_id, activity_type, student_ids):
+    """Per-student event counts of one activity type in a course, all time.
+
+    Rolled-up days are read from StudentActivityRollup, so purging raw rows
+    leaves the counts unchanged; only days after the course's last rollup
+    touch the raw log table.
+    """
+    counts = dict(StudentActivityRollup.objects.filter(
+        course_id=course_id, activity_type=activity_type, student__in=student_ids
+    ).values('student').annotate(count=Sum('event_count')).values_list('student', 'count').order_by())
+
+    raw = StudentActivityLog.objects.filter(course_id=course_id, activity_type=activity_type, student__in=student_ids)
+    last_day = rolled_up_until(course_id)
+    if last_day is not None:
+        raw = raw.filter(timestamp__gte=start_of_day(last_day + timedelta(days=1)))
+    for student_id, count in raw.values('student').annotate(count=Count('id')).values_list('student', 'count').order_by():
+        counts[student_id] = counts.get(student_id, 0) + count
+
+    return counts
+
+
+def get_activity_timeline(course, days=30):
+    """Daily activity counts for the last `days` days, oldest first.
+
+    Rolled-up days are read from DailyActivityRollup; only days after the
+    course's last rollup touch the raw log table.
+    """
+    today = timezone.localdate()
+    first_day = today - timedelta(days=days - 1)
+    counts = {}
+
+    rolled = DailyActivityRollup.objects.filter(course=course, day__gte=first_day)
+    for day, count in rolled.values('day').annotate(count=Sum('event_count')).values_list('day', 'count').order_by():
+        counts[day] = count
+
+    last_day = rolled_up_until(course.id)
+    raw_from = first_day if last_day is None or last_day < first_day else last_day + timedelta(days=1)
+    raw = StudentActivityLog.objects.filter(
+        course=course,
+        timestamp__gte=start_of_day(raw_from)
+    ).annotate(day=TruncDate('timestamp')).values('day').annotate(count=Count('id')).values_list('day', 'count').order_by()
+    for day, count in raw:
+        counts[day] = counts.get(day, 0) + count
+
+    return [{'day': day, 'count': counts[day]} for day in sorted(counts)]
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .consumers import DashboardCountersConsumer
+
+websocket_urlpatterns = [
+    path('ws/analytics/courses/<int:course_id>/', DashboardCountersConsumer.as_asgi()),
+]
@@ -0,0 +1,184 @@
+from collections import Counter
+
+from django.db.models import Q
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from apps.chat.models import Message
+from apps.core.signals import cascaded_from
+from apps.courses.models import Course, Lesson, LessonProgress, Submission
+from apps.courses.progress import lesson_progress_bulk_updated
+from apps.quiz.models import QuizSubmission
+from apps.forum.models import DiscussionThread, DiscussionPost
+from .active_students import record_active_students
+from .dropout import invalidate_dropout_risk
+from .funnel import invalidate_lesson_funnel
+from .activity import activity_flushed
+from .bitmaps import refresh_completion_bitmap
+from .live import publish_counter_deltas
+from .models import CompletionBitmap, EngagementFormula, StudentActivityLog
+from .utils import log_student_activity, refresh_student_metrics, refresh_course_metrics, rescore_course_metrics
+
+
+@receiver(post_save, sender=LessonProgress)
+@receiver(post_delete, sender=LessonProgress)
+def update_metrics_for_lesson_progress(sender, instance, origin=None, **kwargs):
+    # Deleting a lesson refreshes the whole course once instead
+    if cascaded_from(origin, Course, Lesson):
+        return
+    course_id = instance.lesson.course_id
+    refresh_student_metrics(instance.student_id, course_id, ['lessons'])
+    invalidate_dropout_risk(course_id)
+    invalidate_lesson_funnel(course_id)
+
+    # The stored count before the refresh tells whether this write completed or reopened a lesson
+    before = CompletionBitmap.objects.filter(
+        student_id=instance.student_id,
+        course_id=course_id
+    ).values_list('completed_count', flat=True).first()
+    after = refresh_completion_bitmap(instance.student_id, course_id).completed_count
+    if before is None:
+        # Never stored: only a save can have changed anything
+        before = after - int('created' in kwargs and instance.is_completed)
+    publish_counter_deltas(course_id, completions=after - before)
+
+
+@receiver(lesson_progress_bulk_updated)
+def update_metrics_for_bulk_lesson_progress(sender, student, completed, reopened, **kwargs):
+    # Only real state changes are reported, so the deltas need no stored count
+    deltas = Counter(completed.values())
+    deltas.subtract(reopened.values())
+    for course_id, delta in deltas.items():
+        refresh_student_metrics(student.id, course_id, ['lessons'])
+        invalidate_dropout_risk(course_id)
+        invalidate_lesson_funnel(course_id)
+        refresh_completion_bitmap(student.id, course_id)
+        publish_counter_deltas(course_id, completions=delta)
+
+
+@receiver(post_save, sender=Lesson)
+def update_metrics_for_new_lesson(sender, instance, created, **kwargs):
+    # Every student's completion rate depends on the number of lessons
+    if created:
+        refresh_course_metrics(instance.course_id, ['lessons'])
+        invalidate_dropout_risk(instance.course_id)
+
+
+@receiver(post_delete, sender=Lesson)
+def update_metrics_for_deleted_lesson(sender, instance, origin=None, **kwargs):
+    if cascaded_from(origin, Course):
+        return
+    refresh_course_metrics(instance.course_id, ['lessons'])
+    invalidate_dropout_risk(instance.course_id)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_lesson_caches(sender, instance, **kwargs):
+    # Titles and order are part of the funnel, so any lesson save counts
+    invalidate_lesson_funnel(instance.course_id)
+
+
+@receiver(post_save, sender=Submission)
+@receiver(post_delete, sender=Submission)
+def update_metrics_for_submission(sender, instance, origin=None, **kwargs):
+    if cascaded_from(origin, Course):
+        return
+    refresh_student_metrics(instance.student_id, instance.assignment.lesson.course_id, ['assignments'])
+    if kwargs.get('created'):
+        publish_counter_deltas(instance.assignment.lesson.course_id, submissions=1)
+
+
+@receiver(pre_save, sender=QuizSubmission)
+def note_quiz_submission_finishing(sender, instance, **kwargs):
+    # Quiz submissions are created when a quiz starts; they are submitted when end_time is first set
+    instance._finishing = instance.end_time is not None and (
+        instance.pk is None or
+        QuizSubmission.objects.filter(pk=instance.pk, end_time__isnull=True).exists()
+    )
+
+
+@receiver(post_save, sender=QuizSubmission)
+@receiver(post_delete, sender=QuizSubmission)
+def update_metrics_for_quiz_submission(sender, instance, origin=None, **kwargs):
+    if cascaded_from(origin, Course):
+        return
+    refresh_student_metrics(instance.student_id, instance.quiz.course_id, ['quizzes'])
+    if getattr(instance, '_finishing', False):
+        instance._finishing = False
+        publish_counter_deltas(instance.quiz.course_id, submissions=1)
+
+
+@receiver(post_save, sender=DiscussionThread)
+@receiver(post_delete, sender=DiscussionThread)
+def update_metrics_for_thread(sender, instance, origin=None, **kwargs):
+    if cascaded_from(origin, Course):
+        return
+    refresh_student_metrics(instance.author_id, instance.course_id, ['forum'])
+
+
+@receiver(post_save, sender=DiscussionPost)
+@receiver(post_delete, sender=DiscussionPost)
+def update_metrics_for_post(sender, instance, origin=None, **kwargs):
+    if cascaded_from(origin, Course):
+        return
+    refresh_student_metrics(instance.author_id, instance.thread.course_id, ['forum'])
+
+
+@receiver(post_save, sender=Message)
+def log_chat_message(sender, instance, created, **kwargs):
+    # Threads are not tied to a course; a message counts for every course the
+    # sender studies in together with another participant of the thread
+    if not created:
+        return
+    others = instance.thread.participants.exclude(pk=instance.sender_id)
+    courses = Course.objects.filter(students=instance.sender_id).filter(
+        Q(students__in=others) | Q(instructors__in=others)
+    ).distinct()
+    for course in courses:
+        log_student_activity(instance.sender, 'chat_message', course, message_id=instance.id)
+
+
+@receiver(m2m_changed, sender=Course.students.through)
+def invalidate_cohort_caches_for_enrolment(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        course_ids = [instance.id]
+    elif pk_set:
+        course_ids = pk_set
+    else:
+        # A user's enrolments were cleared; their course ids are no longer known
+        course_ids = Course.objects.values_list('id', flat=True)
+    invalidate_dropout_risk(*course_ids)
+    invalidate_lesson_funnel(*course_ids)
+
+
+def _update_for_activity(logs):
+    today = timezone.localdate()
+    for (course_id, day), added in record_active_students(logs).items():
+        if day == today:
+            publish_counter_deltas(course_id, active_today=added.bit_count())
+    invalidate_dropout_risk(*{log.course_id for log in logs})
+    chatters = {(log.student_id, log.course_id) for log in logs if log.activity_type == 'chat_message' and log.course_id}
+    for student_id, course_id in chatters:
+        refresh_student_metrics(student_id, course_id, ['chat'])
+
+
+@receiver(post_save, sender=StudentActivityLog)
+def update_for_activity(sender, instance, created, **kwargs):
+    if created:
+        _update_for_activity([instance])
+
+
+@receiver(activity_flushed)
+def update_for_flushed_activity(sender, logs, **kwargs):
+    _update_for_activity(logs)
+
+
+@receiver(post_save, sender=EngagementFormula)
+@receiver(post_delete, sender=EngagementFormula)
+def rescore_for_formula_change(sender, instance, origin=None, **kwargs):
+    if cascaded_from(origin, Course):
+        return
+    rescore_course_metrics(instance.course_id)
@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import StudentPerformanceSnapshot, StudentCourseMetrics
+
+SNAPSHOT_FIELDS = StudentCourseMetrics.METRIC_FIELDS
+
+
+def latest_snapshot_values(course, student_ids):
+    """Map each student to the metric values of their newest snapshot in the course"""
+    latest = StudentPerformanceSnapshot.objects.filter(
+        course=course,
+        student_id__in=student_ids
+    ).annotate(
+        position=Window(RowNumber(), partition_by=[F('student_id')], order_by=F('snapshot_date').desc())
+    ).filter(position=1).values_list('student_id', *SNAPSHOT_FIELDS)
+    return {student_id: tuple(values) for student_id, *values in latest}
+
+
+def _thin(snapshots, trunc, batch_size):
+    """Keep only the newest snapshot of each student and period, one course at a time"""
+    deleted = 0
+    course_ids = snapshots.values_list('course', flat=True).distinct().order_by()
+
+    for course_id in course_ids:
+        surplus = list(
+            snapshots.filter(course_id=course_id).annotate(
+                position=Window(
+                    RowNumber(),
+                    partition_by=[F('student_id'), trunc('snapshot_date')],
+                    order_by=F('snapshot_date').desc()
+                )
+            ).filter(position__gt=1).values_list('id', flat=True)
+        )
+        for i in range(0, len(surplus), batch_size):
+            StudentPerformanceSnapshot.objects.filter(id__in=surplus[i:i + batch_size]).delete()
+        deleted += len(surplus)
+
+    return deleted
+
+
+def thin_performance_snapshots(weekly_after_days=30, monthly_after_days=180, batch_size=5000):
+    """Reduce old snapshots to weekly and then monthly resolution.
+
+    Snapshots older than `weekly_after_days` keep one row per student,
+    course and week; older than `monthly_after_days`, one per month. The
+    newest row of each period is kept, so a trend filled forward from the
+    remaining rows still ends every period on the right value. Returns the
+    number of rows deleted.
+    """
+    if monthly_after_days < weekly_after_days:
+        raise ValueError("Monthly thinning must start after weekly thinning")
+
+    now = timezone.now()
+    weekly_cutoff = now - timedelta(days=weekly_after_days)
+    monthly_cutoff = now - timedelta(days=monthly_after_days)
+
+    deleted = _thin(
+        StudentPerformanceSnapshot.objects.filter(snapshot_date__lt=monthly_cutoff),
+        TruncMonth,
+        batch_size
+    )
+    deleted += _thin(
+        StudentPerformanceSnapshot.objects.filter(snapshot_date__gte=monthly_cutoff, snapshot_date__lt=weekly_cutoff),
+        TruncWeek,
+        batch_size
+    )
+    return deleted
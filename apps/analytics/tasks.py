@@ -0,0 +1,161 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from celery import chain, group, shared_task
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.courses.models import Course
+from .pipeline import (
+    finish_pipeline_run,
+    run_cache_stage,
+    run_engagement_stage,
+    run_pipeline_locally,
+    run_snapshot_shard,
+    snapshot_shards,
+    start_pipeline_run,
+)
+from .models import EngagementRecalculationLock
+from .utils import calculate_course_engagement
+
+logger = logging.getLogger(__name__)
+
+# Engagement metrics older than this are served but recalculated in the background
+ENGAGEMENT_MAX_AGE = timedelta(days=1)
+# Upper bound on how long a crashed recalculation can block the next one
+RECALCULATION_LOCK_TIMEOUT = 10 * 60
+
+# Runs recalculations in-process when no Celery broker is configured
+executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='analytics')
+
+
+def acquire_recalculation_lock(course_id):
+    """Take the course's recalculation lock in the database; False if someone holds it"""
+    now = timezone.now()
+    EngagementRecalculationLock.objects.bulk_create(
+        [EngagementRecalculationLock(course_id=course_id)],
+        ignore_conflicts=True
+    )
+    free = Q(locked_until__isnull=True) | Q(locked_until__lte=now)
+    return EngagementRecalculationLock.objects.filter(free, course_id=course_id).update(
+        locked_until=now + timedelta(seconds=RECALCULATION_LOCK_TIMEOUT)
+    ) == 1
+
+
+def release_recalculation_lock(course_id):
+    EngagementRecalculationLock.objects.filter(course_id=course_id).update(locked_until=None)
+
+
+def is_stale(metrics):
+    return metrics is None or timezone.now() - metrics.calculated_at > ENGAGEMENT_MAX_AGE
+
+
+def is_report_stale(report):
+    return report is None or timezone.now() - report['generated_at'] > ENGAGEMENT_MAX_AGE
+
+
+@shared_task
+def recalculate_course_engagement(course_id):
+    """Recalculate a course's engagement metrics and release its lock"""
+    try:
+        course = Course.objects.filter(id=course_id).first()
+        if course is not None:
+            calculate_course_engagement(course)
+    finally:
+        release_recalculation_lock(course_id)
+
+
+def _recalculate_locally(course_id):
+    try:
+        recalculate_course_engagement(course_id)
+    except Exception:
+        logger.exception("Engagement recalculation failed for course %s", course_id)
+    finally:
+        # Worker threads get their own connection; don't leak it
+        connection.close()
+
+
+def schedule_engagement_recalculation(course_id):
+    """Queue a background recalculation unless one is already pending for the course.
+
+    Returns True when a recalculation was queued.
+    """
+    if not acquire_recalculation_lock(course_id):
+        return False
+
+    if settings.ANALYTICS_USE_CELERY:
+        try:
+            recalculate_course_engagement.delay(course_id)
+            return True
+        except Exception:
+            logger.exception("Could not queue engagement recalculation on Celery; running it locally")
+
+    executor.submit(_recalculate_locally, course_id)
+    return True
+
+
+def is_recalculation_pending(course_id):
+    return EngagementRecalculationLock.objects.filter(course_id=course_id, locked_until__gt=timezone.now()).exists()
+
+
+@shared_task
+def pipeline_snapshot_shard(run_id, course_id, student_ids):
+    return run_snapshot_shard(run_id, course_id, student_ids)
+
+
+@shared_task
+def pipeline_engagement(run_id, course_id):
+    return run_engagement_stage(run_id, course_id)
+
+
+@shared_task
+def pipeline_caches(run_id, course_ids):
+    return run_cache_stage(run_id, course_ids)
+
+
+@shared_task
+def pipeline_finished(run_id):
+    finish_pipeline_run(run_id)
+
+
+@shared_task
+def pipeline_failed(run_id):
+    finish_pipeline_run(run_id, 'failed', 'A pipeline task failed; see the worker logs')
+
+
+def build_pipeline_workflow(run):
+    """Chain the stages of a run; shards of a stage run in parallel across workers.
+
+    Each group is followed by the next stage, which Celery turns into a
+    chord: the next stage starts once every shard of the previous one is done.
+    """
+    stages = []
+    shards = snapshot_shards(run.course_ids)
+    if shards:
+        stages.append(group(
+            pipeline_snapshot_shard.si(run.id, course_id, student_ids)
+            for course_id, student_ids in shards
+        ))
+    if run.course_ids:
+        stages.append(group(pipeline_engagement.si(run.id, course_id) for course_id in run.course_ids))
+    stages.append(pipeline_caches.si(run.id, run.course_ids))
+    stages.append(pipeline_finished.si(run.id))
+    return chain(*stages)
+
+
+@shared_task
+def run_analytics_pipeline():
+    """Nightly entry point: detect changed courses and recompute only those"""
+    run = start_pipeline_run()
+    logger.info("Analytics pipeline run %s: %s changed course(s)", run.id, len(run.course_ids))
+
+    if settings.ANALYTICS_USE_CELERY:
+        workflow = build_pipeline_workflow(run)
+        workflow.on_error(pipeline_failed.si(run.id))
+        workflow.apply_async()
+    else:
+        run_pipeline_locally(run)
+    return run.id
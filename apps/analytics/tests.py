@@ -0,0 +1,1136 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
+
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from apps.chat.models import Message, Thread as ChatThread
+from apps.courses.models import Course, Lesson, LessonProgress
+from apps.quiz.models import QuestionBank, Quiz, QuizSubmission
+from apps.forum.models import DiscussionThread, DiscussionPost
+from english_professional.celery import app as celery_app
+from .models import (
+    AnalyticsPipelineRun,
+    CompletionBitmap,
+    CourseEngagementMetrics,
+    CourseReportArtifact,
+    DailyActiveStudents,
+    DailyActivityRollup,
+    EngagementFormula,
+    EngagementRecalculationLock,
+    StudentActivityLog,
+    StudentPerformanceSnapshot,
+    StudentCourseMetrics,
+)
+from .active_students import (
+    active_student_counts,
+    count_active_students,
+    decode_ids,
+    encode_ids,
+    inactive_student_ids,
+    pack,
+    record_active_students,
+    unpack,
+)
+from .archive import ActivityArchive, archive_activity_month, month_key, read_manifest
+from .benchmarks import build_synthetic_course
+from apps.courses.outline import bump_outline_version
+from .bitmaps import completed_lesson_ids, expand, get_completion_bitmap, iter_positions, lesson_layout
+from .dropout import get_at_risk_students
+from .activity import ActivityBuffer
+from .funnel import build_lesson_funnel, get_lesson_funnel
+from .heatmap import StudentHeatmap
+from .pipeline import snapshot_shards
+from .reports import get_report, publish_report
+from .retention import build_retention_matrix, week_number, week_start
+from .rollups import get_activity_timeline, purge_activity_logs, rollup_activity_logs, start_of_day
+from .routing import websocket_urlpatterns
+from .trends import lttb_indices
+from .tasks import acquire_recalculation_lock, is_recalculation_pending, recalculate_course_engagement, run_analytics_pipeline
+from .utils import (
+    calculate_cohort_performance,
+    calculate_course_engagement,
+    calculate_student_performance,
+    get_cohort_performance,
+    get_performance_trends,
+    get_student_performance,
+)
+
+User = get_user_model()
+
+
+class AnalyticsTestCase(TestCase):
+    def setUp(self):
+        """Set up a small course with two students and some activity."""
+        cache.clear()
+        self.instructor = User.objects.create_user(username='instructor', password='password', is_instructor=True)
+        self.active = User.objects.create_user(username='active', password='password')
+        self.idle = User.objects.create_user(username='idle', password='password')
+
+        self.course = Course.objects.create(title='Analytics Course', description='...')
+        self.course.instructors.add(self.instructor)
+        self.course.students.add(self.active, self.idle)
+
+        self.lessons = [
+            Lesson.objects.create(course=self.course, title=f'Lesson {i}', content='...', order=i)
+            for i in range(4)
+        ]
+        for lesson in self.lessons[:3]:
+            LessonProgress.objects.create(student=self.active, lesson=lesson, is_completed=True)
+
+        bank = QuestionBank.objects.create(course=self.course, title='Bank')
+        self.quiz = Quiz.objects.create(course=self.course, question_bank=bank, title='Quiz', number_of_questions=4)
+        QuizSubmission.objects.create(student=self.active, quiz=self.quiz, mcq_score=3, total_questions=4)
+        QuizSubmission.objects.create(student=self.idle, quiz=self.quiz, mcq_score=1, total_questions=4)
+
+        thread = DiscussionThread.objects.create(course=self.course, author=self.active, title='Hi', content='...')
+        DiscussionPost.objects.create(thread=thread, author=self.idle, content='...')
+
+        StudentActivityLog.objects.create(student=self.active, course=self.course, activity_type='lesson_view')
+        StudentActivityLog.objects.create(
+            student=self.idle,
+            course=self.course,
+            activity_type='lesson_view',
+            timestamp=timezone.now() - timedelta(days=30)
+        )
+
+    def use_temporary_archive(self):
+        """Point ANALYTICS_ARCHIVE_DIR at a directory removed after the test"""
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        override = override_settings(ANALYTICS_ARCHIVE_DIR=root)
+        override.enable()
+        self.addCleanup(override.disable)
+        return root
+
+
+class EngagementFormulaTest(AnalyticsTestCase):
+    def test_formula_change_rescores_stored_metrics(self):
+        """Test that saving a course formula rescores every stored row with one update."""
+        get_cohort_performance(self.course)
+        formula = EngagementFormula(
+            course=self.course, quiz_weight=0.5, assignment_weight=0.0, completion_weight=0.5,
+            forum_weight=0.0, chat_weight=0.0
+        )
+        formula.full_clean()
+        formula.save()
+
+        cohort = get_cohort_performance(self.course)
+        self.assertEqual(cohort[self.active.id]['engagement_score'], 75.0)
+        self.assertEqual(cohort[self.idle.id]['engagement_score'], 12.5)
+        self.assertEqual(cohort, calculate_cohort_performance(self.course))
+
+    def test_chat_activity_counts_when_weighted(self):
+        """Test that chat messages logged for the course feed the chat component."""
+        EngagementFormula.objects.create(
+            course=self.course, quiz_weight=0.0, assignment_weight=0.0, completion_weight=0.0,
+            forum_weight=0.0, chat_weight=1.0, chat_cap=4
+        )
+        get_student_performance(self.idle, self.course)
+        for _ in range(2):
+            StudentActivityLog.objects.create(student=self.idle, course=self.course, activity_type='chat_message')
+
+        self.assertEqual(get_student_performance(self.idle, self.course)['engagement_score'], 50.0)
+
+    @override_settings(ANALYTICS_BUFFER_ACTIVITY=False)
+    def test_sent_chat_messages_are_logged_for_shared_courses(self):
+        """Test that a chat message is logged for the courses its sender shares with the thread."""
+        outsider = User.objects.create_user(username='outsider', password='password')
+        with_instructor = ChatThread.objects.create()
+        with_instructor.participants.add(self.idle, self.instructor)
+        with_outsider = ChatThread.objects.create()
+        with_outsider.participants.add(self.idle, outsider)
+
+        Message.objects.create(thread=with_instructor, sender=self.idle, content='Hello')
+        Message.objects.create(thread=with_outsider, sender=self.idle, content='Hello')
+
+        logs = StudentActivityLog.objects.filter(activity_type='chat_message')
+        self.assertEqual(list(logs.values_list('student', 'course')), [(self.idle.id, self.course.id)])
+
+    def test_chat_count_survives_log_compaction(self):
+        """Test that purging rolled-up chat logs leaves the chat component unchanged."""
+        EngagementFormula.objects.create(
+            course=self.course, quiz_weight=0.0, assignment_weight=0.0, completion_weight=0.0,
+            forum_weight=0.0, chat_weight=1.0, chat_cap=4
+        )
+        old = timezone.now() - timedelta(days=100)
+        StudentActivityLog.objects.bulk_create([
+            StudentActivityLog(student=self.idle, course=self.course, activity_type='chat_message', timestamp=old)
+            for _ in range(2)
+        ])
+        StudentActivityLog.objects.create(student=self.idle, course=self.course, activity_type='chat_message')
+
+        self.use_temporary_archive()
+        call_command('compact_activity_logs', '--older-than', '90', stdout=StringIO())
+
+        self.assertEqual(StudentActivityLog.objects.filter(activity_type='chat_message').count(), 1)
+        self.assertEqual(calculate_student_performance(self.idle, self.course)['engagement_score'], 75.0)
+
+    def test_database_and_python_scores_agree(self):
+        """Test that the database expression matches score_performance on a synthetic cohort."""
+        course = build_synthetic_course(200, num_lessons=7, prefix='formula')
+        get_cohort_performance(course)
+        EngagementFormula.objects.create(
+            course=course, quiz_weight=0.25, assignment_weight=0.15, completion_weight=0.35,
+            forum_weight=0.15, chat_weight=0.1, thread_points=3, forum_cap=7
+        )
+
+        self.assertEqual(get_cohort_performance(course), calculate_cohort_performance(course))
+
+    def test_weights_must_add_up(self):
+        """Test that a formula whose weights do not sum to 1 is rejected."""
+        with self.assertRaises(ValidationError):
+            EngagementFormula(course=self.course, quiz_weight=0.9).full_clean()
+
+
+class CourseEngagementTest(AnalyticsTestCase):
+    def test_engagement_metrics(self):
+        """Test that every engagement field is computed from the cohort."""
+        metrics = calculate_course_engagement(self.course)
+
+        self.assertEqual(metrics.total_students, 2)
+        self.assertEqual(metrics.active_students, 1)
+        self.assertEqual(metrics.average_completion_rate, 37.5)
+        self.assertEqual(metrics.average_quiz_score, 50.0)
+        self.assertEqual(metrics.forum_activity_count, 2)
+        self.assertEqual(metrics.dropout_risk_count, 1)
+
+    def test_query_count_is_independent_of_cohort_size(self):
+        """Test that the engagement engine issues the same number of queries for any cohort."""
+        small = build_synthetic_course(5, num_lessons=3, prefix='small')
+        large = build_synthetic_course(60, num_lessons=3, prefix='large')
+        # Both cohorts need an at-risk student, whose last activity is one more query
+        small.students.add(User.objects.create_user(username='dormant', password='password'))
+
+        # Five of them publish the dashboard artifact: active counts, timeline and the upsert;
+        # the never-active student's last day is looked up in the daily bitsets
+        with self.assertNumQueries(24):
+            calculate_course_engagement(small)
+        with self.assertNumQueries(24):
+            calculate_course_engagement(large)
+
+
+class StudentHeatmapTest(AnalyticsTestCase):
+    def test_matrix_values(self):
+        """Test that completions land in the right cells of the dense matrix."""
+        # The first read stores a bitmap for the student without progress
+        StudentHeatmap.for_course(self.course)
+        with self.assertNumQueries(3):
+            heatmap = StudentHeatmap.for_course(self.course)
+
+        data = heatmap.to_json()
+        self.assertEqual(data['students'], [self.active.id, self.idle.id])
+        self.assertEqual(data['lessons'], [lesson.id for lesson in self.lessons])
+        self.assertEqual(data['values'], [[1, 1, 1, 0], [0, 0, 0, 0]])
+
+    def test_api_pages_by_student_rows(self):
+        """Test that the heatmap endpoint serves one page of student rows."""
+        self.client.login(username='instructor', password='password')
+        response = self.client.get(reverse('analytics:api_heatmap', args=[self.course.id]), {'offset': 1, 'limit': 1})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['offset'], 1)
+        self.assertEqual(data['total_students'], 2)
+        self.assertEqual(data['students'], [self.idle.id])
+        self.assertEqual(data['values'], [[0, 0, 0, 0]])
+
+    def test_api_requires_instructor(self):
+        """Test that students cannot read the cohort heatmap."""
+        self.client.login(username='active', password='password')
+        response = self.client.get(reverse('analytics:api_heatmap', args=[self.course.id]))
+        self.assertEqual(response.status_code, 403)
+
+
+class CompletionBitmapTest(AnalyticsTestCase):
+    def test_bits_follow_lesson_positions(self):
+        """Test that a student's bitmap has one bit per completed lesson position."""
+        bitmap = CompletionBitmap.objects.get(student=self.active, course=self.course)
+
+        self.assertEqual(bytes(bitmap.bits), bytes([0b0111]))
+        self.assertEqual(bitmap.completed_count, 3)
+        self.assertEqual(list(iter_positions(bytes(bitmap.bits))), [0, 1, 2])
+        self.assertEqual(expand(bytes([0b0101]), 4), bytes([1, 0, 1, 0]))
+
+    def test_maintained_on_progress_changes(self):
+        """Test that completing and un-completing lessons updates the bitmap."""
+        progress = LessonProgress.objects.create(student=self.idle, lesson=self.lessons[3], is_completed=True)
+        self.assertEqual(get_completion_bitmap(self.idle.id, self.course.id).completed_count, 1)
+
+        progress.is_completed = False
+        progress.save()
+        self.assertEqual(get_completion_bitmap(self.idle.id, self.course.id).completed_count, 0)
+
+    def test_rebuilt_after_lessons_are_reordered(self):
+        """Test that bitmaps built for an old lesson order are rebuilt on read."""
+        self.lessons[0].order = 10
+        self.lessons[0].save()
+
+        lesson_ids = lesson_layout(self.course.id)
+        bitmap = get_completion_bitmap(self.active.id, self.course.id)
+        self.assertEqual(lesson_ids[-1], self.lessons[0].id)
+        self.assertEqual(
+            sorted(completed_lesson_ids(bitmap, lesson_ids)),
+            sorted(lesson.id for lesson in self.lessons[:3])
+        )
+        self.assertEqual(list(iter_positions(bitmap.bits)), [0, 1, 3])
+
+    def test_layout_follows_lesson_changes_from_other_processes(self):
+        """Test that a layout cached before a lesson change is never read after it."""
+        lesson_ids = lesson_layout(self.course.id)
+        # Another process reorders with an update; only the outline version changes here
+        Lesson.objects.filter(pk=self.lessons[0].pk).update(order=10)
+        bump_outline_version(self.course.id)
+
+        self.assertEqual(lesson_layout(self.course.id), lesson_ids[1:] + lesson_ids[:1])
+
+    def test_course_page_reads_progress_from_bitmap(self):
+        """Test that the course page shows progress and completed lessons from one bitmap."""
+        self.client.login(username='active', password='password')
+        response = self.client.get(reverse('courses:course_detail', args=[self.course.id]))
+
+        self.assertEqual(response.context['progress_percentage'], 75)
+        self.assertEqual(response.context['completed_lesson_ids'], {lesson.id for lesson in self.lessons[:3]})
+
+
+class DailyActiveStudentsTest(AnalyticsTestCase):
+    def test_bitsets_round_trip(self):
+        """Test that student ids survive packing with a byte-aligned offset."""
+        bitset = encode_ids([1003, 1010, 1100])
+        offset, bits = pack(bitset)
+
+        self.assertEqual(offset, 1000)
+        self.assertEqual(unpack(offset, bits), bitset)
+        self.assertEqual(list(decode_ids(bitset)), [1003, 1010, 1100])
+        self.assertEqual(bitset.bit_count(), 3)
+
+    def test_activity_sets_daily_bits(self):
+        """Test that logged activity marks its student on the day it happened."""
+        today = timezone.localdate()
+        row = DailyActiveStudents.objects.get(course=self.course, day=today)
+        self.assertEqual(list(decode_ids(unpack(row.offset, bytes(row.bits)))), [self.active.id])
+
+        # The student is already marked for today, so the bitset is only read
+        with self.assertNumQueries(1):
+            self.assertEqual(record_active_students([StudentActivityLog(
+                student=self.active, course=self.course, activity_type='quiz_attempt', timestamp=timezone.now()
+            )]), {})
+
+    def test_window_counts(self):
+        """Test that DAU, WAU and MAU are the popcounts of OR-ed days."""
+        StudentActivityLog.objects.create(
+            student=self.idle,
+            course=self.course,
+            activity_type='lesson_view',
+            timestamp=timezone.now() - timedelta(days=3)
+        )
+
+        with self.assertNumQueries(1):
+            counts = active_student_counts(self.course.id)
+        self.assertEqual(counts, {'dau': 1, 'wau': 2, 'mau': 2})
+        self.assertEqual(count_active_students(self.course.id, 31), 2)
+
+    def test_inactive_students_are_a_set_difference(self):
+        """Test that enrolled students without activity in the window are inactive."""
+        newcomer = User.objects.create_user(username='newcomer', password='password')
+        self.course.students.add(newcomer)
+
+        self.assertEqual(inactive_student_ids(self.course.id, 14), sorted([self.idle.id, newcomer.id]))
+        self.assertEqual(inactive_student_ids(self.course.id, 31), [newcomer.id])
+
+    def test_backfill_command(self):
+        """Test that the backfill command rebuilds the bitsets from stored logs."""
+        DailyActiveStudents.objects.all().delete()
+        StudentActivityLog.objects.bulk_create([
+            StudentActivityLog(student=self.idle, course=self.course, activity_type='lesson_view', timestamp=timezone.now()),
+        ])
+
+        out = StringIO()
+        call_command('backfill_active_students', stdout=out)
+
+        self.assertIn('Updated 2 daily active-student rows', out.getvalue())
+        self.assertEqual(active_student_counts(self.course.id), {'dau': 2, 'wau': 2, 'mau': 2})
+        self.assertEqual(count_active_students(self.course.id, 31), 2)
+
+
+class CohortPerformanceTest(AnalyticsTestCase):
+    def test_cohort_matches_single_student(self):
+        """Test that bulk metrics agree with the per-student calculation."""
+        cohort = calculate_cohort_performance(self.course)
+
+        self.assertEqual(cohort[self.active.id], calculate_student_performance(self.active, self.course))
+        self.assertEqual(cohort[self.active.id]['quiz_average'], 75.0)
+        self.assertEqual(cohort[self.active.id]['completion_rate'], 75.0)
+        self.assertEqual(cohort[self.idle.id]['completion_rate'], 0.0)
+
+
+class GeneratePerformanceSnapshotsTest(AnalyticsTestCase):
+    def test_generates_snapshots_in_batches(self):
+        """Test that every enrolled student gets a snapshot and throughput is reported."""
+        out = StringIO()
+        call_command('generate_performance_snapshots', '--batch-size', '1', stdout=out)
+
+        self.assertEqual(StudentPerformanceSnapshot.objects.filter(course=self.course).count(), 2)
+        self.assertIn('snapshots/sec', out.getvalue())
+
+    def test_resumes_from_checkpoint(self):
+        """Test that exactly the students recorded in the checkpoint are skipped and the file is removed."""
+        # Enrolled after the interrupted run; its id lies between finished students
+        newcomer = User.objects.create_user(username='newcomer', password='password')
+        self.course.students.add(newcomer)
+        fd, path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'done': {str(self.course.id): [self.active.id, newcomer.id + 1]}, 'courses': []}, f)
+
+        call_command('generate_performance_snapshots', '--checkpoint', path, stdout=StringIO())
+
+        snapshots = StudentPerformanceSnapshot.objects.filter(course=self.course)
+        self.assertEqual(sorted(snapshots.values_list('student', flat=True)), [self.idle.id, newcomer.id])
+        self.assertFalse(os.path.exists(path))
+
+    def test_changed_only_skips_unchanged_students(self):
+        """Test that change-only mode writes a snapshot only when a student's metrics changed."""
+        call_command('generate_performance_snapshots', '--changed-only', stdout=StringIO())
+        out = StringIO()
+        call_command('generate_performance_snapshots', '--changed-only', stdout=out)
+        self.assertIn('skipped 2 of 2 snapshots (100.0% fewer rows)', out.getvalue())
+
+        LessonProgress.objects.create(student=self.idle, lesson=self.lessons[0], is_completed=True)
+        call_command('generate_performance_snapshots', '--changed-only', stdout=StringIO())
+
+        snapshots = StudentPerformanceSnapshot.objects.filter(course=self.course)
+        self.assertEqual(snapshots.filter(student=self.active).count(), 1)
+        self.assertEqual(snapshots.filter(student=self.idle).count(), 2)
+
+
+class StudentCourseMetricsTest(AnalyticsTestCase):
+    def test_read_is_a_single_lookup(self):
+        """Test that once a row exists, reading metrics costs one query."""
+        expected = get_student_performance(self.active, self.course)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_student_performance(self.active, self.course), expected)
+
+    def test_signals_keep_metrics_current(self):
+        """Test that writes to the raw tables update an existing metrics row."""
+        get_student_performance(self.idle, self.course)
+
+        LessonProgress.objects.create(student=self.idle, lesson=self.lessons[0], is_completed=True)
+        QuizSubmission.objects.create(student=self.idle, quiz=self.quiz, mcq_score=3, total_questions=4)
+        thread = DiscussionThread.objects.create(course=self.course, author=self.idle, title='Q', content='...')
+        Lesson.objects.create(course=self.course, title='Lesson 4', content='...', order=4)
+
+        self.assertEqual(get_student_performance(self.idle, self.course), calculate_student_performance(self.idle, self.course))
+
+        thread.delete()
+        self.lessons[0].delete()
+        self.assertEqual(get_student_performance(self.idle, self.course), calculate_student_performance(self.idle, self.course))
+
+    def test_rebuild_reconciles_drift(self):
+        """Test that the rebuild command fixes rows changed behind the signals' back."""
+        get_student_performance(self.active, self.course)
+        StudentCourseMetrics.objects.filter(student=self.active).update(completed_lessons=0, completion_rate=0)
+        outsider = User.objects.create_user(username='outsider', password='password')
+        StudentCourseMetrics.objects.create(student=outsider, course=self.course)
+
+        out = StringIO()
+        call_command('rebuild_student_metrics', stdout=out)
+
+        self.assertIn('1 created, 1 updated, 1 removed', out.getvalue())
+        self.assertEqual(get_student_performance(self.active, self.course)['completion_rate'], 75.0)
+        self.assertFalse(StudentCourseMetrics.objects.filter(student=outsider).exists())
+
+
+class StreamingExportTest(AnalyticsTestCase):
+    def test_student_export_streams_rows(self):
+        """Test that the student CSV is streamed with one row per enrolled student."""
+        self.client.login(username='instructor', password='password')
+        response = self.client.get(reverse('analytics:export_students_csv', args=[self.course.id]))
+
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith('Student Name,Username'))
+        self.assertEqual(lines[1].split(',')[1:8], ['active', '', '75.0', '0.0', '75.0', '41.5', '0'])
+
+    def test_engagement_export_streams_history(self):
+        """Test that the engagement report streams one row per stored calculation."""
+        calculate_course_engagement(self.course)
+        self.client.login(username='instructor', password='password')
+        response = self.client.get(reverse('analytics:export_engagement_csv', args=[self.course.id]))
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 2)
+
+
+class StaleWhileRevalidateTest(AnalyticsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.metrics = calculate_course_engagement(self.course)
+        CourseEngagementMetrics.objects.filter(pk=self.metrics.pk).update(calculated_at=timezone.now() - timedelta(days=3))
+        self.client.login(username='instructor', password='password')
+
+    @mock.patch('apps.analytics.tasks.executor')
+    def test_stale_metrics_are_served_and_refreshed_once(self, executor):
+        """Test that stale metrics are served immediately and only one recalculation is queued."""
+        url = reverse('analytics:instructor_analytics', args=[self.course.id])
+        first = self.client.get(url)
+        second = self.client.get(url)
+
+        self.assertEqual(first.context['metrics'].pk, self.metrics.pk)
+        self.assertTrue(first.context['metrics_stale'])
+        self.assertTrue(second.context['metrics_refreshing'])
+        self.assertEqual(CourseEngagementMetrics.objects.filter(course=self.course).count(), 1)
+        executor.submit.assert_called_once()
+
+    def test_recalculation_releases_lock(self):
+        """Test that the background task stores new metrics and frees the course lock."""
+        self.assertTrue(acquire_recalculation_lock(self.course.id))
+        self.assertFalse(acquire_recalculation_lock(self.course.id))
+        recalculate_course_engagement(self.course.id)
+
+        self.assertEqual(CourseEngagementMetrics.objects.filter(course=self.course).count(), 2)
+        self.assertFalse(is_recalculation_pending(self.course.id))
+        self.assertTrue(acquire_recalculation_lock(self.course.id))
+
+    def test_expired_lock_can_be_taken(self):
+        """Test that a lock left by a crashed recalculation stops blocking once it expires."""
+        self.assertTrue(acquire_recalculation_lock(self.course.id))
+        EngagementRecalculationLock.objects.filter(course=self.course).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertFalse(is_recalculation_pending(self.course.id))
+        self.assertTrue(acquire_recalculation_lock(self.course.id))
+
+
+class DropoutRiskTest(AnalyticsTestCase):
+    def test_scores_cohort_in_one_pass(self):
+        """Test that at-risk students are found with a fixed number of queries and then cached."""
+        # Outline version, enrolment, active bitsets, completion counts and last activity
+        with self.assertNumQueries(5):
+            at_risk = get_at_risk_students(self.course)
+        with self.assertNumQueries(0):
+            get_at_risk_students(self.course)
+
+        self.assertEqual([entry['student_id'] for entry in at_risk], [self.idle.id])
+        self.assertEqual(at_risk[0]['completion_rate'], 0.0)
+        self.assertIsNotNone(at_risk[0]['last_activity'])
+
+    def test_last_activity_survives_log_purge(self):
+        """Test that an at-risk student whose raw activity was purged keeps their last active day."""
+        last_seen = timezone.localdate(StudentActivityLog.objects.get(student=self.idle).timestamp)
+        StudentActivityLog.objects.filter(student=self.idle).delete()
+
+        at_risk = get_at_risk_students(self.course)
+        self.assertEqual(at_risk[0]['last_activity'], start_of_day(last_seen))
+
+    def test_writes_invalidate_cached_results(self):
+        """Test that progress, activity and enrolment changes drop the cached scores."""
+        get_at_risk_students(self.course)
+        StudentActivityLog.objects.create(student=self.idle, course=self.course, activity_type='lesson_view')
+        self.assertEqual(get_at_risk_students(self.course), [])
+
+        newcomer = User.objects.create_user(username='newcomer', password='password')
+        self.course.students.add(newcomer)
+        self.assertEqual([entry['student_id'] for entry in get_at_risk_students(self.course)], [newcomer.id])
+
+        LessonProgress.objects.create(student=newcomer, lesson=self.lessons[0], is_completed=True)
+        self.assertEqual(get_at_risk_students(self.course), [])
+
+    def test_buffered_activity_invalidates_cached_results(self):
+        """Test that a buffer flush invalidates the courses it wrote activity for."""
+        get_at_risk_students(self.course)
+        buffer = ActivityBuffer(background=False)
+        buffer.record(StudentActivityLog(student=self.idle, course=self.course, activity_type='lesson_view'))
+        buffer.flush()
+
+        self.assertEqual(get_at_risk_students(self.course), [])
+
+    def test_dashboard_lists_at_risk_students(self):
+        """Test that the instructor dashboard shows the scorer's results with metrics."""
+        self.client.login(username='instructor', password='password')
+        response = self.client.get(reverse('analytics:instructor_analytics', args=[self.course.id]))
+
+        at_risk = response.context['at_risk_students']
+        self.assertEqual([entry['student'] for entry in at_risk], [self.idle])
+        self.assertEqual(at_risk[0]['metrics']['completion_rate'], 0.0)
+
+
+class PerformanceTrendsTest(AnalyticsTestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        snapshots = StudentPerformanceSnapshot.objects.bulk_create([
+            StudentPerformanceSnapshot(
+                student=self.active, course=self.course, quiz_average=day % 7 * 10,
+                assignment_average=50, completion_rate=day / 4, engagement_score=day % 3 * 20
+            )
+            for day in range(400)
+        ])
+        for day, snapshot in enumerate(snapshots):
+            StudentPerformanceSnapshot.objects.filter(pk=snapshot.pk).update(snapshot_date=now - timedelta(days=day, hours=1))
+        self.client.login(username='active', password='password')
+        self.url = reverse('analytics:api_trends', args=[self.course.id])
+
+    def test_lttb_keeps_endpoints_and_peaks(self):
+        """Test that downsampling keeps the first, last and most prominent points."""
+        xs = list(range(100))
+        ys = [0.0] * 100
+        ys[42] = 100.0
+
+        indices = lttb_indices(xs, [ys], 10)
+
+        self.assertEqual(len(indices), 10)
+        self.assertEqual((indices[0], indices[-1]), (0, 99))
+        self.assertIn(42, indices)
+        self.assertEqual(indices, sorted(indices))
+
+    def test_buckets_average_snapshots(self):
+        """Test that weekly and monthly buckets average the snapshots they contain."""
+        weekly = get_performance_trends(self.active, self.course, days=70, bucket='week')
+        monthly = get_performance_trends(self.active, self.course, days=365, bucket='month')
+
+        self.assertIn(len(weekly['dates']), (11, 12))
+        self.assertIn(len(monthly['dates']), (13, 14))
+        self.assertEqual(set(weekly['assignment_scores']), {50.0})
+
+    def test_api_bounds_the_number_of_points(self):
+        """Test that any window is served within the point budget."""
+        response = self.client.get(self.url, {'days': 100000, 'bucket': 'day', 'points': 50})
+
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['bucket'], 'day')
+        self.assertEqual(len(data['dates']), 50)
+        self.assertEqual(data['dates'], sorted(data['dates']))
+        self.assertEqual(self.client.get(self.url, {'days': 'all'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'bucket': 'hour'}).status_code, 400)
+
+    def test_unchanged_trends_are_not_modified(self):
+        """Test that polling with the ETag gets a 304 until a snapshot is added."""
+        first = self.client.get(self.url, {'days': 365})
+        self.assertEqual(first.json()['bucket'], 'week')
+        self.assertTrue(first.has_header('Last-Modified'))
+
+        second = self.client.get(self.url, {'days': 365}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+
+        StudentPerformanceSnapshot.objects.create(
+            student=self.active, course=self.course, quiz_average=0,
+            assignment_average=0, completion_rate=0, engagement_score=0
+        )
+        third = self.client.get(self.url, {'days': 365}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(third.status_code, 200)
+        self.assertNotEqual(third['ETag'], first['ETag'])
+
+
+class RetentionMatrixTest(AnalyticsTestCase):
+    def test_cohorts_by_first_active_week(self):
+        """Test that students are grouped by first active week and counted in later weeks."""
+        StudentActivityLog.objects.create(student=self.idle, course=self.course, activity_type='lesson_view')
+        this_week = week_number(timezone.localdate())
+        idle_week = week_number(timezone.localdate() - timedelta(days=30))
+
+        cohorts = {cohort['week']: cohort for cohort in build_retention_matrix(self.course)['cohorts']}
+
+        idle_cohort = cohorts[week_start(idle_week).isoformat()]
+        self.assertEqual(idle_cohort['size'], 1)
+        self.assertEqual(len(idle_cohort['retained']), this_week - idle_week + 1)
+        self.assertEqual((idle_cohort['retained'][0], idle_cohort['retained'][-1]), (1, 1))
+        self.assertEqual(idle_cohort['retention'][-1], 100.0)
+        self.assertEqual(sum(idle_cohort['retained']), 2)
+        self.assertEqual(cohorts[week_start(this_week).isoformat()]['retained'], [1])
+
+    def test_cohorts_survive_log_compaction(self):
+        """Test that students keep their first active week after their old raw logs are purged."""
+        StudentActivityLog.objects.create(student=self.idle, course=self.course, activity_type='lesson_view')
+        before = build_retention_matrix(self.course)
+
+        StudentActivityLog.objects.filter(timestamp__lt=timezone.now() - timedelta(days=20)).delete()
+
+        self.assertEqual(build_retention_matrix(self.course), before)
+
+    def test_api_serves_cached_matrix(self):
+        """Test that the retention endpoint is instructor-only and cached per course."""
+        url = reverse('analytics:api_retention', args=[self.course.id])
+        self.client.login(username='active', password='password')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.login(username='instructor', password='password')
+        first = self.client.get(url).json()
+        self.assertEqual(sum(cohort['size'] for cohort in first['cohorts']), 2)
+
+        StudentActivityLog.objects.create(student=self.instructor, course=self.course, activity_type='lesson_view')
+        self.assertEqual(self.client.get(url).json(), first)
+
+
+class LessonFunnelTest(AnalyticsTestCase):
+    def test_completions_and_drop_off(self):
+        """Test that each lesson's completions and drop-off from the previous step are computed."""
+        with self.assertNumQueries(3):
+            funnel = build_lesson_funnel(self.course)
+
+        self.assertEqual(funnel['enrolled'], 2)
+        self.assertEqual([step['completed'] for step in funnel['steps']], [1, 1, 1, 0])
+        self.assertEqual([step['drop_off'] for step in funnel['steps']], [50.0, 0.0, 0.0, 100.0])
+        self.assertEqual(funnel['steps'][0]['completion_rate'], 50.0)
+
+    def test_memoized_until_progress_changes(self):
+        """Test that the funnel is cached and recomputed after a progress write."""
+        self.client.login(username='instructor', password='password')
+        url = reverse('analytics:api_funnel', args=[self.course.id])
+        self.client.get(url)
+
+        self.course.refresh_from_db()
+        with self.assertNumQueries(0):
+            get_lesson_funnel(self.course)
+
+        LessonProgress.objects.create(student=self.idle, lesson=self.lessons[0], is_completed=True)
+        self.assertEqual(self.client.get(url).json()['steps'][0]['completed'], 2)
+
+    def test_rebuilt_after_lessons_change_elsewhere(self):
+        """Test that a funnel cached before another process changed the lessons is not served."""
+        self.course.refresh_from_db()
+        get_lesson_funnel(self.course)
+        # Another process adds a lesson; this process's cache is never invalidated
+        Lesson.objects.bulk_create([Lesson(course=self.course, title='Extra', content='...', order=99)])
+        bump_outline_version(self.course.id)
+
+        self.course.refresh_from_db()
+        self.assertEqual(get_lesson_funnel(self.course)['steps'][-1]['title'], 'Extra')
+
+
+class SnapshotCompactionTest(AnalyticsTestCase):
+    def add_snapshot(self, days_ago, value):
+        snapshot = StudentPerformanceSnapshot.objects.create(
+            student=self.active, course=self.course, quiz_average=value,
+            assignment_average=value, completion_rate=value, engagement_score=value
+        )
+        StudentPerformanceSnapshot.objects.filter(pk=snapshot.pk).update(
+            snapshot_date=timezone.now() - timedelta(days=days_ago, hours=1)
+        )
+
+    def test_trends_fill_gaps_forward(self):
+        """Test that days without a snapshot repeat the previous values, including from before the window."""
+        self.add_snapshot(60, 10)
+        self.add_snapshot(5, 20)
+
+        trends = get_performance_trends(self.active, self.course, days=30)
+
+        # Five days and an hour ago is six days ago in the first hour of a day
+        changed = trends['dates'].index(timezone.localdate(timezone.now() - timedelta(days=5, hours=1)).isoformat())
+        self.assertEqual(len(trends['dates']), 31)
+        self.assertEqual(trends['quiz_scores'][0], 10)
+        self.assertEqual(set(trends['quiz_scores'][changed:]), {20})
+        self.assertEqual(trends['quiz_scores'][changed - 1], 10)
+
+    def test_thinning_keeps_newest_snapshot_per_period(self):
+        """Test that old snapshots are thinned to weekly and then monthly resolution."""
+        for day in range(400):
+            self.add_snapshot(day, 400 - day)
+
+        out = StringIO()
+        call_command('compact_performance_snapshots', stdout=out)
+        self.assertIn('fewer rows', out.getvalue())
+
+        now = timezone.now()
+        snapshots = StudentPerformanceSnapshot.objects.filter(student=self.active)
+        self.assertEqual(snapshots.filter(snapshot_date__gte=now - timedelta(days=30)).count(), 30)
+
+        weeks = [
+            week_number(timezone.localtime(date).date())
+            for date in snapshots.filter(
+                snapshot_date__lt=now - timedelta(days=30), snapshot_date__gte=now - timedelta(days=180)
+            ).values_list('snapshot_date', flat=True)
+        ]
+        self.assertEqual(len(weeks), len(set(weeks)))
+
+        months = [
+            timezone.localtime(date).strftime('%Y-%m')
+            for date in snapshots.filter(snapshot_date__lt=now - timedelta(days=180)).values_list('snapshot_date', flat=True)
+        ]
+        self.assertEqual(len(months), len(set(months)))
+        self.assertLess(snapshots.count(), 80)
+
+        # The newest snapshot of each period survives, so filled trends end periods on the right value
+        trends = get_performance_trends(self.active, self.course, days=365)
+        self.assertEqual(trends['quiz_scores'][-1], 400)
+        self.assertEqual(trends['quiz_scores'], sorted(trends['quiz_scores']))
+
+
+class ReportArtifactTest(AnalyticsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.login(username='instructor', password='password')
+        self.url = reverse('analytics:api_engagement', args=[self.course.id])
+
+    def test_recalculation_publishes_versioned_reports(self):
+        """Test that recalculating metrics stores hashed engagement and retention artifacts."""
+        calculate_course_engagement(self.course)
+
+        artifacts = CourseReportArtifact.objects.filter(course=self.course)
+        self.assertEqual(sorted(artifacts.values_list('kind', flat=True)), ['dashboard', 'engagement', 'retention'])
+        engagement = artifacts.get(kind='engagement')
+        self.assertEqual(json.loads(engagement.content)['dropout_risk_count'], 1)
+        self.assertEqual(engagement.content_hash, hashlib.sha256(engagement.content.encode()).hexdigest())
+
+    def test_polling_gets_not_modified_without_analytics_queries(self):
+        """Test that a client holding the current ETag gets a 304 served from the cached artifact."""
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()['total_students'], 2)
+        self.assertFalse(first.json()['is_stale'])
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        # The test cache is process-local, so only the artifact's hash is checked
+        analytics_queries = [query['sql'] for query in queries if 'analytics_' in query['sql']]
+        self.assertEqual(len(analytics_queries), 1)
+        self.assertIn('"content_hash"', analytics_queries[0])
+
+        calculate_course_engagement(self.course)
+        third = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(third.status_code, 200)
+        self.assertNotEqual(third['ETag'], first['ETag'])
+
+    def test_reports_published_elsewhere_replace_local_copies(self):
+        """Test that a process-local cache never serves a report another process replaced."""
+        report = publish_report(self.course.id, 'engagement', {'total_students': 1})
+        # Another worker republishes; this process's cache still holds the old copy
+        CourseReportArtifact.objects.filter(course=self.course, kind='engagement').update(content='{"total_students":2}', content_hash='other')
+
+        self.assertEqual(get_report(self.course.id, 'engagement')['content_hash'], 'other')
+        self.assertNotEqual(report['content_hash'], 'other')
+
+    def test_dashboard_renders_from_published_artifact(self):
+        """Test that the instructor dashboard reads its course-level figures from the dashboard artifact."""
+        calculate_course_engagement(self.course)
+        get_cohort_performance(self.course)
+        url = reverse('analytics:instructor_analytics', args=[self.course.id])
+        # Activity after the publish shows up with the next recalculation
+        StudentActivityLog.objects.create(student=self.idle, course=self.course, activity_type='lesson_view')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        live_tables = ('"analytics_studentactivitylog"', '"analytics_dailyactivestudents"', '"analytics_dailyactivityrollup"', '"analytics_engagementrecalculationlock"')
+        self.assertFalse([query for query in queries if any(table in query['sql'] for table in live_tables)])
+        self.assertEqual([entry['student'] for entry in response.context['at_risk_students']], [self.idle])
+        self.assertEqual(response.context['active_counts'], {'dau': 1, 'wau': 1, 'mau': 1})
+
+        calculate_course_engagement(self.course)
+        self.assertEqual(self.client.get(url).context['at_risk_students'], [])
+
+    def test_published_from_existing_metrics(self):
+        """Test that metrics stored before artifacts existed are published instead of recalculated."""
+        metrics = calculate_course_engagement(self.course)
+        CourseReportArtifact.objects.all().delete()
+        cache.clear()
+
+        self.client.get(self.url)
+
+        self.assertEqual(CourseEngagementMetrics.objects.filter(course=self.course).count(), 1)
+        self.assertEqual(
+            json.loads(CourseReportArtifact.objects.get(kind='engagement').content)['calculated_at'],
+            metrics.calculated_at.isoformat()
+        )
+
+
+class ActivityBufferTest(AnalyticsTestCase):
+    def test_flush_writes_in_batches(self):
+        """Test that queued events are written with their original timestamps on flush."""
+        buffer = ActivityBuffer(flush_size=2, background=False)
+        happened_at = timezone.now() - timedelta(minutes=5)
+        for _ in range(3):
+            buffer.record(StudentActivityLog(student=self.idle, course=self.course, activity_type='video_join', timestamp=happened_at))
+
+        self.assertEqual(StudentActivityLog.objects.filter(activity_type='video_join').count(), 0)
+        # With the student already marked active that day, each batch only reads its bitset
+        record_active_students([StudentActivityLog(student=self.idle, course=self.course, timestamp=happened_at)])
+        with self.assertNumQueries(4):
+            self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(
+            list(StudentActivityLog.objects.filter(activity_type='video_join').values_list('timestamp', flat=True).distinct()),
+            [happened_at]
+        )
+
+    def test_full_buffer_drops_instead_of_blocking(self):
+        """Test that a full queue applies backpressure by dropping events."""
+        buffer = ActivityBuffer(max_size=1, put_timeout=0, background=False)
+
+        self.assertTrue(buffer.record(StudentActivityLog(student=self.idle, activity_type='lesson_view')))
+        self.assertFalse(buffer.record(StudentActivityLog(student=self.idle, activity_type='lesson_view')))
+        self.assertEqual(buffer.dropped, 1)
+
+    @override_settings(ANALYTICS_BUFFER_ACTIVITY=False)
+    def test_lesson_view_is_logged(self):
+        """Test that viewing a lesson records a lesson_view activity."""
+        self.client.login(username='active', password='password')
+        self.client.get(reverse('courses:lesson_detail', args=[self.course.id, self.lessons[1].id]))
+
+        log = StudentActivityLog.objects.filter(student=self.active, activity_type='lesson_view').first()
+        self.assertEqual(log.activity_data, {'lesson_id': self.lessons[1].id})
+
+
+class DashboardCountersTest(AnalyticsTestCase):
+    def communicator(self, user):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/analytics/courses/{self.course.id}/')
+        communicator.scope['user'] = user
+        return communicator
+
+    def write(self, action):
+        """Run a write in a sync thread and deliver what it published on commit"""
+        def run():
+            with self.captureOnCommitCallbacks(execute=True):
+                action()
+        return database_sync_to_async(run)()
+
+    async def test_pushes_counter_deltas(self):
+        """Test that completions, submissions and new activity reach an open dashboard."""
+        communicator = self.communicator(self.instructor)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        progress = await database_sync_to_async(LessonProgress.objects.get)(student=self.active, lesson=self.lessons[0])
+        await self.write(lambda: LessonProgress.objects.create(student=self.idle, lesson=self.lessons[0], is_completed=True))
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'delta', 'counters': {'completions': 1}})
+
+        progress.is_completed = False
+        await self.write(progress.save)
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'delta', 'counters': {'completions': -1}})
+
+        await self.write(lambda: StudentActivityLog.objects.create(student=self.idle, course=self.course, activity_type='lesson_view'))
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'delta', 'counters': {'active_today': 1}})
+        # Already active today: nothing to push
+        await self.write(lambda: StudentActivityLog.objects.create(student=self.idle, course=self.course, activity_type='lesson_view'))
+        self.assertTrue(await communicator.receive_nothing())
+
+        submission = await database_sync_to_async(QuizSubmission.objects.get)(student=self.idle, quiz=self.quiz)
+        submission.end_time = timezone.now()
+        await self.write(submission.save)
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'delta', 'counters': {'submissions': 1}})
+        # Grading a finished submission is not another submission
+        await self.write(submission.save)
+        self.assertTrue(await communicator.receive_nothing())
+
+        await communicator.disconnect()
+
+    async def test_only_course_instructors_can_subscribe(self):
+        """Test that students and anonymous users are refused."""
+        for user in (self.active, AnonymousUser()):
+            connected, code = await self.communicator(user).connect()
+            self.assertFalse(connected)
+            self.assertEqual(code, 4403)
+
+
+class AnalyticsPipelineTest(AnalyticsTestCase):
+    def assert_recomputed(self, run):
+        run.refresh_from_db()
+        self.assertEqual(run.status, 'succeeded')
+        self.assertEqual(run.course_ids, [self.course.id])
+        self.assertEqual(
+            sorted(set(run.stages.values_list('stage', flat=True))),
+            ['caches', 'detect', 'engagement', 'snapshots']
+        )
+        self.assertEqual(StudentPerformanceSnapshot.objects.filter(course=self.course).count(), 2)
+        self.assertTrue(CourseEngagementMetrics.objects.filter(course=self.course).exists())
+
+    @override_settings(ANALYTICS_USE_CELERY=False)
+    def test_recomputes_only_changed_courses(self):
+        """Test that a run recomputes courses with new activity and the next run starts where it ended."""
+        quiet = Course.objects.create(title='Quiet Course', description='...')
+        StudentCourseMetrics.objects.filter(course=quiet).delete()
+
+        run = AnalyticsPipelineRun.objects.get(id=run_analytics_pipeline())
+        self.assert_recomputed(run)
+        self.assertFalse(CourseEngagementMetrics.objects.filter(course=quiet).exists())
+
+        second = AnalyticsPipelineRun.objects.get(id=run_analytics_pipeline())
+        self.assertEqual(second.activity_since, run.activity_until)
+        self.assertEqual(second.course_ids, [])
+        self.assertEqual(second.status, 'succeeded')
+
+    @override_settings(ANALYTICS_USE_CELERY=True)
+    def test_runs_as_celery_workflow(self):
+        """Test that the chained and grouped Celery stages produce the same results."""
+        shards = snapshot_shards([self.course.id], shard_size=1)
+        self.assertEqual(shards, [(self.course.id, [self.active.id]), (self.course.id, [self.idle.id])])
+
+        celery_app.conf.task_always_eager = True
+        try:
+            run = AnalyticsPipelineRun.objects.get(id=run_analytics_pipeline())
+        finally:
+            celery_app.conf.task_always_eager = False
+        self.assert_recomputed(run)
+
+    @override_settings(ANALYTICS_USE_CELERY=False)
+    def test_failed_run_is_retried_from_the_same_point(self):
+        """Test that a failing stage marks the run failed and the next run covers its changes again."""
+        with mock.patch('apps.analytics.pipeline.calculate_course_engagement', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                run_analytics_pipeline()
+        failed = AnalyticsPipelineRun.objects.get()
+        self.assertEqual(failed.status, 'failed')
+        self.assertIn('boom', failed.error)
+
+        run = AnalyticsPipelineRun.objects.get(id=run_analytics_pipeline())
+        self.assertEqual(run.activity_since, failed.activity_since)
+        self.assert_recomputed(run)
+
+
+class ActivityArchiveTest(AnalyticsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+        other = Course.objects.create(title='Other Course', description='...')
+        january = timezone.make_aware(datetime(2025, 1, 10, 12))
+        StudentActivityLog.objects.bulk_create([
+            StudentActivityLog(student=self.active, course=self.course, activity_type='lesson_view', timestamp=january),
+            StudentActivityLog(student=self.active, course=self.course, activity_type='quiz_attempt', timestamp=january + timedelta(days=1)),
+            StudentActivityLog(student=self.idle, course=self.course, activity_type='lesson_view', timestamp=january + timedelta(days=20)),
+            StudentActivityLog(student=self.idle, course=other, activity_type='lesson_view', timestamp=january),
+            StudentActivityLog(student=self.idle, course=self.course, activity_type='forum_post', timestamp=january + timedelta(days=30)),
+        ])
+
+    def test_archives_complete_months_with_manifest(self):
+        """Test that the command writes one directory per month and lists it in the manifest."""
+        out = StringIO()
+        call_command('archive_activity_logs', root=self.root, stdout=out)
+        self.assertIn('2025-01: archived 4 events', out.getvalue())
+        self.assertIn('2025-02: archived 1 events', out.getvalue())
+
+        manifest = read_manifest(self.root)
+        self.assertEqual(manifest['months']['2025-01']['rows'], 4)
+        self.assertEqual(os.path.getsize(os.path.join(self.root, '2025-01', 'student')), 4 * 4)
+
+        out = StringIO()
+        call_command('archive_activity_logs', root=self.root, stdout=out)
+        self.assertIn('2025-01: already archived, skipped', out.getvalue())
+
+    def test_forced_rewrite_never_shrinks_an_archive(self):
+        """Test that re-archiving a month whose raw rows were purged keeps the existing files."""
+        archive_activity_month('2025-01', self.root)
+        archived = read_manifest(self.root)['months']['2025-01']
+        StudentActivityLog.objects.filter(timestamp__lt=timezone.make_aware(datetime(2025, 1, 20))).delete()
+
+        with self.assertRaises(CommandError):
+            call_command('archive_activity_logs', months=['2025-01'], force=True, root=self.root, stdout=StringIO())
+        StudentActivityLog.objects.filter(timestamp__lt=timezone.make_aware(datetime(2025, 2, 1))).delete()
+        with self.assertRaises(ValueError):
+            archive_activity_month('2025-01', self.root)
+
+        self.assertEqual(read_manifest(self.root)['months']['2025-01'], archived)
+        self.assertEqual(ActivityArchive(self.root).count(), 4)
+        self.assertFalse(os.path.exists(os.path.join(self.root, '2025-01.tmp')))
+
+    def test_course_less_rows_sort_first(self):
+        """Test that rows without a course head the course column on every database."""
+        january = timezone.make_aware(datetime(2025, 1, 15))
+        StudentActivityLog.objects.create(student=self.idle, course=None, activity_type='video_join', timestamp=january)
+
+        with CaptureQueriesContext(connection) as queries:
+            archive_activity_month('2025-01', self.root)
+        # SQLite sorts NULLs first anyway; PostgreSQL needs it spelled out
+        self.assertTrue(any('NULLS FIRST' in query['sql'] for query in queries))
+
+        archive = ActivityArchive(self.root)
+        self.assertEqual(archive.count(course_id=self.course.id), 3)
+        self.assertEqual(archive.count(course_id=0), 1)
+        self.assertEqual(archive.group_by('activity_type', course_id=self.course.id), {'lesson_view': 2, 'quiz_attempt': 1})
+
+    def test_queries_read_mapped_columns(self):
+        """Test filtered counts and group-bys over the archive without touching the database."""
+        archive_activity_month('2025-01', self.root)
+        archive_activity_month('2025-02', self.root)
+        archive = ActivityArchive(self.root)
+        january = timezone.make_aware(datetime(2025, 1, 1))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(archive.count(), 5)
+            self.assertEqual(archive.count(course_id=self.course.id), 4)
+            self.assertEqual(archive.count(course_id=self.course.id, activity_type='lesson_view'), 2)
+            self.assertEqual(archive.count(start=january, end=january + timedelta(days=15)), 3)
+            self.assertEqual(
+                archive.group_by('student', course_id=self.course.id),
+                {self.active.id: 2, self.idle.id: 2}
+            )
+            self.assertEqual(
+                archive.group_by('activity_type', start=january, end=january + timedelta(days=31)),
+                {'lesson_view': 3, 'quiz_attempt': 1}
+            )
+            self.assertEqual(archive.group_by('course', activity_type='forum_post'), {self.course.id: 1})
+
+        with self.assertRaises(ValueError):
+            archive.group_by('activity_data')
+
+
+class ActivityRollupTest(AnalyticsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = self.use_temporary_archive()
+
+    def test_compaction_rolls_up_then_deletes(self):
+        """Test that old raw events are rolled up before they are deleted."""
+        old = timezone.now() - timedelta(days=100)
+        StudentActivityLog.objects.bulk_create([
+            StudentActivityLog(student=self.active, course=self.course, activity_type='lesson_view', timestamp=old),
+            StudentActivityLog(student=self.active, course=self.course, activity_type='lesson_view', timestamp=old),
+            StudentActivityLog(student=self.idle, course=self.course, activity_type='lesson_view', timestamp=old),
+        ])
+
+        call_command('compact_activity_logs', '--older-than', '90', stdout=StringIO())
+
+        rollup = DailyActivityRollup.objects.get(course=self.course, day=timezone.localdate(old))
+        self.assertEqual((rollup.event_count, rollup.student_count), (3, 2))
+        self.assertFalse(StudentActivityLog.objects.filter(timestamp__lt=timezone.now() - timedelta(days=90)).exists())
+        # Raw events inside the retention window are kept
+        self.assertEqual(StudentActivityLog.objects.filter(course=self.course).count(), 2)
+        # Complete months are archived before their rows are deleted
+        self.assertEqual(read_manifest(self.root)['months'][month_key(timezone.localtime(old))]['rows'], 3)
+
+    def test_purge_keeps_months_missing_from_the_archive(self):
+        """Test that raw events are only deleted once their month is in the archive."""
+        old = timezone.now() - timedelta(days=100)
+        StudentActivityLog.objects.bulk_create([
+            StudentActivityLog(student=self.active, course=self.course, activity_type='lesson_view', timestamp=old)
+            for _ in range(3)
+        ])
+        rollup_activity_logs()
+
+        self.assertEqual(purge_activity_logs(90), 0)
+        self.assertEqual(StudentActivityLog.objects.filter(timestamp__lt=timezone.now() - timedelta(days=90)).count(), 3)
+
+        archive_activity_month(month_key(timezone.localtime(old)))
+        self.assertEqual(purge_activity_logs(90), 3)
+
+    def test_timeline_combines_rollups_and_raw_events(self):
+        """Test that the timeline reads rolled-up days from the rollup table and newer days from raw rows."""
+        three_days_ago = timezone.now() - timedelta(days=3)
+        StudentActivityLog.objects.create(student=self.idle, course=self.course, activity_type='quiz_attempt', timestamp=three_days_ago)
+        call_command('compact_activity_logs', '--rollup-only', stdout=StringIO())
+        # Once rolled up, the raw rows of that day are no longer read
+        StudentActivityLog.objects.filter(timestamp__lt=timezone.now() - timedelta(days=1)).delete()
+
+        timeline = get_activity_timeline(self.course, days=30)
+
+        self.assertEqual(timeline, [
+            {'day': timezone.localdate(three_days_ago), 'count': 1},
+            {'day': timezone.localdate(), 'count': 1},
+        ])
@@ -0,0 +1,118 @@
+from datetime import timedelta
+
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import StudentPerformanceSnapshot
+from .rollups import start_of_day
+
+TREND_BUCKETS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+# Longest window the trends API serves; with bucketing this is still ~120 monthly points
+MAX_TREND_DAYS = 3650
+DEFAULT_TREND_POINTS = 300
+MAX_TREND_POINTS = 1000
+# LTTB always keeps the first and last point and picks at least one in between
+MIN_TREND_POINTS = 3
+
+
+def default_bucket(days):
+    """Coarsest bucket that still gives a chart enough points for the window"""
+    if days <= 90:
+        return 'day'
+    if days <= 730:
+        return 'week'
+    return 'month'
+
+
+def window_start(days):
+    """Start of the day `days` days ago.
+
+    Windows start on a day boundary so that they, and anything derived from
+    them such as an ETag, only move once per day.
+    """
+    return start_of_day(timezone.localdate() - timedelta(days=days))
+
+
+def snapshot_window(student, course, days):
+    """A student's snapshots from the start of the day `days` days ago"""
+    return StudentPerformanceSnapshot.objects.filter(
+        student=student,
+        course=course,
+        snapshot_date__gte=window_start(days)
+    )
+
+
+def period_start(day, bucket):
+    """First day of the bucket containing `day`; weeks start on Monday like TruncWeek"""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def bucket_starts(first_day, last_day, bucket):
+    """First day of every bucket overlapping first_day..last_day"""
+    day = period_start(first_day, bucket)
+    while day <= last_day:
+        yield day
+        if bucket == 'month':
+            day = (day + timedelta(days=32)).replace(day=1)
+        else:
+            day += timedelta(days=7 if bucket == 'week' else 1)
+
+
+def fill_forward(values_by_period, periods, carried=None):
+    """One (period, *values) row per period, repeating the last known values.
+
+    Snapshots are only stored when metrics change, so a period without one
+    still has the values of the snapshot before it (`carried` for the first
+    periods). Periods before any known values are left out.
+    """
+    rows = []
+    values = carried
+    for period in periods:
+        values = values_by_period.get(period, values)
+        if values is not None:
+            rows.append((period, *values))
+    return rows
+
+
+def lttb_indices(xs, series, threshold):
+    """Largest-Triangle-Three-Buckets downsampling of several series sharing one x axis.
+
+    Returns the indices of at most `threshold` points to keep. The triangle
+    area used to pick each point is summed over all series, so peaks in any
+    of them survive and the series stay aligned on the same x values.
+    """
+    n = len(xs)
+    if threshold >= n or threshold < MIN_TREND_POINTS:
+        return list(range(n))
+
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third corner of the triangle
+        avg_start = int((i + 1) * every) + 1
+        avg_end = max(min(int((i + 2) * every) + 1, n), avg_start + 1)
+        avg_x = sum(xs[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_ys = [sum(ys[avg_start:avg_end]) / (avg_end - avg_start) for ys in series]
+
+        best, best_area = None, -1.0
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = sum(
+                abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+                for ys, avg_y in zip(series, avg_ys)
+            )
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+
+    selected.append(n - 1)
+    return selected
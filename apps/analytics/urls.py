@@ -17,4 +17,7 @@ urlpatterns = [
     # API endpoints
     path('api/trends/<int:course_id>/', views.api_performance_trends, name='api_trends'),
     path('api/engagement/<int:course_id>/', views.api_course_engagement, name='api_engagement'),
+    path('api/retention/<int:course_id>/', views.api_course_retention, name='api_retention'),
+    path('api/funnel/<int:course_id>/', views.api_lesson_funnel, name='api_funnel'),
+    path('api/heatmap/<int:course_id>/', views.api_student_heatmap, name='api_heatmap'),
 ]
\ No newline at end of file
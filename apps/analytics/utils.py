@@ -1,72 +1,229 @@
-from django.db.models import Avg, Count, Q, F
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Case, Count, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast, Least, Round
 from django.utils import timezone
 from datetime import timedelta
-from apps.courses.models import Course, LessonProgress, Submission
+from apps.courses.models import Course, Lesson, LessonProgress, Submission
 from apps.quiz.models import QuizSubmission
 from apps.forum.models import DiscussionThread, DiscussionPost
-from .models import StudentPerformanceSnapshot, CourseEngagementMetrics, StudentActivityLog
+from .models import (
+    StudentPerformanceSnapshot,
+    CourseEngagementMetrics,
+    StudentActivityLog,
+    StudentCourseMetrics,
+    EngagementFormula,
+)
+from .active_students import count_active_students
+from .bitmaps import lesson_layout
+from .dropout import get_at_risk_students
+from .heatmap import StudentHeatmap
+from .reports import publish_course_reports
+from .rollups import student_activity_counts
+from .snapshots import SNAPSHOT_FIELDS, latest_snapshot_values
+from .trends import TREND_BUCKETS, bucket_starts, fill_forward, lttb_indices, snapshot_window, window_start
+from .activity import activity_buffer
 
+DEFAULT_FORMULA = EngagementFormula()
 
-def calculate_student_performance(student, course):
-    """Calculate comprehensive performance metrics for a student in a course"""
-    
-    # Quiz average
-    quiz_submissions = QuizSubmission.objects.filter(
-        student=student,
-        quiz__lesson__course=course
-    )
-    if quiz_submissions.exists():
-        quiz_avg = sum(
-            (q.score / q.total_questions * 100) if q.total_questions > 0 else 0
-            for q in quiz_submissions
-        ) / quiz_submissions.count()
-    else:
-        quiz_avg = 0.0
-    
-    # Assignment average
-    submissions = Submission.objects.filter(
-        student=student,
-        assignment__lesson__course=course,
-        grade__isnull=False
+
+def quiz_percentage_expression():
+    """Per-submission MCQ percentage, 0 for submissions without questions"""
+    return Case(
+        When(
+            total_questions__gt=0,
+            then=Cast('mcq_score', FloatField()) * 100.0 / Cast('total_questions', FloatField()),
+        ),
+        default=Value(0.0),
+        output_field=FloatField(),
     )
-    assignment_avg = submissions.aggregate(avg=Avg('grade'))['avg'] or 0.0
-    
-    # Completion rate
-    total_lessons = course.lessons.count()
-    completed_lessons = LessonProgress.objects.filter(
-        student=student,
-        lesson__course=course,
-        is_completed=True
-    ).count()
-    completion_rate = (completed_lessons / total_lessons * 100) if total_lessons > 0 else 0.0
-    
-    # Engagement score (composite metric)
-    # Based on: quiz performance (30%), assignment grades (30%), completion rate (20%), forum activity (20%)
-    forum_posts = DiscussionPost.objects.filter(
-        author=student,
-        thread__course=course
-    ).count()
-    forum_threads = DiscussionThread.objects.filter(
-        author=student,
-        course=course
-    ).count()
-    forum_activity = min((forum_posts + forum_threads * 2) / 10 * 100, 100)  # Cap at 100
-    
+
+
+PERFORMANCE_COMPONENTS = ('quizzes', 'assignments', 'lessons', 'forum', 'chat')
+
+# Changes take effect through rescore_course_metrics, which also drops the cached copy
+FORMULA_CACHE_TIMEOUT = 60 * 60
+
+
+def formula_cache_key(course_id):
+    return f'analytics:engagement-formula:{course_id}'
+
+
+def get_engagement_formula(course):
+    """The course's engagement formula, or an unsaved one holding the defaults"""
+    course_id = getattr(course, 'id', course)
+    key = formula_cache_key(course_id)
+    formula = cache.get(key)
+    if formula is None:
+        formula = EngagementFormula.objects.filter(course_id=course_id).first() or EngagementFormula(course_id=course_id)
+        cache.set(key, formula, FORMULA_CACHE_TIMEOUT)
+    return formula
+
+
+def score_performance(quiz_average, assignment_average, completed_lessons, total_lessons, forum_posts, forum_threads,
+                      chat_messages=0, formula=None):
+    """Turn raw per-student counts and averages into performance metrics.
+
+    `formula` is an EngagementFormula; engagement_expression is the same
+    calculation as a database expression and the two must be kept in step.
+    """
+    formula = formula or DEFAULT_FORMULA
+    completion_rate = (completed_lessons * 100 / total_lessons) if total_lessons > 0 else 0.0
+
+    # Engagement score (composite metric): a weighted sum of 0-100 components,
+    # with forum and chat activity capped at 100
+    forum_activity = min((forum_posts + forum_threads * formula.thread_points) * 100 / formula.forum_cap, 100)
+    chat_activity = min(chat_messages * 100 / formula.chat_cap, 100)
+
     engagement_score = (
-        quiz_avg * 0.3 +
-        assignment_avg * 0.3 +
-        completion_rate * 0.2 +
-        forum_activity * 0.2
+        quiz_average * formula.quiz_weight +
+        assignment_average * formula.assignment_weight +
+        completion_rate * formula.completion_weight +
+        forum_activity * formula.forum_weight +
+        chat_activity * formula.chat_weight
     )
-    
+
     return {
-        'quiz_average': round(quiz_avg, 2),
-        'assignment_average': round(assignment_avg, 2),
+        'quiz_average': round(quiz_average, 2),
+        'assignment_average': round(assignment_average, 2),
         'completion_rate': round(completion_rate, 2),
         'engagement_score': round(engagement_score, 2),
     }
 
 
+def completion_rate_expression():
+    """completion_rate of score_performance over StudentCourseMetrics columns"""
+    return Case(
+        When(total_lessons__gt=0, then=F('completed_lessons') * 100.0 / F('total_lessons')),
+        default=Value(0.0),
+        output_field=FloatField()
+    )
+
+
+def engagement_expression(formula):
+    """engagement_score of score_performance over StudentCourseMetrics columns"""
+    forum_activity = Least(
+        (F('forum_posts') + F('forum_threads') * formula.thread_points) * 100.0 / formula.forum_cap,
+        Value(100.0),
+        output_field=FloatField()
+    )
+    chat_activity = Least(F('chat_messages') * 100.0 / formula.chat_cap, Value(100.0), output_field=FloatField())
+    return (
+        F('quiz_average') * formula.quiz_weight +
+        F('assignment_average') * formula.assignment_weight +
+        completion_rate_expression() * formula.completion_weight +
+        forum_activity * formula.forum_weight +
+        chat_activity * formula.chat_weight
+    )
+
+
+def rescore_course_metrics(course_id):
+    """Recompute every stored engagement score of a course with its current formula.
+
+    Inputs are already stored per student, so the whole cohort is rescored
+    by one UPDATE evaluating the formula column-wise in the database.
+    Returns the number of rows updated.
+    """
+    cache.delete(formula_cache_key(course_id))
+    formula = get_engagement_formula(course_id)
+    return StudentCourseMetrics.objects.filter(course_id=course_id).update(
+        completion_rate=Round(completion_rate_expression(), 2),
+        engagement_score=Round(engagement_expression(formula), 2),
+        updated_at=timezone.now()
+    )
+
+
+def _grouped(queryset, group_by, aggregate):
+    return dict(
+        queryset.values(group_by).annotate(value=aggregate).values_list(group_by, 'value').order_by()
+    )
+
+
+def aggregate_performance_inputs(course, student_ids, components=PERFORMANCE_COMPONENTS):
+    """Load the raw inputs of score_performance for a batch of students.
+
+    Each requested component costs one grouped query (two for 'lessons' and
+    'forum', three for 'chat'), independent of the number of students. Returns a dict of
+    inputs keyed by student id, holding only the requested components.
+    """
+    inputs = {student_id: {} for student_id in student_ids}
+    if not student_ids:
+        return inputs
+
+    if 'quizzes' in components:
+        quiz_avgs = _grouped(
+            QuizSubmission.objects.filter(student__in=student_ids, quiz__course=course),
+            'student', Avg(quiz_percentage_expression())
+        )
+        for student_id, values in inputs.items():
+            values['quiz_average'] = quiz_avgs.get(student_id) or 0.0
+
+    if 'assignments' in components:
+        assignment_avgs = _grouped(
+            Submission.objects.filter(
+                student__in=student_ids,
+                assignment__lesson__course=course,
+                grade__isnull=False
+            ),
+            'student', Avg('grade')
+        )
+        for student_id, values in inputs.items():
+            values['assignment_average'] = assignment_avgs.get(student_id) or 0.0
+
+    if 'lessons' in components:
+        total_lessons = Lesson.objects.filter(course=course).count()
+        completed = _grouped(
+            LessonProgress.objects.filter(student__in=student_ids, lesson__course=course, is_completed=True),
+            'student', Count('id')
+        )
+        for student_id, values in inputs.items():
+            values['completed_lessons'] = completed.get(student_id, 0)
+            values['total_lessons'] = total_lessons
+
+    if 'chat' in components:
+        chat_messages = student_activity_counts(getattr(course, 'id', course), 'chat_message', student_ids)
+        for student_id, values in inputs.items():
+            values['chat_messages'] = chat_messages.get(student_id, 0)
+
+    if 'forum' in components:
+        forum_posts = _grouped(
+            DiscussionPost.objects.filter(author__in=student_ids, thread__course=course),
+            'author', Count('id')
+        )
+        forum_threads = _grouped(
+            DiscussionThread.objects.filter(author__in=student_ids, course=course),
+            'author', Count('id')
+        )
+        for student_id, values in inputs.items():
+            values['forum_posts'] = forum_posts.get(student_id, 0)
+            values['forum_threads'] = forum_threads.get(student_id, 0)
+
+    return inputs
+
+
+def calculate_cohort_performance(course, student_ids=None):
+    """Calculate performance metrics for many students of a course at once.
+
+    Returns a dict of metrics keyed by student id, built from a fixed number
+    of grouped queries however many students are requested. `student_ids`
+    defaults to every enrolled student; callers with large cohorts should
+    pass batches of ids.
+    """
+    if student_ids is None:
+        student_ids = list(course.students.values_list('id', flat=True))
+
+    formula = get_engagement_formula(course)
+    return {
+        student_id: score_performance(**inputs, formula=formula)
+        for student_id, inputs in aggregate_performance_inputs(course, student_ids).items()
+    }
+
+
+def calculate_student_performance(student, course):
+    """Calculate comprehensive performance metrics for a student in a course"""
+    return calculate_cohort_performance(course, [student.id])[student.id]
+
+
 def create_performance_snapshot(student, course):
     """Create a performance snapshot for a student"""
     metrics = calculate_student_performance(student, course)
@@ -79,67 +236,190 @@ def create_performance_snapshot(student, course):
     return snapshot
 
 
+def create_performance_snapshots(course, student_ids, changed_only=False):
+    """Create performance snapshots for a batch of students with one INSERT.
+
+    With `changed_only`, students whose metrics equal their latest snapshot
+    are skipped; trends fill the gaps forward from the previous snapshot.
+    """
+    metrics = calculate_cohort_performance(course, student_ids)
+    if changed_only:
+        latest = latest_snapshot_values(course, student_ids)
+        metrics = {
+            student_id: student_metrics
+            for student_id, student_metrics in metrics.items()
+            if latest.get(student_id) != tuple(student_metrics[field] for field in SNAPSHOT_FIELDS)
+        }
+    return StudentPerformanceSnapshot.objects.bulk_create([
+        StudentPerformanceSnapshot(student_id=student_id, course=course, **student_metrics)
+        for student_id, student_metrics in metrics.items()
+    ])
+
+
+def _apply_performance_inputs(row, inputs, formula):
+    """Copy inputs onto a metrics row and recompute its derived fields"""
+    for field, value in inputs.items():
+        setattr(row, field, value)
+    metrics = score_performance(
+        **{field: getattr(row, field) for field in StudentCourseMetrics.INPUT_FIELDS},
+        formula=formula
+    )
+    row.completion_rate = metrics['completion_rate']
+    row.engagement_score = metrics['engagement_score']
+    # bulk_update() does not run auto_now
+    row.updated_at = timezone.now()
+    return row
+
+
+def _create_student_metrics(course, student_ids, batch_size=500):
+    formula = get_engagement_formula(course)
+    rows = []
+    for i in range(0, len(student_ids), batch_size):
+        rows += [
+            _apply_performance_inputs(StudentCourseMetrics(student_id=student_id, course_id=course.id), inputs, formula)
+            for student_id, inputs in aggregate_performance_inputs(course, student_ids[i:i + batch_size]).items()
+        ]
+    # Concurrent readers may race to create the same rows; either copy is current
+    StudentCourseMetrics.objects.bulk_create(rows, ignore_conflicts=True)
+    return {row.student_id: row for row in rows}
+
+
+def get_student_performance(student, course):
+    """Read a student's metrics from the maintained table (one indexed lookup)"""
+    row = StudentCourseMetrics.objects.filter(student=student, course=course).first()
+    if row is None:
+        row = _create_student_metrics(course, [student.id])[student.id]
+    return row.as_metrics()
+
+
+def get_cohort_performance(course, student_ids=None):
+    """Read metrics for many students of a course from the maintained table.
+
+    Rows missing for any requested student are computed in bulk and stored.
+    """
+    rows = StudentCourseMetrics.objects.filter(course=course)
+    if student_ids is not None:
+        rows = rows.filter(student__in=student_ids)
+    rows = {row.student_id: row for row in rows}
+
+    if student_ids is None:
+        student_ids = list(course.students.values_list('id', flat=True))
+    missing = [student_id for student_id in student_ids if student_id not in rows]
+    if missing:
+        rows.update(_create_student_metrics(course, missing))
+
+    return {student_id: rows[student_id].as_metrics() for student_id in student_ids}
+
+
+def refresh_student_metrics(student_id, course_id, components=PERFORMANCE_COMPONENTS):
+    """Recompute some components of an existing metrics row after a write.
+
+    Rows are only ever created by readers and rebuild_student_metrics, so
+    writes by users who never had metrics read cost a single lookup.
+    """
+    row = StudentCourseMetrics.objects.filter(student_id=student_id, course_id=course_id).first()
+    if row is None:
+        return None
+    inputs = aggregate_performance_inputs(course_id, [student_id], components)[student_id]
+    _apply_performance_inputs(row, inputs, get_engagement_formula(course_id)).save()
+    return row
+
+
+def refresh_course_metrics(course_id, components=PERFORMANCE_COMPONENTS, batch_size=500):
+    """Recompute some components of every metrics row of a course"""
+    student_ids = list(
+        StudentCourseMetrics.objects.filter(course_id=course_id).values_list('student_id', flat=True)
+    )
+    formula = get_engagement_formula(course_id)
+    for i in range(0, len(student_ids), batch_size):
+        batch = student_ids[i:i + batch_size]
+        inputs = aggregate_performance_inputs(course_id, batch, components)
+        rows = StudentCourseMetrics.objects.filter(course_id=course_id, student__in=batch)
+        StudentCourseMetrics.objects.bulk_update(
+            [_apply_performance_inputs(row, inputs[row.student_id], formula) for row in rows],
+            StudentCourseMetrics.INPUT_FIELDS + ['completion_rate', 'engagement_score', 'updated_at']
+        )
+
+
+def rebuild_student_metrics(course, batch_size=500):
+    """Reconcile a course's metrics rows with the raw tables.
+
+    Creates rows for enrolled students without one, rewrites rows that have
+    drifted and removes rows of students no longer enrolled. Returns the
+    number of rows created, updated and removed.
+    """
+    created = updated = 0
+    student_ids = list(course.students.order_by('id').values_list('id', flat=True))
+    fields = StudentCourseMetrics.INPUT_FIELDS + ['completion_rate', 'engagement_score']
+    formula = get_engagement_formula(course)
+
+    for i in range(0, len(student_ids), batch_size):
+        batch = student_ids[i:i + batch_size]
+        existing = {row.student_id: row for row in StudentCourseMetrics.objects.filter(course=course, student__in=batch)}
+        new_rows = []
+        changed_rows = []
+        for student_id, inputs in aggregate_performance_inputs(course, batch).items():
+            row = existing.get(student_id)
+            if row is None:
+                new_rows.append(
+                    _apply_performance_inputs(StudentCourseMetrics(student_id=student_id, course=course), inputs, formula)
+                )
+                continue
+            before = [getattr(row, field) for field in fields]
+            if [getattr(_apply_performance_inputs(row, inputs, formula), field) for field in fields] != before:
+                changed_rows.append(row)
+        StudentCourseMetrics.objects.bulk_create(new_rows, ignore_conflicts=True)
+        StudentCourseMetrics.objects.bulk_update(changed_rows, fields + ['updated_at'])
+        created += len(new_rows)
+        updated += len(changed_rows)
+
+    removed, _ = StudentCourseMetrics.objects.filter(course=course).exclude(
+        student__in=course.students.values('id')
+    ).delete()
+
+    return created, updated, removed
+
+
 def calculate_course_engagement(course):
-    """Calculate engagement metrics for a course"""
-    total_students = course.students.count()
-    
-    # Active students (activity in last 7 days)
-    seven_days_ago = timezone.now() - timedelta(days=7)
-    active_students = StudentActivityLog.objects.filter(
-        course=course,
-        timestamp__gte=seven_days_ago
-    ).values('student').distinct().count()
-    
-    # Average completion rate
-    if total_students > 0:
-        total_lessons = course.lessons.count()
-        if total_lessons > 0:
-            completion_rates = []
-            for student in course.students.all():
-                completed = LessonProgress.objects.filter(
-                    student=student,
-                    lesson__course=course,
-                    is_completed=True
-                ).count()
-                completion_rates.append((completed / total_lessons) * 100)
-            avg_completion = sum(completion_rates) / len(completion_rates) if completion_rates else 0
-        else:
-            avg_completion = 0
+    """Calculate engagement metrics for a course.
+
+    Every field is computed with a fixed number of grouped/annotated queries,
+    so the cost does not grow with the number of enrolled students.
+    """
+    enrolled = course.students.all()
+    total_students = enrolled.count()
+    # Cached lesson ids; dropout scoring below reads the same layout
+    total_lessons = len(lesson_layout(course.id))
+
+    # Active students (activity in the last 7 days), from the daily bitsets
+    active_students = count_active_students(course.id, 7)
+
+    # Average completion rate: the mean of per-student rates equals the total
+    # number of completions by enrolled students over (students x lessons)
+    if total_students > 0 and total_lessons > 0:
+        completed = LessonProgress.objects.filter(
+            lesson__course=course,
+            is_completed=True,
+            student__in=enrolled.values('id')
+        ).count()
+        avg_completion = completed / (total_students * total_lessons) * 100
     else:
         avg_completion = 0
-    
+
     # Average quiz score
-    quiz_submissions = QuizSubmission.objects.filter(
-        quiz__lesson__course=course
-    )
-    if quiz_submissions.exists():
-        avg_quiz = sum(
-            (q.mcq_score / q.total_questions * 100) if q.total_questions > 0 else 0
-            for q in quiz_submissions
-        ) / quiz_submissions.count()
-    else:
-        avg_quiz = 0
-    
+    avg_quiz = QuizSubmission.objects.filter(
+        quiz__course=course
+    ).aggregate(avg=Avg(quiz_percentage_expression()))['avg'] or 0
+
     # Forum activity
     forum_activity = (
         DiscussionThread.objects.filter(course=course).count() +
         DiscussionPost.objects.filter(thread__course=course).count()
     )
-    
-    # Dropout risk (students with < 20% completion and no activity in 14 days)
-    fourteen_days_ago = timezone.now() - timedelta(days=14)
-    at_risk_students = 0
-    for student in course.students.all():
-        metrics = calculate_student_performance(student, course)
-        recent_activity = StudentActivityLog.objects.filter(
-            student=student,
-            course=course,
-            timestamp__gte=fourteen_days_ago
-        ).exists()
-        
-        if metrics['completion_rate'] < 20 and not recent_activity:
-            at_risk_students += 1
-    
+
+    # Dropout risk, shared with the instructor dashboard through the cache
+    at_risk_students = len(get_at_risk_students(course))
+
     metrics = CourseEngagementMetrics.objects.create(
         course=course,
         total_students=total_students,
@@ -149,74 +429,74 @@ def calculate_course_engagement(course):
         forum_activity_count=forum_activity,
         dropout_risk_count=at_risk_students
     )
-    
+    publish_course_reports(course, metrics)
+
     return metrics
 
 
 def log_student_activity(student, activity_type, course=None, **kwargs):
-    """Log a student activity"""
-    return StudentActivityLog.objects.create(
+    """Log a student activity.
+
+    Rows are queued on the in-process activity buffer and written in batches,
+    unless ANALYTICS_BUFFER_ACTIVITY is False.
+    """
+    log = StudentActivityLog(
         student=student,
         course=course,
         activity_type=activity_type,
-        activity_data=kwargs
+        activity_data=kwargs,
+        timestamp=timezone.now()
     )
+    if getattr(settings, 'ANALYTICS_BUFFER_ACTIVITY', True):
+        activity_buffer.record(log)
+    else:
+        log.save()
+    return log
+
 
+def get_performance_trends(student, course, days=30, bucket='day', max_points=None):
+    """Get performance trends over time.
 
-def get_performance_trends(student, course, days=30):
-    """Get performance trends over time"""
-    start_date = timezone.now() - timedelta(days=days)
-    snapshots = StudentPerformanceSnapshot.objects.filter(
+    Snapshots are averaged per `bucket` (day, week or month) in the database
+    and periods without a snapshot repeat the previous values; if more than
+    `max_points` buckets remain they are downsampled with LTTB.
+    """
+    averages = snapshot_window(student, course, days).annotate(
+        period=TREND_BUCKETS[bucket]('snapshot_date')
+    ).values('period').annotate(
+        quiz=Avg('quiz_average'),
+        assignment=Avg('assignment_average'),
+        completion=Avg('completion_rate'),
+        engagement=Avg('engagement_score')
+    ).values_list('period', 'quiz', 'assignment', 'completion', 'engagement').order_by('period')
+    carried = StudentPerformanceSnapshot.objects.filter(
         student=student,
         course=course,
-        snapshot_date__gte=start_date
-    ).order_by('snapshot_date')
-    
+        snapshot_date__lt=window_start(days)
+    ).order_by('-snapshot_date').values_list(*SNAPSHOT_FIELDS).first()
+
+    today = timezone.localdate()
+    rows = fill_forward(
+        {timezone.localtime(period).date(): values for period, *values in averages},
+        bucket_starts(today - timedelta(days=days), today, bucket),
+        carried
+    )
+
+    if max_points is not None and len(rows) > max_points:
+        xs = [row[0].toordinal() for row in rows]
+        series = [[row[k] for row in rows] for k in range(1, 5)]
+        rows = [rows[i] for i in lttb_indices(xs, series, max_points)]
+
     return {
-        'dates': [s.snapshot_date.strftime('%Y-%m-%d') for s in snapshots],
-        'quiz_scores': [s.quiz_average for s in snapshots],
-        'assignment_scores': [s.assignment_average for s in snapshots],
-        'completion_rates': [s.completion_rate for s in snapshots],
-        'engagement_scores': [s.engagement_score for s in snapshots],
+        'bucket': bucket,
+        'dates': [row[0].isoformat() for row in rows],
+        'quiz_scores': [round(row[1], 2) for row in rows],
+        'assignment_scores': [round(row[2], 2) for row in rows],
+        'completion_rates': [round(row[3], 2) for row in rows],
+        'engagement_scores': [round(row[4], 2) for row in rows],
     }
 
 
 def get_student_heatmap_data(course):
     """Generate heatmap data for student progress in course"""
-    students = course.students.all()
-    lessons = course.lessons.all().order_by('order')
-    
-    heatmap_data = []
-    for student in students:
-        student_row = {
-            'student_id': student.id,
-            'student_name': student.get_full_name() or student.username,
-            'lessons': []
-        }
-        
-        for lesson in lessons:
-            progress = LessonProgress.objects.filter(
-                student=student,
-                lesson=lesson
-            ).first()
-            
-            # Get quiz score for this lesson if exists
-            quiz_score = None
-            if hasattr(lesson, 'quiz'):
-                submission = QuizSubmission.objects.filter(
-                    student=student,
-                    quiz=lesson.quiz
-                ).first()
-                if submission and submission.total_questions > 0:
-                    quiz_score = (submission.mcq_score / submission.total_questions) * 100
-            
-            student_row['lessons'].append({
-                'lesson_id': lesson.id,
-                'lesson_title': lesson.title,
-                'completed': progress.is_completed if progress else False,
-                'quiz_score': round(quiz_score, 1) if quiz_score is not None else None,
-            })
-        
-        heatmap_data.append(student_row)
-    
-    return heatmap_data
\ No newline at end of file
+    return StudentHeatmap.for_course(course).as_rows()
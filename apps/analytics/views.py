@@ -1,27 +1,50 @@
 from django.shortcuts import render, get_object_or_404
+from django.core.paginator import Paginator
+from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse
-from django.db.models import Avg, Count, Q, OuterRef, Subquery, Max
-from django.db.models.functions import TruncDate
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.db.models import Avg, Count, Q, Max
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_datetime
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 import csv
+import hashlib
 import json
 from io import BytesIO
+from itertools import islice
 
 from apps.courses.models import LessonProgress
 from apps.courses.models import Course
 from apps.quiz.models import QuizSubmission
 from .models import StudentPerformanceSnapshot, CourseEngagementMetrics, StudentActivityLog
 from .utils import (
-    calculate_student_performance,
-    create_performance_snapshot,
+    get_student_performance,
+    get_cohort_performance,
     calculate_course_engagement,
     get_performance_trends,
-    get_student_heatmap_data
 )
+from .funnel import get_lesson_funnel
+from .heatmap import StudentHeatmap
+from .reports import dashboard_payload, engagement_payload, get_report, publish_report, report_response
+from .retention import build_retention_matrix
+from .trends import (
+    DEFAULT_TREND_POINTS,
+    MAX_TREND_DAYS,
+    MAX_TREND_POINTS,
+    MIN_TREND_POINTS,
+    TREND_BUCKETS,
+    default_bucket,
+)
+from .tasks import is_stale, is_report_stale, is_recalculation_pending, schedule_engagement_recalculation
 from apps.forum.models import DiscussionPost
 
+User = get_user_model()
+
+HEATMAP_PAGE_SIZE = 50
+HEATMAP_MAX_LIMIT = 500
+EXPORT_BATCH_SIZE = 1000
+
 
 @login_required
 def student_performance_dashboard(request, course_id):
@@ -32,16 +55,16 @@ def student_performance_dashboard(request, course_id):
     if not course.students.filter(id=request.user.id).exists() and request.user not in course.instructors.all():
         return HttpResponse("Unauthorized", status=403)
     
-    # Calculate current metrics
-    metrics = calculate_student_performance(request.user, course)
+    # Current metrics
+    metrics = get_student_performance(request.user, course)
     
     # Get trends (last 30 days)
-    trends = get_performance_trends(request.user, course, days=30)
+    trends = json.dumps(get_performance_trends(request.user, course, days=30))
     
     # Recent quiz submissions
     recent_quizzes = QuizSubmission.objects.filter(
         student=request.user,
-        quiz__lesson__course=course
+        quiz__course=course
     ).order_by('-end_time')[:10]
     
     # Lesson completion progress
@@ -72,77 +95,82 @@ def instructor_analytics_dashboard(request, course_id):
     if request.user not in course.instructors.all():
         return HttpResponse("Unauthorized", status=403)
     
-    # Calculate or get latest engagement metrics
+    # Serve the latest engagement metrics; refresh stale ones in the background
     latest_metrics = CourseEngagementMetrics.objects.filter(course=course).first()
-    if not latest_metrics or (timezone.now() - latest_metrics.calculated_at).days > 1:
-        # Recalculate if older than 1 day
+    if latest_metrics is None:
         latest_metrics = calculate_course_engagement(course)
-    
-    # Get student heatmap data
-    heatmap_data = get_student_heatmap_data(course)
-    
-    # Get dropout risk students
-    at_risk_students = []
-    two_weeks_ago = timezone.now() - timedelta(days=14)
-
-    # Subquery to get the last activity timestamp for each student in the course
-    last_activity_subquery = StudentActivityLog.objects.filter(
-        student=OuterRef('pk'),
-        course=course
-    ).order_by('-timestamp').values('timestamp')[:1]
-
-    # Annotate students with their last activity date
-    students_with_last_activity = course.students.annotate(
-        last_activity_timestamp=Subquery(last_activity_subquery)
+    stale = is_stale(latest_metrics)
+    refreshing = stale and (schedule_engagement_recalculation(course.id) or is_recalculation_pending(course.id))
+    
+    # Course-level figures come from the artifact published with the metrics
+    report = get_report(course.id, 'dashboard')
+    if report is None:
+        report = publish_report(course.id, 'dashboard', dashboard_payload(course), latest_metrics.calculated_at)
+    dashboard = json.loads(report['content'])
+    
+    # Get student heatmap data, one page of student rows at a time
+    heatmap_page = Paginator(course.students.all(), HEATMAP_PAGE_SIZE).get_page(request.GET.get('heatmap_page'))
+    heatmap = StudentHeatmap.for_course(
+        course,
+        students=heatmap_page.object_list,
+        offset=max(heatmap_page.start_index() - 1, 0),
+        total_students=heatmap_page.paginator.count
     )
-
-    for student in students_with_last_activity:
-        metrics = calculate_student_performance(student, course)
-        has_recent_activity = student.last_activity_timestamp and student.last_activity_timestamp >= two_weeks_ago
-
-        if metrics['completion_rate'] < 20 and not has_recent_activity:
-            at_risk_students.append({
-                'student': student,
-                'metrics': metrics,
-                'last_activity': student.last_activity_timestamp
-            })
-    
-    # Activity timeline (last 30 days)
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    activity_timeline = StudentActivityLog.objects.filter(
-        course=course,
-        timestamp__gte=thirty_days_ago
-    ).annotate(
-        day=TruncDate('timestamp')
-    ).values('day').annotate(
-        count=Count('id')
-    ).order_by('day')
+    heatmap_data = heatmap.as_rows()
+    
+    # Dropout risk students; only their rows and stored metrics are loaded
+    at_risk_ids = [entry['student_id'] for entry in dashboard['at_risk']]
+    students = User.objects.in_bulk(at_risk_ids)
+    cohort_metrics = get_cohort_performance(course, at_risk_ids)
+    at_risk_students = [
+        {
+            'student': students[entry['student_id']],
+            'metrics': cohort_metrics[entry['student_id']],
+            'last_activity': entry['last_activity'] and parse_datetime(entry['last_activity'])
+        }
+        for entry in dashboard['at_risk']
+        if entry['student_id'] in students
+    ]
     
     context = {
         'course': course,
         'metrics': latest_metrics,
+        'metrics_stale': stale,
+        'metrics_refreshing': refreshing,
         'heatmap_data': heatmap_data,
+        'heatmap_page': heatmap_page,
         'at_risk_students': at_risk_students,
-        'activity_timeline': list(activity_timeline),
+        'active_counts': dashboard['active_counts'],
+        'activity_timeline': json.dumps(dashboard['activity_timeline']),
     }
     
     return render(request, 'analytics/instructor_analytics.html', context)
 
 
-@login_required
-def export_student_performance_csv(request, course_id):
-    """Export student performance data as CSV"""
-    course = get_object_or_404(Course, id=course_id)
-    
-    # Ensure user is the instructor
-    if request.user not in course.instructors.all():
-        return HttpResponse("Unauthorized", status=403)
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="student_performance_{course.id}.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
+class Echo:
+    """An object that implements just the write method of the file-like interface"""
+
+    def write(self, value):
+        return value
+
+
+def streaming_csv_response(filename, rows):
+    """Stream CSV rows to the client as they are produced"""
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse((writer.writerow(row) for row in rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def student_performance_rows(course, batch_size=EXPORT_BATCH_SIZE):
+    """Yield the student performance CSV, computing metrics one batch of students at a time"""
+    yield [
         'Student Name',
         'Username',
         'Email',
@@ -152,58 +180,70 @@ def export_student_performance_csv(request, course_id):
         'Engagement Score',
         'Forum Posts',
         'Last Activity'
-    ])
-    
-    # Annotate each student with their forum post count and last activity timestamp
-    students = course.students.all().annotate(
-        forum_post_count=Count('forum_posts', filter=Q(forum_posts__thread__course=course)),
-        last_activity_timestamp=Max('activity_logs__timestamp', filter=Q(activity_logs__course=course))
-    )
+    ]
 
-    for student in students:
-        metrics = calculate_student_performance(student, course)
-
-        last_activity_str = 'Never'
-        if student.last_activity_timestamp:
-            # Ensure last_activity_timestamp is timezone-aware if your project uses timezones
-            last_activity_ts = student.last_activity_timestamp
-            if timezone.is_aware(last_activity_ts):
-                last_activity_ts = timezone.localtime(last_activity_ts)
-            last_activity_str = last_activity_ts.strftime('%Y-%m-%d %H:%M')
-
-        writer.writerow([
-            student.get_full_name() or '',
-            student.username,
-            student.email,
-            metrics['quiz_average'],
-            metrics['assignment_average'],
-            metrics['completion_rate'],
-            metrics['engagement_score'],
-            student.forum_post_count,
-            last_activity_str
-        ])
-    
-    return response
+    students = course.students.order_by('id').values_list(
+        'id', 'first_name', 'last_name', 'username', 'email'
+    ).iterator(chunk_size=batch_size)
+
+    for batch in batched(students, batch_size):
+        student_ids = [student[0] for student in batch]
+        metrics = get_cohort_performance(course, student_ids)
+        forum_post_counts = dict(
+            DiscussionPost.objects.filter(
+                author__in=student_ids,
+                thread__course=course
+            ).values('author').annotate(count=Count('id')).values_list('author', 'count').order_by()
+        )
+        last_activities = dict(
+            StudentActivityLog.objects.filter(
+                student__in=student_ids,
+                course=course
+            ).values('student').annotate(last=Max('timestamp')).values_list('student', 'last').order_by()
+        )
+
+        for student_id, first_name, last_name, username, email in batch:
+            last_activity_str = 'Never'
+            last_activity_ts = last_activities.get(student_id)
+            if last_activity_ts:
+                if timezone.is_aware(last_activity_ts):
+                    last_activity_ts = timezone.localtime(last_activity_ts)
+                last_activity_str = last_activity_ts.strftime('%Y-%m-%d %H:%M')
+
+            student_metrics = metrics[student_id]
+            yield [
+                f'{first_name} {last_name}'.strip(),
+                username,
+                email,
+                student_metrics['quiz_average'],
+                student_metrics['assignment_average'],
+                student_metrics['completion_rate'],
+                student_metrics['engagement_score'],
+                forum_post_counts.get(student_id, 0),
+                last_activity_str
+            ]
 
 
 @login_required
-def export_engagement_report_csv(request, course_id):
-    """Export course engagement report as CSV"""
+def export_student_performance_csv(request, course_id):
+    """Export student performance data as CSV"""
     course = get_object_or_404(Course, id=course_id)
     
+    # Ensure user is the instructor
     if request.user not in course.instructors.all():
         return HttpResponse("Unauthorized", status=403)
     
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="engagement_report_{course.id}.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Date', 'Total Students', 'Active Students', 'Avg Completion Rate', 'Avg Quiz Score', 'Forum Activity', 'At Risk'])
-    
+    return streaming_csv_response(f'student_performance_{course.id}.csv', student_performance_rows(course))
+
+
+def engagement_report_rows(course):
+    """Yield the engagement report CSV for the last 30 calculations"""
+    yield ['Date', 'Total Students', 'Active Students', 'Avg Completion Rate', 'Avg Quiz Score', 'Forum Activity', 'At Risk']
+
     metrics_history = CourseEngagementMetrics.objects.filter(course=course).order_by('-calculated_at')[:30]
-    
-    for metric in metrics_history:
-        writer.writerow([
+
+    for metric in metrics_history.iterator():
+        yield [
             metric.calculated_at.strftime('%Y-%m-%d'),
             metric.total_students,
             metric.active_students,
@@ -211,9 +251,18 @@ def export_engagement_report_csv(request, course_id):
             metric.average_quiz_score,
             metric.forum_activity_count,
             metric.dropout_risk_count
-        ])
+        ]
+
+
+@login_required
+def export_engagement_report_csv(request, course_id):
+    """Export course engagement report as CSV"""
+    course = get_object_or_404(Course, id=course_id)
     
-    return response
+    if request.user not in course.instructors.all():
+        return HttpResponse("Unauthorized", status=403)
+    
+    return streaming_csv_response(f'engagement_report_{course.id}.csv', engagement_report_rows(course))
 
 
 @login_required
@@ -225,10 +274,36 @@ def api_performance_trends(request, course_id):
     if not course.students.filter(id=request.user.id).exists() and request.user not in course.instructors.all():
         return JsonResponse({'error': 'Unauthorized'}, status=403)
     
-    days = int(request.GET.get('days', 30))
-    trends = get_performance_trends(request.user, course, days=days)
-    
-    return JsonResponse(trends)
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), MAX_TREND_DAYS)
+        points = min(max(int(request.GET.get('points', DEFAULT_TREND_POINTS)), MIN_TREND_POINTS), MAX_TREND_POINTS)
+    except ValueError:
+        return JsonResponse({'error': 'days and points must be integers'}, status=400)
+    bucket = request.GET.get('bucket') or default_bucket(days)
+    if bucket not in TREND_BUCKETS:
+        return JsonResponse({'error': f"bucket must be one of {', '.join(TREND_BUCKETS)}"}, status=400)
+
+    # Snapshots are only ever added or thinned, so their count and newest
+    # timestamp identify the contents; values before the window are carried into it
+    window = StudentPerformanceSnapshot.objects.filter(
+        student=request.user,
+        course=course
+    ).aggregate(latest=Max('snapshot_date'), count=Count('id'))
+    last_modified = int(window['latest'].timestamp()) if window['latest'] else None
+    etag = hashlib.md5(
+        f"{request.user.id}:{course.id}:{timezone.localdate()}:{days}:{bucket}:{points}:"
+        f"{window['latest']}:{window['count']}".encode()
+    ).hexdigest()
+    response = get_conditional_response(request, etag=quote_etag(etag), last_modified=last_modified)
+    if response is None:
+        trends = get_performance_trends(request.user, course, days=days, bucket=bucket, max_points=points)
+        response = JsonResponse(trends)
+
+    response['ETag'] = quote_etag(etag)
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @login_required
@@ -239,19 +314,76 @@ def api_course_engagement(request, course_id):
     if request.user not in course.instructors.all():
         return JsonResponse({'error': 'Unauthorized'}, status=403)
     
-    latest_metrics = CourseEngagementMetrics.objects.filter(course=course).first()
-    
-    if not latest_metrics:
-        latest_metrics = calculate_course_engagement(course)
-    
-    data = {
-        'total_students': latest_metrics.total_students,
-        'active_students': latest_metrics.active_students,
-        'average_completion_rate': latest_metrics.average_completion_rate,
-        'average_quiz_score': latest_metrics.average_quiz_score,
-        'forum_activity_count': latest_metrics.forum_activity_count,
-        'dropout_risk_count': latest_metrics.dropout_risk_count,
-        'calculated_at': latest_metrics.calculated_at.isoformat(),
-    }
-    
-    return JsonResponse(data)
\ No newline at end of file
+    # Served from the report artifact published with the latest metrics
+    report = get_report(course.id, 'engagement')
+    
+    if not report:
+        latest_metrics = CourseEngagementMetrics.objects.filter(course=course).first()
+        if latest_metrics:
+            report = publish_report(course.id, 'engagement', engagement_payload(latest_metrics), latest_metrics.calculated_at)
+        else:
+            calculate_course_engagement(course)
+            report = get_report(course.id, 'engagement')
+    
+    stale = is_report_stale(report)
+    # Fresh reports skip the lock lookup, so polling with a current ETag stays query-free
+    refreshing = stale and (schedule_engagement_recalculation(course.id) or is_recalculation_pending(course.id))
+    
+    return report_response(request, report, extra={
+        'is_stale': stale,
+        'refreshing': refreshing,
+    })
+
+
+@login_required
+def api_course_retention(request, course_id):
+    """API endpoint for the weekly cohort retention matrix"""
+    course = get_object_or_404(Course, id=course_id)
+
+    if request.user not in course.instructors.all():
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+
+    report = get_report(course.id, 'retention')
+    if not report:
+        report = publish_report(course.id, 'retention', build_retention_matrix(course))
+    elif is_report_stale(report):
+        # Retention is republished with the engagement metrics
+        schedule_engagement_recalculation(course.id)
+
+    return report_response(request, report)
+
+
+@login_required
+def api_lesson_funnel(request, course_id):
+    """API endpoint for lesson completion counts and drop-off in course order"""
+    course = get_object_or_404(Course, id=course_id)
+
+    if request.user not in course.instructors.all():
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+
+    return JsonResponse(get_lesson_funnel(course))
+
+
+@login_required
+def api_student_heatmap(request, course_id):
+    """API endpoint for a page of the student progress heatmap"""
+    course = get_object_or_404(Course, id=course_id)
+
+    if request.user not in course.instructors.all():
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+
+    try:
+        offset = max(int(request.GET.get('offset', 0)), 0)
+        limit = min(max(int(request.GET.get('limit', HEATMAP_PAGE_SIZE)), 1), HEATMAP_MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'offset and limit must be integers'}, status=400)
+
+    students = course.students.all()
+    heatmap = StudentHeatmap.for_course(
+        course,
+        students=students[offset:offset + limit],
+        offset=offset,
+        total_students=students.count()
+    )
+
+    return JsonResponse(heatmap.to_json())
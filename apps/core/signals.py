@@ -0,0 +1,9 @@
+from django.db.models import QuerySet
+
+
+def cascaded_from(origin, *models):
+    """Whether a delete was started by one of `models` rather than the instance itself"""
+    if origin is None:
+        return False
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, models)
@@ -5,3 +5,6 @@ class CoursesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.courses'
     label = 'courses'
+
+    def ready(self):
+        import apps.courses.signals
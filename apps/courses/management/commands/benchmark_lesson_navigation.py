@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from apps.analytics.benchmarks import measure
+from apps.courses.models import Course, Lesson
+from apps.courses.views import LessonDetailView
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark lesson page views on courses of growing length (data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lessons',
+            type=int,
+            nargs='+',
+            default=[10, 100, 300, 1000],
+            help='Course lengths to benchmark',
+        )
+        parser.add_argument(
+            '--views',
+            type=int,
+            default=50,
+            help='Lesson views measured per course',
+        )
+
+    def handle(self, *args, **options):
+        view = LessonDetailView.as_view()
+        factory = RequestFactory()
+        self.stdout.write(f"{'lessons':>10} {'queries/view':>13} {'ms/view':>10}")
+
+        for num_lessons in options['lessons']:
+            with transaction.atomic():
+                # Instructors are not logged as active, so views do not write
+                instructor = User.objects.create(username=f'bench_instructor_{num_lessons}', password='!', is_instructor=True)
+                course = Course.objects.create(title=f'bench course ({num_lessons} lessons)', description='Synthetic benchmark course')
+                course.instructors.add(instructor)
+                lessons = Lesson.objects.bulk_create([
+                    Lesson(course=course, title=f'Lesson {i}', content='', order=i)
+                    for i in range(num_lessons)
+                ])
+                cache.clear()
+
+                def render(lesson):
+                    request = factory.get(f'/courses/{course.pk}/lessons/{lesson.pk}/')
+                    request.user = instructor
+                    view(request, course_id=course.pk, lesson_id=lesson.pk).render()
+
+                step = max(1, num_lessons // options['views'])
+                visited = lessons[::step][:options['views']]
+                # The first pass builds the cached outline and the visited lessons' entries
+                for lesson in visited:
+                    render(lesson)
+                with measure() as result:
+                    for lesson in visited:
+                        render(lesson)
+
+                self.stdout.write(
+                    f"{num_lessons:>10} {result['queries'] / len(visited):>13.1f} "
+                    f"{result['seconds'] / len(visited) * 1000:>10.2f}"
+                )
+                transaction.set_rollback(True)
@@ -0,0 +1,123 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+# Bytes read per iteration when Python streams a byte range itself
+RANGE_BLOCK_SIZE = 64 * 1024
+# Delivery modes; the handoffs let nginx (X-Accel-Redirect) or Apache/lighttpd (X-Sendfile) send the bytes
+MEDIA_DELIVERY_MODES = ('django', 'x-accel-redirect', 'x-sendfile')
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single-range header, None to send the whole file.
+
+    Returns False when the range cannot be satisfied. Invalid ranges such as
+    bytes=5-3 are ignored, and multiple ranges are answered with the whole
+    file, both as the spec allows.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        # Syntactically invalid, so the header is ignored (RFC 9110 14.2)
+        return None
+    if start >= size:
+        return False
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(RANGE_BLOCK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def _handoff(fieldfile, mode):
+    response = HttpResponse()
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(fieldfile.name)
+    else:
+        response['X-Sendfile'] = fieldfile.path
+    # The front-end server fills in the body, length and range handling
+    del response['Content-Type']
+    return response
+
+
+def serve_media(request, fieldfile):
+    """Serve a stored file after the caller has checked access.
+
+    Answers If-None-Match and If-Modified-Since with 304s. In 'django'
+    mode it also answers single byte ranges with 206s so that video
+    seeking does not refetch the file. In the handoff modes only the
+    validators are computed here and the front-end server sends the bytes.
+    """
+    path = fieldfile.path
+    stat = os.stat(path)
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        mode = getattr(settings, 'MEDIA_DELIVERY', 'django')
+        if mode not in MEDIA_DELIVERY_MODES:
+            raise ImproperlyConfigured(f"MEDIA_DELIVERY must be one of {', '.join(MEDIA_DELIVERY_MODES)}")
+        if mode != 'django':
+            response = _handoff(fieldfile, mode)
+        else:
+            response = _file_response(request, path, stat.st_size, etag)
+        content_type, _ = mimetypes.guess_type(path)
+        if content_type and not response.has_header('Content-Type'):
+            response['Content-Type'] = content_type
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Access is checked per request, so shared caches must not keep a copy
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _file_response(request, path, size, etag):
+    byte_range = None
+    header = request.headers.get('Range')
+    # A stale If-Range means the client's partial copy is outdated: send everything
+    if header and request.headers.get('If-Range', etag) == etag:
+        byte_range = parse_range(header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range is None:
+        response = FileResponse(open(path, 'rb'))
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(path, start, end - start + 1), status=206)
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        del response['Content-Type']
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_plagiarismreport'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lessonprogress',
+            index=models.Index(fields=['lesson', 'is_completed', 'student'], name='courses_les_lesson__533ccf_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_lessonprogress_completion_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='outline_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_course_outline_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['course', 'order', 'created_at'], name='courses_les_course__434e07_idx'),
+        ),
+    ]
@@ -9,10 +9,21 @@ class Course(models.Model):
     students = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='courses_enrolled', blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     image = models.ImageField(upload_to='course_images/', blank=True, null=True)
+    # Bumped on every lesson, assignment and peer-review change; keys the cached outline
+    outline_version = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # The version only moves through bump_outline_version; a stale instance must not write it back
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'outline_version'
+            ]
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['title']
 
@@ -27,6 +38,10 @@ class Lesson(models.Model):
 
     class Meta:
         ordering = ['order', 'created_at']
+        indexes = [
+            # Course order and prev/next lookups
+            models.Index(fields=['course', 'order', 'created_at']),
+        ]
 
     def __str__(self):
         return f"{self.course.title} - {self.title}"
@@ -69,6 +84,10 @@ class LessonProgress(models.Model):
     class Meta:
         unique_together = ('student', 'lesson')
         ordering = ['-completed_at']
+        indexes = [
+            # Covers per-lesson completion counts restricted to a set of students
+            models.Index(fields=['lesson', 'is_completed', 'student']),
+        ]
 
     def __str__(self):
         return f"{self.student.username} - {self.lesson.title} ({'Completed' if self.is_completed else 'In Progress'})"
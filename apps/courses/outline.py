@@ -0,0 +1,108 @@
+from django.core.cache import cache
+from django.db.models import F, Q
+
+from apps.peer_review.models import PeerReviewAssignment
+from .models import Assignment, Course, Lesson
+
+# Keys change with the course's outline version; the timeout only evicts unread outlines
+OUTLINE_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def outline_cache_key(course_id, version):
+    return f'courses:outline:{course_id}:{version}'
+
+
+def bump_outline_version(course_id):
+    """Make every cached outline of the course unreachable"""
+    Course.objects.filter(pk=course_id).update(outline_version=F('outline_version') + 1)
+
+
+def build_course_outline(course):
+    """Lessons in course order with stubs of their assignments and peer reviews.
+
+    Three queries regardless of course size. Lessons and stubs are plain
+    dicts, so templates read `lesson.pk`, `lesson.title` and so on as with
+    model instances.
+    """
+    lessons = [
+        {**lesson, 'pk': lesson['id'], 'assignments': [], 'peer_reviews': []}
+        for lesson in course.lessons.order_by('order', 'created_at').values('id', 'title', 'order', 'created_at')
+    ]
+    by_id = {lesson['id']: lesson for lesson in lessons}
+
+    stubs = [
+        ('assignments', Assignment.objects.filter(lesson__course=course)),
+        ('peer_reviews', PeerReviewAssignment.objects.filter(lesson__course=course)),
+    ]
+    for key, queryset in stubs:
+        for stub in queryset.order_by('due_date', 'title').values('id', 'lesson_id', 'title', 'due_date'):
+            by_id[stub.pop('lesson_id')][key].append({**stub, 'pk': stub['id']})
+
+    return {'lessons': lessons, 'index': {lesson['id']: position for position, lesson in enumerate(lessons)}}
+
+
+def get_course_outline(course):
+    """The cached outline for the course's current version"""
+    key = outline_cache_key(course.pk, course.outline_version)
+    outline = cache.get(key)
+    if outline is None:
+        outline = build_course_outline(course)
+        cache.set(key, outline, OUTLINE_CACHE_TIMEOUT)
+    return outline
+
+
+def neighbour_lessons(lesson):
+    """Previous and next lesson of the course, from two indexed queries"""
+    siblings = Lesson.objects.filter(course_id=lesson.course_id).only('id', 'title', 'order', 'created_at')
+    before = Q(order__lt=lesson.order) | Q(order=lesson.order, created_at__lt=lesson.created_at)
+    after = Q(order__gt=lesson.order) | Q(order=lesson.order, created_at__gt=lesson.created_at)
+    return (
+        siblings.filter(before).order_by('-order', '-created_at').first(),
+        siblings.filter(after).order_by('order', 'created_at').first(),
+    )
+
+
+def lesson_navigation(outline, lesson):
+    """Outline entries of the lessons before and after `lesson`.
+
+    Looked up by the lesson's position in an already fetched outline. A
+    lesson missing from the outline (written after the course row was read)
+    falls back to neighbour queries.
+    """
+    position = outline['index'].get(lesson.pk)
+    if position is None:
+        return neighbour_lessons(lesson)
+    lessons = outline['lessons']
+    return (
+        lessons[position - 1] if position > 0 else None,
+        lessons[position + 1] if position < len(lessons) - 1 else None,
+    )
+
+
+def lesson_outline_cache_key(course_id, version, lesson_id):
+    return f'courses:outline:{course_id}:{version}:lesson:{lesson_id}'
+
+
+def _link(entry):
+    return entry and {key: entry[key] for key in ('id', 'pk', 'title', 'order')}
+
+
+def get_lesson_outline(course, lesson):
+    """The outline entry of one lesson with links to the lessons around it.
+
+    Cached per lesson for the course's current version, so a warm lesson
+    page reads one small entry instead of the whole outline and the cost
+    does not grow with the course.
+    """
+    key = lesson_outline_cache_key(course.pk, course.outline_version, lesson.pk)
+    entry = cache.get(key)
+    if entry is None:
+        outline = get_course_outline(course)
+        previous, following = lesson_navigation(outline, lesson)
+        position = outline['index'].get(lesson.pk)
+        if position is None:
+            # Newer than the course row that was read; not cached under its version
+            return {'assignments': [], 'peer_reviews': [], 'previous': previous, 'next': following}
+        entry = {**outline['lessons'][position], 'previous': _link(previous), 'next': _link(following)}
+        cache.set(key, entry, OUTLINE_CACHE_TIMEOUT)
+    return entry
@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import LessonProgress
+
+# Sent inside the transaction after a bulk progress write, which sends no
+# post_save. `completed` and `reopened` map the lesson ids whose state
+# actually changed to their course ids.
+lesson_progress_bulk_updated = Signal()
+
+
+def update_lesson_progress(student, states, courses):
+    """Set the completion state of many lessons for one student in one transaction.
+
+    `states` maps lesson ids to the wanted `is_completed`; `courses` maps
+    the same lesson ids to their course ids. Missing progress rows are
+    created and existing rows are updated in bulk. Only lessons whose
+    state changed are reported to receivers, so replaying a batch awards
+    nothing twice. Returns {lesson_id: is_completed}.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        stored = dict(
+            LessonProgress.objects.select_for_update().filter(
+                student=student,
+                lesson__in=list(states)
+            ).values_list('lesson_id', 'is_completed')
+        )
+
+        LessonProgress.objects.bulk_create(
+            [
+                LessonProgress(student=student, lesson_id=lesson_id, is_completed=is_completed, completed_at=now if is_completed else None)
+                for lesson_id, is_completed in states.items()
+                if lesson_id not in stored
+            ],
+            ignore_conflicts=True
+        )
+
+        completed = [lesson_id for lesson_id, is_completed in states.items() if is_completed and not stored.get(lesson_id, False)]
+        reopened = [lesson_id for lesson_id, is_completed in states.items() if not is_completed and stored.get(lesson_id, False)]
+        existing = LessonProgress.objects.filter(student=student)
+        if completed:
+            existing.filter(lesson__in=completed).update(is_completed=True)
+            # Like LessonProgress.save, keep the time of the first completion
+            existing.filter(lesson__in=completed, completed_at__isnull=True).update(completed_at=now)
+        if reopened:
+            existing.filter(lesson__in=reopened).update(is_completed=False)
+
+        if completed or reopened:
+            lesson_progress_bulk_updated.send(
+                sender=LessonProgress,
+                student=student,
+                completed={lesson_id: courses[lesson_id] for lesson_id in completed},
+                reopened={lesson_id: courses[lesson_id] for lesson_id in reopened}
+            )
+
+    return dict(states)
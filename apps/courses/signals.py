@@ -0,0 +1,25 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from apps.core.signals import cascaded_from
+from apps.peer_review.models import PeerReviewAssignment
+from .models import Assignment, Course, Lesson
+from .outline import bump_outline_version
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def bump_outline_for_lesson(sender, instance, origin=None, **kwargs):
+    if cascaded_from(origin, Course):
+        return
+    bump_outline_version(instance.course_id)
+
+
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+@receiver(post_save, sender=PeerReviewAssignment)
+@receiver(post_delete, sender=PeerReviewAssignment)
+def bump_outline_for_lesson_item(sender, instance, origin=None, **kwargs):
+    # Deleting the lesson or course bumps the version once instead
+    if cascaded_from(origin, Course, Lesson):
+        return
+    bump_outline_version(instance.lesson.course_id)
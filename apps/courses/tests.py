@@ -1,7 +1,23 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
+from django.urls import reverse
 from django.utils import timezone
+from apps.analytics.models import CompletionBitmap
+from apps.gamification.models import Badge, UserPoints
+from apps.peer_review.models import PeerReviewAssignment
 from .models import Course, Lesson, LessonProgress, Assignment, Submission
+from .outline import get_course_outline, get_lesson_outline, lesson_navigation, neighbour_lessons, outline_cache_key
+from .views import public_media
 
 User = get_user_model()
 
@@ -65,4 +81,260 @@ class CourseModelsTest(TestCase):
         progress.is_completed = True
         progress.save()
         progress.refresh_from_db()
-        self.assertEqual(progress.completed_at, first_completion_time)
\ No newline at end of file
+        self.assertEqual(progress.completed_at, first_completion_time)
+
+class CourseOutlineTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.instructor = User.objects.create_user(username='instructor', password='password', is_instructor=True)
+        self.student = User.objects.create_user(username='student', password='password')
+        self.course = Course.objects.create(title='Outline Course', description='...')
+        self.course.instructors.add(self.instructor)
+        self.course.students.add(self.student)
+        self.lessons = [
+            Lesson.objects.create(course=self.course, title=f'Lesson {i}', content='...', order=i)
+            for i in range(3)
+        ]
+        due = timezone.now() + timedelta(days=7)
+        self.assignment = Assignment.objects.create(lesson=self.lessons[1], title='Essay', description='...', due_date=due)
+        PeerReviewAssignment.objects.create(lesson=self.lessons[1], title='Review', description='...', due_date=due)
+        self.course.refresh_from_db()
+
+    def test_outline_is_cached_per_version(self):
+        """Test that the outline lists lessons with their stubs and is served from the cache."""
+        outline = get_course_outline(self.course)
+        self.assertEqual([lesson['pk'] for lesson in outline['lessons']], [lesson.pk for lesson in self.lessons])
+        self.assertEqual([stub['title'] for stub in outline['lessons'][1]['assignments']], ['Essay'])
+        self.assertEqual([stub['title'] for stub in outline['lessons'][1]['peer_reviews']], ['Review'])
+
+        with self.assertNumQueries(0):
+            get_course_outline(self.course)
+
+    def test_changes_bump_the_version(self):
+        """Test that lesson, assignment and peer-review writes make the next read rebuild the outline."""
+        get_course_outline(self.course)
+        version = self.course.outline_version
+
+        self.assignment.title = 'Long essay'
+        self.assignment.save()
+        self.course.refresh_from_db()
+        self.assertGreater(self.course.outline_version, version)
+        self.assertEqual(get_course_outline(self.course)['lessons'][1]['assignments'][0]['title'], 'Long essay')
+
+        self.lessons[1].delete()
+        self.course.refresh_from_db()
+        self.assertEqual(len(get_course_outline(self.course)['lessons']), 2)
+
+    def test_saving_a_stale_course_keeps_the_version(self):
+        """Test that saving a course read before a lesson change does not roll its version back."""
+        stale = Course.objects.get(pk=self.course.pk)
+        Lesson.objects.create(course=self.course, title='Lesson 3', content='...', order=3)
+        version = Course.objects.get(pk=self.course.pk).outline_version
+        self.assertGreater(version, stale.outline_version)
+
+        stale.title = 'Renamed Course'
+        stale.save()
+
+        self.assertEqual(Course.objects.values_list('title', 'outline_version').get(pk=self.course.pk), ('Renamed Course', version))
+
+    def test_pages_render_from_outline(self):
+        """Test that warm course and lesson pages do not query lessons, assignments or peer reviews."""
+        outline_tables = ('"courses_assignment"', '"peer_review_peerreviewassignment"')
+        course_url = reverse('courses:course_detail', args=[self.course.pk])
+        lesson_url = reverse('courses:lesson_detail', args=[self.course.pk, self.lessons[1].pk])
+
+        self.client.login(username='student', password='password')
+        self.client.get(course_url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(course_url)
+        self.assertEqual([lesson['title'] for lesson in response.context['lessons']], ['Lesson 0', 'Lesson 1', 'Lesson 2'])
+        self.assertFalse([query for query in queries if 'FROM "courses_lesson"' in query['sql']])
+
+        self.client.login(username='instructor', password='password')
+        self.client.get(lesson_url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(lesson_url)
+        self.assertContains(response, 'Essay')
+        self.assertContains(response, 'Review')
+        self.assertFalse([query for query in queries if any(table in query['sql'] for table in outline_tables)])
+
+    def test_only_enrolled_visitors_store_bitmaps(self):
+        """Test that browsing a course as an instructor or outsider stores no completion bitmap."""
+        User.objects.create_user(username='outsider', password='password')
+        course_url = reverse('courses:course_detail', args=[self.course.pk])
+        for username in ('instructor', 'outsider'):
+            self.client.login(username=username, password='password')
+            self.assertEqual(self.client.get(course_url).context['progress_percentage'], 0)
+        self.assertFalse(CompletionBitmap.objects.exists())
+
+        self.client.login(username='student', password='password')
+        self.client.get(course_url)
+        self.assertEqual(list(CompletionBitmap.objects.values_list('student', flat=True)), [self.student.pk])
+
+    def test_lesson_navigation(self):
+        """Test that prev/next come from the outline and match the indexed neighbour queries."""
+        # Same order as Lesson 1; created later, so it sorts after it
+        extra = Lesson.objects.create(course=self.course, title='Lesson 1b', content='...', order=1)
+        self.course.refresh_from_db()
+        outline = get_course_outline(self.course)
+
+        with self.assertNumQueries(0):
+            previous, following = lesson_navigation(outline, extra)
+        self.assertEqual((previous['pk'], following['pk']), (self.lessons[1].pk, self.lessons[2].pk))
+        self.assertEqual(lesson_navigation(outline, self.lessons[0])[0], None)
+        self.assertEqual(lesson_navigation(outline, self.lessons[2])[1], None)
+
+        with self.assertNumQueries(2):
+            previous, following = neighbour_lessons(extra)
+        self.assertEqual((previous, following), (self.lessons[1], self.lessons[2]))
+
+    def test_lesson_entry_is_cached_on_its_own(self):
+        """Test that a warm lesson entry is read without the course outline."""
+        entry = get_lesson_outline(self.course, self.lessons[1])
+        self.assertEqual([stub['title'] for stub in entry['assignments']], ['Essay'])
+        self.assertEqual((entry['previous']['pk'], entry['next']['pk']), (self.lessons[0].pk, self.lessons[2].pk))
+
+        cache.delete(outline_cache_key(self.course.pk, self.course.outline_version))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_lesson_outline(self.course, self.lessons[1]), entry)
+        self.assertIsNone(cache.get(outline_cache_key(self.course.pk, self.course.outline_version)))
+
+
+class BulkLessonCompletionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(username='student', password='password')
+        self.course = Course.objects.create(title='Bulk Course', description='...')
+        self.course.students.add(self.student)
+        self.lessons = [
+            Lesson.objects.create(course=self.course, title=f'Lesson {i}', content='...', order=i)
+            for i in range(40)
+        ]
+        self.url = reverse('courses:bulk_lesson_completion')
+        self.client.login(username='student', password='password')
+
+    def post(self, states):
+        payload = {'lessons': [{'lesson_id': lesson.pk, 'is_completed': state} for lesson, state in states]}
+        return self.client.post(self.url, json.dumps(payload), content_type='application/json')
+
+    def points(self):
+        return UserPoints.objects.get(user=self.student).total_points
+
+    def test_completes_lessons_once(self):
+        """Test that a batch upserts progress and awards points only for lessons it completes."""
+        response = self.post([(lesson, True) for lesson in self.lessons[:3]])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['lessons'], [{'lesson_id': lesson.pk, 'is_completed': True} for lesson in self.lessons[:3]])
+        self.assertEqual(LessonProgress.objects.filter(student=self.student, is_completed=True, completed_at__isnull=False).count(), 3)
+        self.assertEqual(self.points(), 30)
+        self.assertEqual(CompletionBitmap.objects.get(student=self.student, course=self.course).completed_count, 3)
+
+        # Replaying the batch with one lesson reopened and one new completion
+        self.post([(self.lessons[0], False), (self.lessons[1], True), (self.lessons[3], True)])
+        self.assertEqual(self.points(), 40)
+        self.assertEqual(
+            set(LessonProgress.objects.filter(student=self.student, is_completed=True).values_list('lesson_id', flat=True)),
+            {self.lessons[1].pk, self.lessons[2].pk, self.lessons[3].pk}
+        )
+        self.assertEqual(CompletionBitmap.objects.get(student=self.student, course=self.course).completed_count, 3)
+
+    def test_queries_do_not_grow_with_batch(self):
+        """Test that completing 30 lessons costs as many queries as completing 3."""
+        # Keep the first points row and badge awards out of the comparison
+        UserPoints.objects.create(user=self.student)
+        Badge.objects.all().delete()
+        # Warms the cached lesson layout
+        self.post([(self.lessons[0], True)])
+
+        with CaptureQueriesContext(connection) as small:
+            self.post([(lesson, True) for lesson in self.lessons[1:4]])
+        with CaptureQueriesContext(connection) as large:
+            self.post([(lesson, True) for lesson in self.lessons[4:34]])
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(self.points(), 340)
+
+    def test_rejects_invalid_batches(self):
+        """Test that malformed bodies, non-boolean states, unknown lessons and other courses' lessons change nothing."""
+        other = Course.objects.create(title='Other Course', description='...')
+        foreign = Lesson.objects.create(course=other, title='Foreign', content='...')
+
+        self.assertEqual(self.client.post(self.url, '{"lessons": 1}', content_type='application/json').status_code, 400)
+        for state in ('false', 0, None):
+            self.assertEqual(self.post([(self.lessons[0], state)]).status_code, 400)
+        response = self.client.post(self.url, json.dumps({'lessons': [{'lesson_id': 0, 'is_completed': True}]}), content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['lesson_ids'], [0])
+        self.assertEqual(self.post([(self.lessons[0], True), (foreign, True)]).status_code, 403)
+        self.assertFalse(LessonProgress.objects.exists())
+
+
+class LessonMediaTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.root, MEDIA_DELIVERY='django')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.student = User.objects.create_user(username='student', password='password')
+        User.objects.create_user(username='outsider', password='password')
+        self.course = Course.objects.create(title='Media Course', description='...')
+        self.course.students.add(self.student)
+        self.lesson = Lesson.objects.create(course=self.course, title='Lesson', content='...')
+        self.content = bytes(range(256)) * 4
+        self.lesson.video_file.save('intro.mp4', ContentFile(self.content))
+        self.url = reverse('courses:lesson_media', args=[self.course.pk, self.lesson.pk, 'video'])
+
+    def test_requires_course_membership(self):
+        """Test that only the course's members can fetch its lesson files."""
+        self.client.login(username='outsider', password='password')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        self.client.login(username='student', password='password')
+        self.assertEqual(self.client.get(reverse('courses:lesson_media', args=[self.course.pk, self.lesson.pk, 'pdf'])).status_code, 404)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_ranges_and_etags(self):
+        """Test byte ranges, If-Range and If-None-Match."""
+        self.client.login(username='student', password='password')
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=100-199'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=-24'})
+        self.assertEqual(b''.join(response.streaming_content), self.content[-24:])
+        self.assertEqual(self.client.get(self.url, headers={'Range': 'bytes=5000-'}).status_code, 416)
+        response = self.client.get(self.url, headers={'Range': 'bytes=5-3'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(self.client.get(self.url, headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'}).status_code, 200)
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 304)
+
+    def test_public_media_route_skips_lesson_files(self):
+        """Test that the development MEDIA_URL view 404s for lesson files but serves other media."""
+        self.course.image.save('cover.png', ContentFile(b'png'))
+        request = RequestFactory().get('/media/')
+
+        for path in (self.lesson.video_file.name, f'course_images/../{self.lesson.video_file.name}', 'lesson_pdfs/'):
+            with self.assertRaises(Http404):
+                public_media(request, path, document_root=self.root)
+        response = public_media(request, self.course.image.name, document_root=self.root)
+        self.assertEqual(b''.join(response.streaming_content), b'png')
+
+    @override_settings(MEDIA_DELIVERY='x-accel-redirect', MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_hands_off_to_front_end_server(self):
+        """Test that handoff modes send a header instead of the file."""
+        self.client.login(username='student', password='password')
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.lesson.video_file.name}')
+        self.assertEqual(response.content, b'')
+
+        with override_settings(MEDIA_DELIVERY='x-sendfile'):
+            self.assertEqual(self.client.get(self.url)['X-Sendfile'], self.lesson.video_file.path)
@@ -12,6 +12,7 @@ urlpatterns = [
     # Lessons
     path('<int:course_id>/lessons/create/', views.LessonCreateView.as_view(), name='lesson_create'),
     path('<int:course_id>/lessons/<int:lesson_id>/', views.LessonDetailView.as_view(), name='lesson_detail'),
+    path('<int:course_id>/lessons/<int:lesson_id>/media/<str:kind>/', views.lesson_media, name='lesson_media'),
     
     # Assignments
     path('<int:course_id>/lessons/<int:lesson_id>/assignment/create/', views.AssignmentCreateView.as_view(), name='assignment_create'),
@@ -20,4 +21,5 @@ urlpatterns = [
     
     # Progress
     path('lesson/<int:lesson_id>/complete/', views.toggle_lesson_completion, name='toggle_lesson_completion'),
+    path('lessons/complete/', views.bulk_lesson_completion, name='bulk_lesson_completion'),
 ]
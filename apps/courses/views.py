@@ -1,11 +1,20 @@
+import json
+import posixpath
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
+from django.views.static import serve as static_serve
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.urls import reverse_lazy
 from django.db.models import Prefetch
 from .models import Course, Lesson, Assignment, Submission, LessonProgress
 from .forms import SubmissionForm, CourseForm, LessonForm, AssignmentForm
+from .media import serve_media
+from .outline import get_course_outline, get_lesson_outline
+from .progress import update_lesson_progress
 from apps.accounts.models import User
+from apps.analytics.bitmaps import build_completion_bitmaps, completed_lesson_ids, get_completion_bitmap, progress_percentage
+from apps.analytics.utils import log_student_activity
 
 class InstructorRequiredMixin(UserPassesTestMixin):
     def test_func(self):
@@ -48,32 +57,22 @@ class CourseDetailView(LoginRequiredMixin, DetailView):
     model = Course
     template_name = 'courses/course_detail.html'
 
-    def get_queryset(self):
-        return super().get_queryset().prefetch_related('lessons')
-
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        lessons = self.object.lessons.all() # Uses prefetched data
+        lessons = get_course_outline(self.object)['lessons']
         context['lessons'] = lessons
         
         user = self.request.user
         if user.is_authenticated:
-            # Calculate progress
-            total_lessons = lessons.count()
-            completed_lessons = LessonProgress.objects.filter(
-                student=user, 
-                lesson__in=lessons, 
-                is_completed=True
-            ).count()
-            
-            context['progress_percentage'] = int((completed_lessons / total_lessons * 100)) if total_lessons > 0 else 0
-            
-            # Get list of completed lesson IDs for the template
-            context['completed_lesson_ids'] = list(LessonProgress.objects.filter(
-                student=user,
-                lesson__course=self.object,
-                is_completed=True
-            ).values_list('lesson_id', flat=True))
+            # Progress and completed lessons both come from the student's completion bitmap;
+            # only enrolled students get one stored, other visitors' is built and dropped
+            lesson_ids = [lesson['id'] for lesson in lessons]
+            if self.object.students.filter(pk=user.pk).exists():
+                bitmap = get_completion_bitmap(user.id, self.object.id, lesson_ids)
+            else:
+                bitmap = build_completion_bitmaps(self.object.id, [user.id], lesson_ids)[user.id]
+            context['progress_percentage'] = int(progress_percentage(bitmap, lesson_ids))
+            context['completed_lesson_ids'] = set(completed_lesson_ids(bitmap, lesson_ids))
             
         return context
 
@@ -107,11 +106,16 @@ class LessonDetailView(LoginRequiredMixin, DetailView):
         context = super().get_context_data(**kwargs)
         course = self.object.course # Uses selected data
         context['course'] = course
+
+        # Assignment, peer-review and prev/next links come from the lesson's cached outline entry
+        entry = get_lesson_outline(course, self.object)
+        context['assignments'] = entry['assignments']
+        context['peer_review_assignments'] = entry['peer_reviews']
+        context['previous_lesson'], context['next_lesson'] = entry['previous'], entry['next']
         
-        lessons = list(course.lessons.all())
-        current_idx = lessons.index(self.object)
-        context['previous_lesson'] = lessons[current_idx - 1] if current_idx > 0 else None
-        context['next_lesson'] = lessons[current_idx + 1] if current_idx < len(lessons) - 1 else None
+        # Queued on the activity buffer; no write happens in the request
+        if not self.request.user.is_instructor:
+            log_student_activity(self.request.user, 'lesson_view', course=course, lesson_id=self.object.id)
         
         return context
 
@@ -210,8 +214,8 @@ class UserAssignmentsView(LoginRequiredMixin, ListView):
         context['view_user'] = self.view_user
         return context
 
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views.decorators.http import require_POST, require_safe
 
 @require_POST
 def toggle_lesson_completion(request, lesson_id):
@@ -236,3 +240,86 @@ def toggle_lesson_completion(request, lesson_id):
         'is_completed': progress.is_completed,
         'lesson_id': lesson_id
     })
+
+# Largest batch an offline client may replay in one request
+MAX_BULK_LESSONS = 500
+
+
+def _completion_state(value):
+    # bool() would read "false" or 0 as a completion; only JSON booleans are accepted
+    if not isinstance(value, bool):
+        raise TypeError(f'is_completed must be true or false, not {value!r}')
+    return value
+
+
+@require_POST
+def bulk_lesson_completion(request):
+    """Set the completion state of many lessons at once.
+
+    Expects a JSON body {"lessons": [{"lesson_id": 1, "is_completed": true}, ...]}
+    with JSON booleans for is_completed; when a lesson appears more than once
+    the last entry wins. Points and badges are awarded once for the whole batch.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'status': 'error', 'message': 'Authentication required'}, status=403)
+
+    try:
+        entries = json.loads(request.body)['lessons']
+        states = {int(entry['lesson_id']): _completion_state(entry['is_completed']) for entry in entries}
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'status': 'error', 'message': 'Expected {"lessons": [{"lesson_id": ..., "is_completed": ...}]}'}, status=400)
+    if len(states) > MAX_BULK_LESSONS:
+        return JsonResponse({'status': 'error', 'message': f'At most {MAX_BULK_LESSONS} lessons per request'}, status=400)
+
+    courses = dict(Lesson.objects.filter(pk__in=list(states)).values_list('id', 'course_id'))
+    missing = sorted(set(states) - set(courses))
+    if missing:
+        return JsonResponse({'status': 'error', 'message': 'Lessons not found', 'lesson_ids': missing}, status=404)
+
+    if not request.user.is_instructor:
+        course_ids = set(courses.values())
+        enrolled = set(request.user.courses_enrolled.filter(pk__in=course_ids).values_list('pk', flat=True))
+        if course_ids - enrolled:
+            return JsonResponse({'status': 'error', 'message': 'Not enrolled'}, status=403)
+
+    states = update_lesson_progress(request.user, states, courses)
+    return JsonResponse({
+        'status': 'success',
+        'lessons': [{'lesson_id': lesson_id, 'is_completed': is_completed} for lesson_id, is_completed in states.items()]
+    })
+
+# Lesson FileFields servable through lesson_media
+LESSON_MEDIA_FIELDS = {
+    'video': 'video_file',
+    'pdf': 'pdf_file',
+}
+
+@require_safe
+def lesson_media(request, course_id, lesson_id, kind):
+    """A lesson's video or PDF, for the course's students and instructors only"""
+    if not request.user.is_authenticated:
+        return HttpResponse(status=403)
+    if kind not in LESSON_MEDIA_FIELDS:
+        raise Http404("Unknown lesson media")
+
+    lesson = get_object_or_404(Lesson.objects.select_related('course'), pk=lesson_id, course_id=course_id)
+    course = lesson.course
+    if not (
+        request.user.is_superuser
+        or course.students.filter(pk=request.user.pk).exists()
+        or course.instructors.filter(pk=request.user.pk).exists()
+    ):
+        return HttpResponse(status=403)
+
+    fieldfile = getattr(lesson, LESSON_MEDIA_FIELDS[kind])
+    if not fieldfile or not fieldfile.storage.exists(fieldfile.name):
+        raise Http404("Lesson has no such file")
+    return serve_media(request, fieldfile)
+
+
+def public_media(request, path, document_root=None, show_indexes=False):
+    """Development MEDIA_URL view that never serves the lesson media upload dirs"""
+    protected = tuple(Lesson._meta.get_field(field).upload_to for field in LESSON_MEDIA_FIELDS.values())
+    if (posixpath.normpath(path).lstrip('/') + '/').startswith(protected):
+        raise Http404("Lesson files are served by lesson_media")
+    return static_serve(request, path, document_root, show_indexes)
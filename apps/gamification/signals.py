@@ -1,21 +1,39 @@
+from django.db.models import F
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.conf import settings
+from django.utils import timezone
 from apps.courses.models import LessonProgress
+from apps.courses.progress import lesson_progress_bulk_updated
 from .models import UserPoints
 from .utils import check_badges
 
+# Points awarded for completing a lesson
+LESSON_POINTS = 10
+
 @receiver(post_save, sender=LessonProgress)
 def award_points_for_lesson(sender, instance, created, **kwargs):
     if instance.is_completed:
         # Get or create UserPoints
         user_points, _ = UserPoints.objects.get_or_create(user=instance.student)
         
-        # Award 10 points for a lesson
+        # Award points for a lesson
         # To avoid double counting, we might want to track if points were already awarded for this specific progress
         # But for simplicity, we'll just add it.
         
-        user_points.total_points += 10
+        user_points.total_points += LESSON_POINTS
         user_points.save()
         
         check_badges(instance.student)
+
+
+@receiver(lesson_progress_bulk_updated)
+def award_points_for_lessons(sender, student, completed, **kwargs):
+    # One points update and one badge check for the whole batch
+    if completed:
+        UserPoints.objects.get_or_create(user=student)
+        UserPoints.objects.filter(user=student).update(
+            total_points=F('total_points') + LESSON_POINTS * len(completed),
+            updated_at=timezone.now()
+        )
+        check_badges(student)
@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import UploadSession
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'owner', 'target', 'object_id', 'received', 'size', 'status', 'updated_at']
+    list_filter = ['status', 'target']
+    search_fields = ['filename', 'owner__username']
+    date_hierarchy = 'created_at'
@@ -0,0 +1,149 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+
+from .exceptions import UploadError
+from .models import UploadSession, upload_temp_dir
+from .targets import UPLOAD_TARGETS
+
+# Bytes read from the request or the temp file at a time
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+def default_chunk_size():
+    return getattr(settings, 'CHUNKED_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+
+
+def max_upload_size():
+    return getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', 4 * 1024 * 1024 * 1024)
+
+
+def start_upload(user, target, object_id, filename, size, checksum):
+    """Check the target and open a session; raises UploadError, Http404 or PermissionDenied"""
+    if target not in UPLOAD_TARGETS:
+        raise UploadError(f"Unknown upload target {target!r}")
+    if not 0 < size <= max_upload_size():
+        raise UploadError(f"Size must be between 1 and {max_upload_size()} bytes")
+    checksum = checksum.lower()
+    if len(checksum) != 64 or set(checksum) - set('0123456789abcdef'):
+        raise UploadError("Checksum must be a hex SHA-256 digest")
+    filename = os.path.basename(filename.replace('\\', '/'))[:255]
+    if not filename:
+        raise UploadError("Filename is required")
+
+    UPLOAD_TARGETS[target].authorize(user, object_id)
+    session = UploadSession.objects.create(
+        owner=user,
+        target=target,
+        object_id=object_id,
+        filename=filename,
+        size=size,
+        chunk_size=default_chunk_size(),
+        checksum=checksum
+    )
+    upload_temp_dir().mkdir(parents=True, exist_ok=True)
+    session.temp_path.touch()
+    return session
+
+
+def _locked_session(session_id):
+    session = UploadSession.objects.select_for_update().filter(pk=session_id).first()
+    if session is None:
+        raise UploadError("Upload not found", status=404)
+    if session.status != 'open':
+        raise UploadError("Upload is already complete", status=409)
+    return session
+
+
+def append_chunk(session_id, index, stream, length, chunk_checksum=None):
+    """Write chunk `index` from `stream` at its offset in the temp file.
+
+    Chunks must arrive in order. Resending a chunk that was already
+    stored is accepted and changes nothing, so a client that lost the
+    response can simply carry on. The chunk is copied in small buffers,
+    so memory use does not depend on the chunk size. A short or corrupt
+    chunk is cut off again and the session stays at the previous chunk.
+    """
+    with transaction.atomic():
+        session = _locked_session(session_id)
+        if index < session.next_chunk:
+            return session
+        if index > session.next_chunk:
+            raise UploadError(f"Expected chunk {session.next_chunk}", status=409)
+
+        offset = index * session.chunk_size
+        expected = min(session.chunk_size, session.size - offset)
+        if length != expected:
+            raise UploadError(f"Chunk {index} must be {expected} bytes")
+
+        digest = hashlib.sha256()
+        with open(session.temp_path, 'r+b') as f:
+            # Drop whatever an interrupted attempt left past the last stored chunk
+            f.truncate(offset)
+            f.seek(offset)
+            remaining = length
+            while remaining:
+                data = stream.read(min(COPY_BUFFER_SIZE, remaining))
+                if not data:
+                    break
+                digest.update(data)
+                f.write(data)
+                remaining -= len(data)
+            if remaining or (chunk_checksum and digest.hexdigest() != chunk_checksum.lower()):
+                f.truncate(offset)
+                raise UploadError(f"Chunk {index} was incomplete or corrupt")
+
+        session.received = offset + length
+        session.save(update_fields=['received', 'updated_at'])
+    return session
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def finish_upload(session_id, user):
+    """Verify the assembled file and save it into the target's FileField.
+
+    A checksum mismatch empties the temp file and rewinds the session to
+    the first chunk. Returns (session, saved instance).
+    """
+    with transaction.atomic():
+        session = _locked_session(session_id)
+        if session.received != session.size:
+            raise UploadError(f"Upload is incomplete; expected chunk {session.next_chunk}", status=409)
+
+        corrupt = file_checksum(session.temp_path) != session.checksum
+        if corrupt:
+            with open(session.temp_path, 'r+b') as f:
+                f.truncate(0)
+            session.received = 0
+            session.save(update_fields=['received', 'updated_at'])
+        else:
+            target = UPLOAD_TARGETS[session.target]
+            obj = target.authorize(user, session.object_id)
+            with open(session.temp_path, 'rb') as f:
+                # Storage copies File objects chunk by chunk
+                instance = target.attach(obj, user, session.filename, File(f, name=session.filename))
+            session.status = 'complete'
+            session.save(update_fields=['status', 'updated_at'])
+
+    # Raised outside the transaction so that the rewind is kept
+    if corrupt:
+        raise UploadError("Checksum mismatch; the upload was restarted")
+    discard_temp_file(session)
+    return session, instance
+
+
+def discard_temp_file(session):
+    try:
+        os.remove(session.temp_path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,6 @@
+class UploadError(Exception):
+    """A request the upload cannot accept; `status` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from apps.uploads.chunks import discard_temp_file
+from apps.uploads.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = 'Delete upload sessions and their temp files once nobody has touched them for a while'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=48,
+            help='Delete sessions not updated for this many hours',
+        )
+
+    def handle(self, *args, **options):
+        stale = UploadSession.objects.filter(updated_at__lt=timezone.now() - timedelta(hours=options['hours']))
+
+        deleted = 0
+        for session in stale.iterator():
+            discard_temp_file(session)
+            session.delete()
+            deleted += 1
+
+        self.stdout.write(self.style.SUCCESS(f"\nCompleted! Deleted {deleted} upload sessions"))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:40
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('target', models.CharField(choices=[('lesson_video', 'Lesson video'), ('lesson_pdf', 'Lesson PDF'), ('submission', 'Assignment submission'), ('chat_audio', 'Chat audio'), ('chat_video', 'Chat video')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField(help_text='Lesson, assignment or chat thread the file is for')),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField(help_text='Total size in bytes')),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('checksum', models.CharField(help_text='SHA-256 of the whole file, hex', max_length=64)),
+                ('received', models.PositiveBigIntegerField(default=0, help_text='Bytes written so far')),
+                ('status', models.CharField(choices=[('open', 'Open'), ('complete', 'Complete')], default='open', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['updated_at'], name='uploads_upl_updated_0fc1d9_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import models
+
+
+def upload_temp_dir():
+    return Path(getattr(settings, 'CHUNKED_UPLOAD_DIR', Path(settings.BASE_DIR) / 'upload_chunks'))
+
+
+class UploadSession(models.Model):
+    """A resumable upload whose chunks are appended, in order, to a temp file"""
+    TARGET_CHOICES = [
+        ('lesson_video', 'Lesson video'),
+        ('lesson_pdf', 'Lesson PDF'),
+        ('submission', 'Assignment submission'),
+        ('chat_audio', 'Chat audio'),
+        ('chat_video', 'Chat video'),
+    ]
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('complete', 'Complete'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    target = models.CharField(max_length=20, choices=TARGET_CHOICES)
+    object_id = models.PositiveBigIntegerField(help_text="Lesson, assignment or chat thread the file is for")
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField(help_text="Total size in bytes")
+    chunk_size = models.PositiveIntegerField()
+    checksum = models.CharField(max_length=64, help_text="SHA-256 of the whole file, hex")
+    received = models.PositiveBigIntegerField(default=0, help_text="Bytes written so far")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Finds abandoned sessions to purge
+            models.Index(fields=['updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.owner} - {self.filename} ({self.received}/{self.size})"
+
+    @property
+    def temp_path(self):
+        return upload_temp_dir() / f'{self.id}.part'
+
+    @property
+    def chunk_count(self):
+        return -(-self.size // self.chunk_size)
+
+    @property
+    def next_chunk(self):
+        """Index of the chunk to send next; received bytes always end on a chunk boundary"""
+        return -(-self.received // self.chunk_size)
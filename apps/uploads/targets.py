@@ -0,0 +1,81 @@
+from collections import namedtuple
+
+from django.core.exceptions import PermissionDenied
+from django.db import IntegrityError, transaction
+from django.http import Http404
+
+from apps.chat.models import Message, Thread
+from apps.courses.models import Assignment, Lesson, Submission
+from .exceptions import UploadError
+
+# authorize(user, object_id) returns the object the upload is for, raising
+# Http404, PermissionDenied or UploadError; attach(obj, user, name, file) saves the file
+# into its FileField and returns the saved instance.
+UploadTarget = namedtuple('UploadTarget', ['authorize', 'attach'])
+
+SUBMISSION_EXISTS = "You have already submitted this assignment"
+
+
+def _taught_lesson(user, object_id):
+    lesson = Lesson.objects.select_related('course').filter(pk=object_id).first()
+    if lesson is None:
+        raise Http404("Lesson not found")
+    if not lesson.course.instructors.filter(pk=user.pk).exists():
+        raise PermissionDenied("Only the course's instructors can upload lesson files")
+    return lesson
+
+
+def _enrolled_assignment(user, object_id):
+    assignment = Assignment.objects.select_related('lesson').filter(pk=object_id).first()
+    if assignment is None:
+        raise Http404("Assignment not found")
+    if not user.courses_enrolled.filter(pk=assignment.lesson.course_id).exists():
+        raise PermissionDenied("Not enrolled")
+    # Checked again when the upload completes; a submission is never replaced
+    if Submission.objects.filter(assignment=assignment, student=user).exists():
+        raise UploadError(SUBMISSION_EXISTS, status=409)
+    return assignment
+
+
+def _joined_thread(user, object_id):
+    thread = Thread.objects.filter(pk=object_id, participants=user).first()
+    if thread is None:
+        raise Http404("Thread not found")
+    return thread
+
+
+def _lesson_file(field_name):
+    def attach(lesson, user, name, file):
+        getattr(lesson, field_name).save(name, file)
+        return lesson
+    return attach
+
+
+def _submission_file(assignment, user, name, file):
+    submission = Submission(assignment=assignment, student=user)
+    try:
+        with transaction.atomic():
+            submission.file.save(name, file)
+    except IntegrityError:
+        # Another upload or the submission form got there first
+        submission.file.delete(save=False)
+        raise UploadError(SUBMISSION_EXISTS, status=409)
+    return submission
+
+
+def _chat_file(message_type):
+    def attach(thread, user, name, file):
+        message = Message(thread=thread, sender=user, content='', message_type=message_type)
+        getattr(message, f'{message_type}_file').save(name, file)
+        thread.save() # Update updated_at
+        return message
+    return attach
+
+
+UPLOAD_TARGETS = {
+    'lesson_video': UploadTarget(_taught_lesson, _lesson_file('video_file')),
+    'lesson_pdf': UploadTarget(_taught_lesson, _lesson_file('pdf_file')),
+    'submission': UploadTarget(_enrolled_assignment, _submission_file),
+    'chat_audio': UploadTarget(_joined_thread, _chat_file('audio')),
+    'chat_video': UploadTarget(_joined_thread, _chat_file('video')),
+}
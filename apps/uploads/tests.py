@@ -0,0 +1,166 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.chat.models import Message, Thread
+from apps.courses.models import Assignment, Course, Lesson, Submission
+from .models import UploadSession
+
+User = get_user_model()
+
+CONTENT = b'0123456789abcdefghij-resumable'
+
+
+class UploadTestCase(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        settings_override = override_settings(
+            CHUNKED_UPLOAD_DIR=os.path.join(self.root, 'chunks'),
+            CHUNKED_UPLOAD_CHUNK_SIZE=8,
+            MEDIA_ROOT=os.path.join(self.root, 'media')
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+        self.instructor = User.objects.create_user(username='instructor', password='password', is_instructor=True)
+        self.student = User.objects.create_user(username='student', password='password')
+        self.course = Course.objects.create(title='Upload Course', description='...')
+        self.course.instructors.add(self.instructor)
+        self.course.students.add(self.student)
+        self.lesson = Lesson.objects.create(course=self.course, title='Lesson', content='...')
+        self.assignment = Assignment.objects.create(lesson=self.lesson, title='Essay', description='...', due_date=timezone.now() + timedelta(days=7))
+
+    def start(self, target, object_id, content=CONTENT, checksum=None):
+        return self.client.post(reverse('uploads:create_upload'), {
+            'target': target,
+            'object_id': object_id,
+            'filename': 'essay.pdf',
+            'size': len(content),
+            'checksum': checksum or hashlib.sha256(content).hexdigest(),
+        }, content_type='application/json')
+
+    def send(self, upload_id, index, content=CONTENT, **headers):
+        chunk = content[index * 8:(index + 1) * 8]
+        return self.client.put(
+            reverse('uploads:upload_chunk', args=[upload_id, index]),
+            chunk,
+            content_type='application/octet-stream',
+            headers=headers
+        )
+
+    def complete(self, upload_id):
+        return self.client.post(reverse('uploads:complete_upload', args=[upload_id]))
+
+
+class ChunkedUploadTest(UploadTestCase):
+    def test_interrupted_upload_resumes(self):
+        """Test that chunks are appended in order, replays are ignored and the file lands in the submission."""
+        self.client.login(username='student', password='password')
+        upload = self.start('submission', self.assignment.pk).json()['upload']
+        self.assertEqual((upload['chunk_size'], upload['chunk_count']), (8, 4))
+
+        self.send(upload['id'], 0)
+        self.send(upload['id'], 1)
+        # The response to chunk 1 was lost; the client resends it, then skips ahead by mistake
+        self.assertEqual(self.send(upload['id'], 1).json()['upload']['next_chunk'], 2)
+        self.assertEqual(self.send(upload['id'], 3).status_code, 409)
+
+        state = self.client.get(reverse('uploads:upload_detail', args=[upload['id']])).json()['upload']
+        self.assertEqual((state['received'], state['next_chunk']), (16, 2))
+        self.assertEqual(self.complete(upload['id']).status_code, 409)
+
+        self.send(upload['id'], 2)
+        self.send(upload['id'], 3)
+        response = self.complete(upload['id'])
+        self.assertEqual(response.status_code, 200)
+
+        submission = Submission.objects.get(assignment=self.assignment, student=self.student)
+        self.assertEqual(response.json()['object_id'], submission.pk)
+        with submission.file.open('rb') as f:
+            self.assertEqual(f.read(), CONTENT)
+        self.assertFalse(UploadSession.objects.get().temp_path.exists())
+        self.assertEqual(self.send(upload['id'], 3).status_code, 409)
+
+    def test_bad_chunks_are_rejected(self):
+        """Test that wrongly sized or corrupt chunks leave the session at the previous chunk."""
+        self.client.login(username='student', password='password')
+        upload = self.start('submission', self.assignment.pk).json()['upload']
+        self.send(upload['id'], 0)
+
+        self.assertEqual(self.send(upload['id'], 1, content=CONTENT[:12]).status_code, 400)
+        self.assertEqual(self.send(upload['id'], 1, X_Chunk_SHA256=hashlib.sha256(b'other').hexdigest()).status_code, 400)
+
+        session = UploadSession.objects.get()
+        self.assertEqual(session.received, 8)
+        self.assertEqual(session.temp_path.stat().st_size, 8)
+        self.assertEqual(self.send(upload['id'], 1, X_Chunk_SHA256=hashlib.sha256(CONTENT[8:16]).hexdigest()).status_code, 200)
+
+    def test_checksum_mismatch_restarts_upload(self):
+        """Test that a file not matching the declared checksum is never attached."""
+        self.client.login(username='student', password='password')
+        upload = self.start('submission', self.assignment.pk, checksum=hashlib.sha256(b'other').hexdigest()).json()['upload']
+        for index in range(4):
+            self.send(upload['id'], index)
+
+        self.assertEqual(self.complete(upload['id']).status_code, 400)
+        self.assertEqual(UploadSession.objects.get().received, 0)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_existing_submissions_are_never_replaced(self):
+        """Test that a student with a submission can neither start nor complete another upload for it."""
+        self.client.login(username='student', password='password')
+        upload = self.start('submission', self.assignment.pk).json()['upload']
+        for index in range(4):
+            self.send(upload['id'], index)
+        graded = Submission.objects.create(assignment=self.assignment, student=self.student, file='submission_files/first.pdf', grade=90)
+
+        self.assertEqual(self.complete(upload['id']).status_code, 409)
+        self.assertEqual(self.start('submission', self.assignment.pk).status_code, 409)
+        self.assertEqual(list(Submission.objects.values_list('pk', 'file', 'grade')), [(graded.pk, 'submission_files/first.pdf', 90)])
+
+    def test_targets_check_permissions(self):
+        """Test that lesson files need an instructor of the course and chat files a thread participant."""
+        self.client.login(username='student', password='password')
+        self.assertEqual(self.start('lesson_video', self.lesson.pk).status_code, 403)
+        self.assertEqual(self.start('lesson_video', 0).status_code, 404)
+        self.assertEqual(self.start('unknown', self.lesson.pk).status_code, 400)
+
+        thread = Thread.objects.create()
+        thread.participants.add(self.student, self.instructor)
+        upload = self.start('chat_audio', thread.pk).json()['upload']
+        for index in range(4):
+            self.send(upload['id'], index)
+        self.assertEqual(self.complete(upload['id']).status_code, 200)
+        self.assertEqual(Message.objects.get(thread=thread).message_type, 'audio')
+
+        self.client.login(username='instructor', password='password')
+        upload = self.start('lesson_video', self.lesson.pk).json()['upload']
+        # Sessions belong to their owner
+        self.assertEqual(self.client.get(reverse('uploads:upload_detail', args=[UploadSession.objects.get(owner=self.student).pk])).status_code, 404)
+        for index in range(4):
+            self.send(upload['id'], index)
+        self.complete(upload['id'])
+        self.lesson.refresh_from_db()
+        self.assertTrue(self.lesson.video_file.name.startswith('lesson_videos/'))
+
+    def test_purge_removes_stale_sessions(self):
+        """Test that abandoned sessions and their temp files are purged."""
+        self.client.login(username='student', password='password')
+        upload = self.start('submission', self.assignment.pk).json()['upload']
+        self.send(upload['id'], 0)
+        session = UploadSession.objects.get()
+        UploadSession.objects.filter(pk=session.pk).update(updated_at=timezone.now() - timedelta(days=3))
+
+        call_command('purge_upload_sessions', stdout=StringIO())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(session.temp_path.exists())
@@ -0,0 +1,109 @@
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_http_methods, require_POST
+
+from .chunks import append_chunk, discard_temp_file, finish_upload, start_upload
+from .exceptions import UploadError
+from .models import UploadSession
+
+
+def session_payload(session):
+    return {
+        'id': str(session.id),
+        'status': session.status,
+        'filename': session.filename,
+        'size': session.size,
+        'chunk_size': session.chunk_size,
+        'chunk_count': session.chunk_count,
+        'received': session.received,
+        'next_chunk': session.next_chunk,
+    }
+
+
+def error_response(message, status):
+    return JsonResponse({'status': 'error', 'message': message}, status=status)
+
+
+def handle_upload_errors(view):
+    """Answer UploadError, Http404 and PermissionDenied with JSON errors"""
+    def wrapped(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except UploadError as exc:
+            return error_response(str(exc), exc.status)
+        except Http404 as exc:
+            return error_response(str(exc) or 'Not found', 404)
+        except PermissionDenied as exc:
+            return error_response(str(exc) or 'Permission denied', 403)
+    return wrapped
+
+
+@login_required
+@require_POST
+@handle_upload_errors
+def create_upload(request):
+    """Open an upload session.
+
+    Expects a JSON body {"target", "object_id", "filename", "size",
+    "checksum"}, where checksum is the hex SHA-256 of the whole file.
+    """
+    try:
+        data = json.loads(request.body)
+        session = start_upload(
+            request.user,
+            str(data['target']),
+            int(data['object_id']),
+            str(data['filename']),
+            int(data['size']),
+            str(data['checksum'])
+        )
+    except (ValueError, KeyError, TypeError):
+        return error_response('Expected target, object_id, filename, size and checksum', 400)
+    return JsonResponse({'status': 'success', 'upload': session_payload(session)}, status=201)
+
+
+@login_required
+@require_http_methods(['GET', 'DELETE'])
+def upload_detail(request, upload_id):
+    """The state of an upload, for resuming it; DELETE abandons it"""
+    session = get_object_or_404(UploadSession, pk=upload_id, owner=request.user)
+    if request.method == 'DELETE':
+        discard_temp_file(session)
+        session.delete()
+        return JsonResponse({'status': 'success'})
+    return JsonResponse({'status': 'success', 'upload': session_payload(session)})
+
+
+@login_required
+@require_http_methods(['PUT'])
+@handle_upload_errors
+def upload_chunk(request, upload_id, index):
+    """Store one chunk, sent as the raw request body.
+
+    An optional X-Chunk-SHA256 header is checked against the chunk.
+    """
+    get_object_or_404(UploadSession, pk=upload_id, owner=request.user)
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return error_response('Invalid Content-Length', 400)
+    session = append_chunk(upload_id, index, request, length, request.headers.get('X-Chunk-SHA256'))
+    return JsonResponse({'status': 'success', 'upload': session_payload(session)})
+
+
+@login_required
+@require_POST
+@handle_upload_errors
+def complete_upload(request, upload_id):
+    """Verify the checksum and save the file into its lesson, submission or message"""
+    get_object_or_404(UploadSession, pk=upload_id, owner=request.user)
+    session, instance = finish_upload(upload_id, request.user)
+    return JsonResponse({
+        'status': 'success',
+        'upload': session_payload(session),
+        'object_id': instance.pk,
+    })
@@ -3,15 +3,21 @@ import django
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
+from channels.security.websocket import AllowedHostsOriginValidator
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'english_professional.settings')
 django.setup()
 
+# Imported after setup: consumers use models
+from apps.analytics.routing import websocket_urlpatterns as analytics_websocket_urlpatterns  # noqa: E402
+
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
-        URLRouter(
-            []
+    "websocket": AllowedHostsOriginValidator(
+        AuthMiddlewareStack(
+            URLRouter(
+                analytics_websocket_urlpatterns
+            )
         )
     ),
 })
@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.schedules import crontab
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'english_professional.settings')
@@ -17,4 +18,13 @@ app.autodiscover_tasks()
 
 @app.task(bind=True)
 def debug_task(self):
-    print(f'Request: {self.request!r}')
\ No newline at end of file
+    print(f'Request: {self.request!r}')
+
+
+app.conf.beat_schedule = {
+    # Recompute analytics of the courses that changed since the last run
+    'nightly-analytics-pipeline': {
+        'task': 'apps.analytics.tasks.run_analytics_pipeline',
+        'schedule': crontab(hour=2, minute=0),
+    },
+}
@@ -67,6 +67,7 @@ INSTALLED_APPS = [
     'apps.analytics.apps.AnalyticsConfig',
     'apps.announcements.apps.AnnouncementsConfig',
     'apps.peer_review.apps.PeerReviewConfig',
+    'apps.uploads.apps.UploadsConfig',
 ]
 
 MIDDLEWARE = [
@@ -100,11 +101,36 @@ TEMPLATES = [
 #WSGI_APPLICATION = 'english_professional.wsgi.application'
 ASGI_APPLICATION = 'english_professional.asgi.application'
 
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer'
+# Analytics caches, report artifacts and live dashboard counters must be
+# shared by every web process and Celery worker, so production uses Redis.
+# The process-local fallbacks are only meant for single-process development.
+REDIS_CACHE_URL = os.environ.get('REDIS_CACHE_URL', os.environ.get('CELERY_BROKER_URL'))
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+        }
+    }
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [REDIS_CACHE_URL],
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer'
+        }
     }
-}
 
 
 # Database
@@ -207,6 +233,35 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Analytics recalculations go to Celery only when a broker is explicitly
+# configured; otherwise they run on a small in-process thread pool.
+ANALYTICS_USE_CELERY = 'CELERY_BROKER_URL' in os.environ
+
+# Student activity logs are queued in-process and written in batches. The
+# test runner writes them directly: the flush thread uses its own database
+# connection, outside the transaction each test is rolled back in.
+ANALYTICS_BUFFER_ACTIVITY = sys.argv[1:2] != ['test']
+ANALYTICS_ACTIVITY_BUFFER_SIZE = 10000
+ANALYTICS_ACTIVITY_FLUSH_SIZE = 500
+ANALYTICS_ACTIVITY_FLUSH_INTERVAL = 2.0
+
+# Monthly columnar files of historical activity for long-range queries
+ANALYTICS_ARCHIVE_DIR = os.environ.get('ANALYTICS_ARCHIVE_DIR', BASE_DIR / 'activity_archive')
+
+# Lesson videos and PDFs are served by courses.lesson_media after an access check.
+# 'django' streams them (with byte ranges) from Python; 'x-accel-redirect' hands
+# off to an nginx `internal` location at MEDIA_ACCEL_REDIRECT_PREFIX aliased to
+# MEDIA_ROOT, and 'x-sendfile' to Apache mod_xsendfile or lighttpd.
+# The front-end server must not serve MEDIA_ROOT/lesson_videos/ or lesson_pdfs/
+# under MEDIA_URL; it may expose them only through that internal location.
+MEDIA_DELIVERY = os.environ.get('MEDIA_DELIVERY', 'django')
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# Resumable uploads: chunks are appended to a temp file here until the upload completes
+CHUNKED_UPLOAD_DIR = os.environ.get('CHUNKED_UPLOAD_DIR', BASE_DIR / 'upload_chunks')
+CHUNKED_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+CHUNKED_UPLOAD_MAX_SIZE = 4 * 1024 * 1024 * 1024
+
 # Production Security Settings
 # These settings are activated when DEBUG is False.
 if not DEBUG:
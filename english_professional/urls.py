@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from apps.courses.views import public_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -17,7 +18,9 @@ urlpatterns = [
     path('analytics/', include('apps.analytics.urls')),
     path('announcements/', include('apps.announcements.urls')),
     path('peer-review/', include('apps.peer_review.urls', namespace='peer_review')),
+    path('uploads/', include('apps.uploads.urls')),
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Lesson videos and PDFs are left out; they need the access check in courses.lesson_media
+    urlpatterns += static(settings.MEDIA_URL, view=public_media, document_root=settings.MEDIA_ROOT)